@@ -0,0 +1,198 @@
+"""Offline benchmarks for the spt request layer, run against the bundled fake Spotify server.
+
+Reports p50/p99 latency and throughput for GetRequestExecutor (sequential and concurrent), pagination and output
+writing. Nothing talks to the real Spotify API, so the numbers are comparable between runs and machines.
+
+Usage:
+    python benchmarks/bench_request_layer.py [--requests 200] [--latency-ms 5] [--total-items 5000] [--json out.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SPT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+@contextlib.contextmanager
+def _silenced_stdout():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summarise(name, latencies, elapsed, units):
+    return {
+        'benchmark': name,
+        'count': len(latencies),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'throughput_per_s': round(units / elapsed, 1) if elapsed else 0.0,
+        'elapsed_s': round(elapsed, 3)
+    }
+
+
+def _prepare_environment(work_dir, base_url):
+    """Dummy app settings, a fresh app data dir and a valid token, so spt can run without logging in"""
+    os.environ.setdefault('SPT_CLIENT_ID', 'benchmark')
+    os.environ.setdefault('SPT_CLIENT_SECRET', 'benchmark')
+    os.environ.setdefault('SPT_REDIRECT_URI', 'http://127.0.0.1:8080/authcallback')
+    os.environ.setdefault('SPT_HOST_IP', '127.0.0.1')
+    os.environ.setdefault('SPT_HOST_PORT', '8080')
+    os.environ['HOME'] = os.environ['LOCALAPPDATA'] = work_dir
+    os.environ['SPT_API_BASE_URL'] = os.environ['SPT_ACCOUNTS_BASE_URL'] = base_url
+
+    from fake_spotify_server import write_credentials
+
+    os.environ['SPT_SECURITY_STORE'] = write_credentials(os.path.join(work_dir, 'credentials.json'))
+
+
+def _configure_request_layer():
+    """Turn off the client-side rate limit and bypass the response cache, so only the request path is measured"""
+    import _app_config as cfg
+    from _request_scheduler import RequestScheduler
+    from _response_cache import ResponseCache
+
+    config = cfg.GlobalConfiguration.get_configuration()
+    if not config.has_section('RATE_LIMIT_SETTINGS'):
+        config.add_section('RATE_LIMIT_SETTINGS')
+    config.set('RATE_LIMIT_SETTINGS', 'REQUESTS_PER_SECOND', '0')  # In case the local config throttles
+    RequestScheduler.reset()
+    ResponseCache.configure(enabled=False)
+
+
+# region Benchmarks
+
+def bench_get_sequential(request_count):
+    import _spotify_web_api as spotify
+
+    latencies = []
+    started = time.perf_counter()
+    for index in range(request_count):
+        request_started = time.perf_counter()
+        spotify.GetRequestExecutor(f'https://api.spotify.com/v1/tracks/track{index}', scopes=[]).execute()
+        latencies.append(time.perf_counter() - request_started)
+    return _summarise('get_request_sequential', latencies, time.perf_counter() - started, request_count)
+
+
+def bench_get_concurrent(request_count, workers):
+    import _spotify_web_api as spotify
+
+    def timed_request(index):
+        request_started = time.perf_counter()
+        spotify.GetRequestExecutor(f'https://api.spotify.com/v1/tracks/track{index}', scopes=[]).execute()
+        return time.perf_counter() - request_started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(timed_request, range(request_count)))
+    return _summarise(f'get_request_concurrent_x{workers}', latencies, time.perf_counter() - started, request_count)
+
+
+def bench_pagination(total_items):
+    import _shared_mod
+    import _spotify_web_api as spotify
+
+    params = _shared_mod.PersonlisationParams()
+    params.entity_type = _shared_mod.PersonalisationEntityTypes.Tracks.value
+    params.time_range = 'medium_term'
+    params.offset = 0
+
+    latencies = []
+    item_count = 0
+    started = last_item_at = time.perf_counter()
+    for _ in spotify.PersonalisationAPI(params).iter_top_tracks_and_artists():
+        now = time.perf_counter()
+        latencies.append(now - last_item_at)
+        last_item_at = now
+        item_count += 1
+    result = _summarise('pagination_items', latencies, time.perf_counter() - started, item_count)
+    result['items'] = item_count
+    return result
+
+
+def bench_output_writing(work_dir, total_items):
+    import _shared_mod
+    from fake_spotify_server import _build_item
+
+    items = [_build_item('track', index, 0) for index in range(total_items)]
+    results = []
+    for output_format in _shared_mod.SptOutputFormats:
+        output_path = os.path.join(work_dir, f'output.{output_format.value}')
+        writer = _shared_mod.SptOutputWriter(channels=[_shared_mod.SptOutputChannels.JsonFile.value],
+                                             output_path=output_path, output_format=output_format.value)
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(5):
+            run_started = time.perf_counter()
+            writer.execute_items(iter(items))
+            latencies.append(time.perf_counter() - run_started)
+        elapsed = time.perf_counter() - started
+        result = _summarise(f'write_items_{output_format.value}', latencies, elapsed, total_items * len(latencies))
+        result['bytes'] = os.path.getsize(output_path)
+        results.append(result)
+    return results
+
+
+# endregion
+
+
+def _print_table(results):
+    header = f"{'benchmark':<32}{'count':>8}{'p50 ms':>12}{'p99 ms':>12}{'per sec':>14}{'total s':>10}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f"{result['benchmark']:<32}{result['count']:>8}{result['p50_ms']:>12}{result['p99_ms']:>12}"
+              f"{result['throughput_per_s']:>14}{result['elapsed_s']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the spt request layer against a local fake server')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per GetRequestExecutor benchmark')
+    parser.add_argument('--workers', type=int, default=8, help='Threads for the concurrent benchmark')
+    parser.add_argument('--latency-ms', type=float, default=5.0, dest='latency_ms',
+                        help='Latency the fake server adds to every response')
+    parser.add_argument('--total-items', type=int, default=5000, dest='total_items',
+                        help='Items to page through and to write')
+    parser.add_argument('--payload-padding', type=int, default=0, dest='payload_padding',
+                        help='Extra bytes per item returned by the fake server')
+    parser.add_argument('--json', dest='json_path', default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+
+    work_dir = tempfile.mkdtemp(prefix='spt-bench-')
+    sys.path.insert(0, str(SPT_ROOT))
+    sys.path.insert(0, str(SPT_ROOT / 'tests'))
+    import spt  # noqa: F401 - puts the spt modules on sys.path
+    from fake_spotify_server import FakeServerSettings, FakeSpotifyServer
+
+    settings = FakeServerSettings(latency_ms=args.latency_ms, total_items=args.total_items,
+                                  payload_padding=args.payload_padding)
+    with FakeSpotifyServer(settings) as server:
+        _prepare_environment(work_dir, server.base_url)
+        _configure_request_layer()
+        with _silenced_stdout():
+            results = [bench_get_sequential(args.requests),
+                       bench_get_concurrent(args.requests, args.workers),
+                       bench_pagination(args.total_items)]
+            results.extend(bench_output_writing(work_dir, args.total_items))
+
+    _print_table(results)
+    if json_path:
+        with open(json_path, 'w') as json_file:
+            json.dump({'settings': vars(args), 'results': results}, json_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Cold start benchmark for the spt CLI, based on `python -X importtime`.
+
+Runs each scenario in a fresh interpreter, against the bundled fake Spotify server, and reports the median wall time
+and import time. Exits with status 1 when a scenario exceeds its import time budget or imports a module it should not
+need, so it can guard cold start in CI.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 150] [--top 10] [--json out.json]
+"""
+import argparse
+import json
+import os
+import pathlib
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SPT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+INTERPRETER_STARTUP_MODULES = {'site'}  # Includes .pth hooks of the environment, which spt does not control
+
+# name, spt arguments, import time budget in ms, modules that must stay unloaded
+SCENARIOS = [
+    ('usage_error', ['not-a-command'], 80, ['requests', 'urllib3', '_authorizer', '_command_handlers']),
+    ('personalise_top_tracks', ['personalise', 'GetTopTracks', '--limit', '1', '--no_stdout'], 200,
+     ['flask', 'pkg_resources', 'progress', '_library_mirror', '_async_web_api', '_auth_callback_server']),
+    ('library_saved_tracks', ['library', 'GetSavedTracks', '--limit', '1', '--no_stdout'], 200,
+     ['flask', 'pkg_resources', 'progress', '_library_mirror', '_async_web_api', '_auth_callback_server']),
+]
+
+
+def _prepare_environment(work_dir, base_url):
+    """Dummy app settings, a fresh app data dir and a valid token, so spt can run without logging in"""
+    from fake_spotify_server import write_credentials
+
+    credentials_path = write_credentials(os.path.join(work_dir, 'credentials.json'))
+
+    environment = dict(os.environ)
+    environment.pop('SPT_PRODUCTION', None)  # Production mode moves the bundled config into the app data dir
+    environment.update({'SPT_CLIENT_ID': 'benchmark', 'SPT_CLIENT_SECRET': 'benchmark',
+                        'SPT_REDIRECT_URI': 'http://127.0.0.1:8080/authcallback', 'SPT_HOST_IP': '127.0.0.1',
+                        'SPT_HOST_PORT': '8080', 'HOME': work_dir, 'LOCALAPPDATA': work_dir,
+                        'SPT_SECURITY_STORE': credentials_path, 'SPT_API_BASE_URL': base_url,
+                        'SPT_ACCOUNTS_BASE_URL': base_url})
+    return environment
+
+
+def _parse_import_times(stderr):
+    """Returns ({module: cumulative_us}, total_us). The total adds up top-level imports, minus interpreter startup"""
+    modules = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not match:
+            continue
+        cumulative_us, indent, module = int(match.group(2)), match.group(3), match.group(4)
+        modules[module] = cumulative_us
+        if len(indent) <= 1 and module not in INTERPRETER_STARTUP_MODULES:
+            total_us += cumulative_us
+    return modules, total_us
+
+
+def run_scenario(environment, arguments, runs):
+    command = [sys.executable, '-X', 'importtime', '__main__.py'] + arguments
+    wall_times, import_times, modules = [], [], {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=str(SPT_ROOT / 'spt'), env=environment, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, universal_newlines=True)
+        wall_times.append(time.perf_counter() - started)
+        modules, total_us = _parse_import_times(completed.stderr)
+        import_times.append(total_us)
+    return statistics.median(wall_times), statistics.median(import_times), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure spt cold start and fail when it exceeds a budget')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per scenario. The median is reported')
+    parser.add_argument('--budget-ms', type=float, default=None, dest='budget_ms',
+                        help='Import time budget for every scenario, overriding the built-in budgets')
+    parser.add_argument('--top', type=int, default=10, help='Show the slowest imports of each scenario')
+    parser.add_argument('--json', dest='json_path', default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(SPT_ROOT / 'spt'))
+    sys.path.insert(0, str(SPT_ROOT / 'tests'))
+    from fake_spotify_server import FakeSpotifyServer
+
+    results, failures = [], []
+    with FakeSpotifyServer() as server, tempfile.TemporaryDirectory(prefix='spt-startup-') as work_dir:
+        environment = _prepare_environment(work_dir, server.base_url)
+        subprocess.run([sys.executable, '-m', 'compileall', '-q', str(SPT_ROOT / 'spt')], check=True)
+        for name, arguments, budget_ms, unwanted_modules in SCENARIOS:
+            run_scenario(environment, arguments, 1)  # Warm the OS file cache
+            wall_s, import_us, modules = run_scenario(environment, arguments, args.runs)
+            budget_ms = args.budget_ms if args.budget_ms is not None else budget_ms
+            loaded = [module for module in unwanted_modules if module in modules]
+            result = {'scenario': name, 'command': 'spt ' + ' '.join(arguments),
+                      'wall_ms': round(wall_s * 1000, 1), 'import_ms': round(import_us / 1000, 1),
+                      'budget_ms': budget_ms, 'unwanted_imports': loaded,
+                      'slowest_imports': sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]}
+            results.append(result)
+            if result['import_ms'] > budget_ms:
+                failures.append(f"{name}: imports took {result['import_ms']} ms, budget {budget_ms} ms")
+            if loaded:
+                failures.append(f'{name}: should not import {loaded}')
+
+    header = f"{'scenario':<28}{'wall ms':>10}{'import ms':>12}{'budget ms':>12}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f"{result['scenario']:<28}{result['wall_ms']:>10}{result['import_ms']:>12}{result['budget_ms']:>12}")
+    for result in results if args.top else []:
+        print(f"\nSlowest imports, {result['command']}")
+        for module, cumulative_us in result['slowest_imports']:
+            print(f'  {cumulative_us / 1000:>8.1f} ms  {module}')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as json_file:
+            json.dump({'settings': vars(args), 'results': results}, json_file, indent=4)
+    if failures:
+        print('\nStartup budget exceeded:\n  ' + '\n  '.join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
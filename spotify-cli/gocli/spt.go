@@ -1,10 +1,18 @@
 package main
 
 import (
+	"bufio"
+	"encoding/json"
+	"errors"
 	"fmt"
-	"log"
+	"net"
 	"os"
 	"os/exec"
+	"os/signal"
+	"path/filepath"
+	"runtime"
+	"syscall"
+	"time"
 )
 
 /*
@@ -12,37 +20,144 @@ import (
    The Go wrapper allows the script to be easily run from the command shell without explicityly calling the python interpreter
 
    Example: Use spt <some-command> instead of python -m spt <some-command>
+
+   When `spt daemon` is running, commands are sent to it over its Unix domain socket instead, which skips the python
+   startup. Set SPT_NO_DAEMON=1 to always start a new python process.
 */
 const PYTHON3_ENV = "PYTHON3_EXE"
 const DEFAULT_PYTTHON3_EXE = "python3" // Make sure that this python is included in your PATH
+const DAEMON_SOCKET_ENV = "SPT_DAEMON_SOCKET"
+const NO_DAEMON_ENV = "SPT_NO_DAEMON"
+const DAEMON_CONNECT_TIMEOUT = 200 * time.Millisecond
+const EXIT_USAGE = 2
+const EXIT_CANNOT_EXECUTE = 126
+const EXIT_SIGNALLED = 128 // Plus the signal number, like a shell reports it
 
-func getCLIUsageInstructions() string {
-	print_help_args := []string{"-m", "spt", "--help"}
-	usage_msg, err := exec.Command(os.Getenv(PYTHON3_ENV), print_help_args...).Output()
+// Relayed to python, so it can clean up before exiting. Ctrl-C is not in the list: the terminal already
+// delivers SIGINT to every process in the foreground group, python included, and relaying it would send it twice.
+var forwardedSignals = []os.Signal{syscall.SIGTERM, syscall.SIGHUP}
 
-	if err != nil {
-		log.Fatal(err)
-	}
-	result := string(usage_msg)
-	return result
+// One JSON document per line, see spt/_daemon.py
+type daemonRequest struct {
+	Argv []string `json:"argv"`
+	Cwd  string   `json:"cwd"`
+}
+
+type daemonMessage struct {
+	Stdout   *string `json:"stdout"`
+	Stderr   *string `json:"stderr"`
+	ExitCode *int    `json:"exit_code"`
 }
 
 func validateCLIArguments(args []string) {
 	if len(args) < 1 {
-		fmt.Println(getCLIUsageInstructions())
-		log.Fatal("Invalid usage. Please see the usage instructions above\n")
+		executePython([]string{"-m", "spt", "--help"})
+		fmt.Fprintln(os.Stderr, "Invalid usage. Please see the usage instructions above")
+		os.Exit(EXIT_USAGE)
+	}
+
+}
+
+func getDaemonSocketPath() string {
+	if socketPath := os.Getenv(DAEMON_SOCKET_ENV); socketPath != "" {
+		return socketPath
+	}
+	if runtime.GOOS == "windows" {
+		return "" // The daemon needs Unix domain sockets
 	}
+	return filepath.Join(os.Getenv("HOME"), "Spt", "daemon.sock") // The spt app data folder
+}
 
+// The daemon cannot read the launcher's stdin, e.g. for `spt batch -` or `spt shell`
+func readsStdin(args []string) bool {
+	if args[0] == "shell" {
+		return true
+	}
+	for _, arg := range args {
+		if arg == "-" {
+			return true
+		}
+	}
+	return false
 }
 
-func executePython(args []string) {
-	// Runs the spt python 3 script which should be installed in the default package directory using pip
-	out, err := exec.Command(os.Getenv(PYTHON3_ENV), args...).Output()
+// Runs the command in a running spt daemon, streaming its output as it arrives.
+// Returns false when no daemon accepted the command, so the caller can start python instead.
+func executeWithDaemon(args []string) (int, bool) {
+	socketPath := getDaemonSocketPath()
+	if socketPath == "" || os.Getenv(NO_DAEMON_ENV) != "" || readsStdin(args) {
+		return 0, false
+	}
+	conn, err := net.DialTimeout("unix", socketPath, DAEMON_CONNECT_TIMEOUT)
 	if err != nil {
-		log.Fatal(err)
+		return 0, false // Not running, or a stale socket
+	}
+	defer conn.Close()
+
+	cwd, _ := os.Getwd()
+	if err := json.NewEncoder(conn).Encode(daemonRequest{Argv: args, Cwd: cwd}); err != nil {
+		return 0, false
 	}
-	stdout := string(out)
-	fmt.Println(stdout)
+
+	decoder := json.NewDecoder(bufio.NewReader(conn))
+	for {
+		var message daemonMessage
+		if err := decoder.Decode(&message); err != nil {
+			// The command may already have run, so it is not retried in a new process
+			fmt.Fprintln(os.Stderr, "Lost the connection to the spt daemon:", err)
+			return 1, true
+		}
+		if message.Stdout != nil {
+			os.Stdout.WriteString(*message.Stdout)
+		}
+		if message.Stderr != nil {
+			os.Stderr.WriteString(*message.Stderr)
+		}
+		if message.ExitCode != nil {
+			return *message.ExitCode, true
+		}
+	}
+}
+
+func getExitCode(state *os.ProcessState) int {
+	if status, ok := state.Sys().(syscall.WaitStatus); ok && status.Signaled() {
+		return EXIT_SIGNALLED + int(status.Signal())
+	}
+	return state.ExitCode()
+}
+
+// Runs the spt python 3 script which should be installed in the default package directory using pip.
+// Python writes straight to our stdout and stderr, so output streams as it is produced, e.g. into jq or head.
+// Returns the exit code of python.
+func executePython(args []string) int {
+	cmd := exec.Command(os.Getenv(PYTHON3_ENV), args...)
+	cmd.Stdin = os.Stdin
+	cmd.Stdout = os.Stdout
+	cmd.Stderr = os.Stderr
+
+	signals := make(chan os.Signal, 1)
+	signal.Notify(signals, append(forwardedSignals, os.Interrupt)...)
+	defer signal.Stop(signals)
+
+	if err := cmd.Start(); err != nil {
+		fmt.Fprintln(os.Stderr, "Could not start python:", err)
+		return EXIT_CANNOT_EXECUTE
+	}
+	go func() {
+		for received := range signals {
+			if received != os.Interrupt {
+				cmd.Process.Signal(received)
+			}
+		}
+	}()
+
+	err := cmd.Wait()
+	var exitError *exec.ExitError
+	if err != nil && !errors.As(err, &exitError) {
+		fmt.Fprintln(os.Stderr, "Python did not run to completion:", err)
+		return EXIT_CANNOT_EXECUTE
+	}
+	return getExitCode(cmd.ProcessState)
 }
 
 func setupPythonExe() {
@@ -53,12 +168,17 @@ func setupPythonExe() {
 }
 
 func main() {
-	setupPythonExe()
-	fmt.Println("Python Executable: ", os.Getenv(PYTHON3_ENV))
 	cmd_line_args := os.Args[1:]
+	if len(cmd_line_args) > 0 {
+		if exit_code, handled := executeWithDaemon(cmd_line_args); handled {
+			os.Exit(exit_code)
+		}
+	}
+
+	setupPythonExe()
 	default_args := []string{"-m", "spt"}
 
 	validateCLIArguments(cmd_line_args)
 	python_script_args := append(default_args, cmd_line_args...)
-	executePython(python_script_args)
+	os.Exit(executePython(python_script_args))
 }
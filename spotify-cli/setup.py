@@ -19,7 +19,10 @@ setuptools.setup(
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
+    extras_require={
+        "fast-json": ["orjson"]
+    },
     data_files=[
         ("config", ["spt/config/sptconfig.ini"])
     ],
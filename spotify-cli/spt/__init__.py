@@ -4,6 +4,7 @@ import sys
 # Dont wanna expose all modules to clients using __all__
 # Todo, rather import private modules here and alias them?
 WORKING_DIR = os.path.dirname(os.path.realpath(__file__))
+CALLER_WORKING_DIR = os.getcwd()  # Relative paths given on the command line are relative to this
 sys.path.append(WORKING_DIR)
 
 # Set working dir, before main script executes
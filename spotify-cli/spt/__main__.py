@@ -1,56 +1,14 @@
-import argparse
+import os
 import sys
 import traceback
-import typing
 
 import _app_config
-import _cli_parser as cli
 import _env_manager
 import _shared_mod
+from _command_dispatcher import CommandDispatcher
 from _logger import default_logger as log
 
 
-class CommandDispatcher:
-    def __init__(self, parser_obj: argparse.ArgumentParser):
-        self._parser = parser_obj
-        self._command_handler_map = {
-            'login': cli.LoginCommandHandler,
-            'library': cli.LibraryCommandHandler,
-            'personalise': cli.PersonalisationCommandHandler
-        }
-
-    def _extract_subcommand_from_stdin(self):
-        log.debug(f'Extracting command to execute from STDIN: {sys.argv}')
-        subcommand = str(sys.argv[1]).strip().lower()
-        if subcommand not in self._command_handler_map.keys():
-            raise _shared_mod.InvalidCommandError(f'Invalid or unsupported command | {subcommand} |')
-        return subcommand
-
-    def _get_command_handler(self, command: str) -> typing.Type[cli.CommandHandler]:
-        handler_class = self._command_handler_map.get(command)
-        if not issubclass(handler_class, cli.CommandHandler):
-            raise _shared_mod.InvalidCommandHandlerError(f'Handler must be a subclass of {cli.CommandHandler.__name__}')
-        log.debug(f'Found handler {handler_class.__name__} for  command {command}')
-        return handler_class
-
-    @staticmethod
-    def _validate_args():
-        if not len(sys.argv) >= 2:
-            raise _shared_mod.InvalidUsageError
-
-    def execute(self):
-        log.debug('Executing CommandDispatcher')
-        self._validate_args()
-        selected_command = self._extract_subcommand_from_stdin()
-        if selected_command in ('help', '-h', '--help'):
-            log.info('Print help\n')
-            return
-        command_handler = self._get_command_handler(selected_command)
-        handler_context = self._parser.parse_args()
-        handlder_obj = command_handler(handler_context)
-        handlder_obj.execute()
-
-
 class BootStrapper:
     @staticmethod
     def execute():
@@ -62,24 +20,23 @@ class BootStrapper:
         log.debug(' > Global configuration loaded')
 
 
-def main():
+def get_caller_working_dir() -> str:
+    """The directory spt was started from. Importing the spt package changes the working directory"""
+    package = sys.modules.get(__package__) if __package__ else None
+    return getattr(package, 'CALLER_WORKING_DIR', None) or os.getcwd()
+
+
+def main() -> int:
     try:
         log.info(_shared_mod.APP_INFO_LOG)
         BootStrapper.execute()
-        cmd_dispatcher = CommandDispatcher(parser_obj=cli.main_cli_parser)
-        cmd_dispatcher.execute()
-    except _shared_mod.InvalidCommandError:
-        log.error("Unknown command detected, please see usage instructions below")
-        cli.main_cli_parser.print_help()
-    except _shared_mod.InvalidUsageError:
-        log.error("Wrong usage, please see usage instructions below")
-        cli.main_cli_parser.print_help()
     except Exception as ex:
         log.error(_shared_mod.CRITICAL_ERROR_LOG % ex)
-    finally:
-        # Dump error details to file logger for trouble-shooting
         log.debug(traceback.format_exc())
+        return 1
+    cmd_dispatcher = CommandDispatcher()
+    return cmd_dispatcher.run(working_dir=get_caller_working_dir())
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -1,13 +1,14 @@
 import configparser
+import importlib.resources
 import os
 import pathlib
 import shutil
 
-import pkg_resources
-
 import _shared_mod
 from _env_manager import EnvironmentManager
 
+PACKAGED_CONFIG_FILE = 'config/sptconfig.ini'
+
 
 class GlobalConfiguration:
     __config_store = 'config/sptconfig.ini'
@@ -15,13 +16,24 @@ class GlobalConfiguration:
     AppSettings = {}
     LogSettings = {}
 
+    @staticmethod
+    def _get_packaged_config_path():
+        """The sptconfig.ini shipped with the package, or the one next to the working directory when run from source"""
+        try:
+            packaged_config = importlib.resources.files('spt').joinpath(PACKAGED_CONFIG_FILE)  # Python 3.9+
+            if packaged_config.is_file():
+                return str(packaged_config)
+        except (AttributeError, ImportError, TypeError):
+            pass
+        return PACKAGED_CONFIG_FILE
+
     @staticmethod
     def _copy_config_to_app_data_path():
-        _ = pkg_resources.resource_filename('spt', 'config/sptconfig.ini')
+        packaged_config = GlobalConfiguration._get_packaged_config_path()
         pathlib.Path(os.path.join(EnvironmentManager.get_app_data_dir(), 'config')).mkdir(parents=True, exist_ok=True)
         destination = os.path.join(EnvironmentManager.get_app_data_dir(), 'config', 'sptconfig.ini')
         if not os.path.exists(destination):
-            shutil.copyfile('config/sptconfig.ini', destination)
+            shutil.copyfile(packaged_config, destination)
             shutil.rmtree('config/', ignore_errors=True)
         return destination
 
@@ -74,4 +86,10 @@ class GlobalConfiguration:
         config = GlobalConfiguration.get_configuration()
         return config.get('APP_SETTINGS', 'APP_NAME')
 
+    @staticmethod
+    def get_setting(section: str, option: str, fallback=None):
+        """Read a single setting, falling back when an older config file does not define it yet"""
+        config = GlobalConfiguration.get_configuration()
+        return config.get(section, option, fallback=fallback)
+
     # endregion
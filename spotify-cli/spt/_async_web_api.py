@@ -0,0 +1,163 @@
+"""Asyncio counterparts of the Spotify Web API wrappers.
+
+The blocking request executors stay the single implementation of a request; the async variants run them on a
+thread pool sharing the pooled HTTP session, while a semaphore bounds how many requests are in flight at once.
+
+This is not async I/O. spt depends on requests only, and the cache, retry policy, single-flight and timings all live
+in the blocking executors, so every request in flight still holds a worker thread. The event loop stays free, but
+concurrency is capped by `max_concurrency` threads, the same as a thread pool would give. Going beyond that would
+need an async HTTP client underneath, with the sync API wrapping it instead.
+"""
+
+__all__ = ['AsyncRequestEngine', 'AsyncGetRequestExecutor', 'AsyncUserProfileAPI', 'AsyncPersonalisationAPI',
+           'AsyncTracksAPI']
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, List
+
+import _authorizer
+import _shared_mod
+import _spotify_web_api as spotify
+from _http_session import HttpSessionManager
+
+
+class AsyncRequestEngine:
+    """Runs blocking calls on a dedicated thread pool, allowing at most `max_concurrency` of them at a time"""
+    __default_engine = None
+    __lock = threading.Lock()
+
+    def __init__(self, max_concurrency: int = None):
+        if max_concurrency is None:
+            max_concurrency = HttpSessionManager.get_settings().max_concurrency
+        self._max_concurrency = max_concurrency
+        self._thread_pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='spt-async')
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    @staticmethod
+    def get_default():
+        if AsyncRequestEngine.__default_engine is None:
+            with AsyncRequestEngine.__lock:
+                if AsyncRequestEngine.__default_engine is None:
+                    AsyncRequestEngine.__default_engine = AsyncRequestEngine()
+        return AsyncRequestEngine.__default_engine
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores are bound to the loop they are first used on, so create one per running loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def run(self, func, *args, **kwargs):
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            # Unlike tasks, executor threads do not inherit the caller's context variables on their own
+            call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+            return await loop.run_in_executor(self._thread_pool, call)
+
+    def close(self):
+        self._thread_pool.shutdown(wait=True)
+
+
+# region Request executors
+
+class AsyncRequestExecutorMixin:
+    """Adds an awaitable `execute_async` to a RequestExecutorBase subclass"""
+
+    def __init__(self, *args, engine: AsyncRequestEngine = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._engine = engine or AsyncRequestEngine.get_default()
+
+    async def execute_async(self):
+        return await self._engine.run(self.execute)
+
+
+class AsyncGetRequestExecutor(AsyncRequestExecutorMixin, spotify.GetRequestExecutor):
+    pass
+
+
+# endregion
+
+
+# region Spotify API Reference
+
+class AsyncSpotifyAPIBase:
+    def __init__(self, sync_api: spotify.SpotifyAPIBase, engine: AsyncRequestEngine = None):
+        self._sync_api = sync_api
+        self._engine = engine or AsyncRequestEngine.get_default()
+
+    async def _fetch_page(self, url: str, url_params: dict = None) -> dict:
+        return await self._engine.run(self._sync_api._fetch_json, url, url_params)
+
+    async def iter_items(self, url: str, url_params: dict = None) -> AsyncIterator[dict]:
+        """Async version of SpotifyAPIBase.iter_items, requesting page N+1 while page N is being consumed"""
+        pending_page = asyncio.ensure_future(self._fetch_page(url, url_params))
+        try:
+            while pending_page is not None:
+                page = await pending_page
+                next_url = page.get('next')
+                pending_page = asyncio.ensure_future(self._fetch_page(next_url)) if next_url else None
+                for item in page.get('items', []):
+                    yield item
+        finally:
+            if pending_page is not None:
+                pending_page.cancel()
+
+
+class AsyncUserProfileAPI(AsyncSpotifyAPIBase):
+    def __init__(self, engine: AsyncRequestEngine = None, user: _authorizer.UserContext = None):
+        super().__init__(spotify.UserProfileAPI(user), engine)
+
+    async def get_current_users_profile(self):
+        return await self._engine.run(self._sync_api.get_current_users_profile)
+
+    async def get_public_users_profile(self, user_id: str):
+        return await self._engine.run(self._sync_api.get_public_users_profile, user_id)
+
+
+class AsyncPersonalisationAPI(AsyncSpotifyAPIBase):
+    def __init__(self, params: _shared_mod.PersonlisationParams, engine: AsyncRequestEngine = None,
+                 user: _authorizer.UserContext = None):
+        super().__init__(spotify.PersonalisationAPI(params, user), engine)
+
+    async def get_top_tracks_and_artists(self):
+        return await self._engine.run(self._sync_api.get_top_tracks_and_artists)
+
+    def iter_top_tracks_and_artists(self) -> AsyncIterator[dict]:
+        return self.iter_items(self._sync_api.get_top_items_url(), self._sync_api.get_all_items_params())
+
+
+class AsyncTracksAPI(AsyncSpotifyAPIBase):
+    def __init__(self, engine: AsyncRequestEngine = None, user: _authorizer.UserContext = None):
+        super().__init__(spotify.TracksAPI(user), engine)
+
+    async def get_track(self, track_id: str):
+        return await self._engine.run(self._sync_api.get_track, track_id)
+
+    async def get_audio_featues(self, track_id: str):
+        return await self._engine.run(self._sync_api.get_audio_featues, track_id)
+
+    async def get_several_tracks(self, track_ids: Iterable[str]) -> Dict[str, dict]:
+        return await self._engine.run(self._sync_api.get_several_tracks, list(track_ids))
+
+    async def get_several_audio_features(self, track_ids: Iterable[str]) -> Dict[str, dict]:
+        return await self._engine.run(self._sync_api.get_several_audio_features, list(track_ids))
+
+    async def get_audio_anlysis(self, track_id: str):
+        return await self._engine.run(self._sync_api.get_audio_anlysis, track_id)
+
+    async def get_tracks(self, track_ids: Iterable[str]) -> List[dict]:
+        """Fetch several tracks concurrently, results are returned in the same order as the input ids"""
+        return list(await asyncio.gather(*(self.get_track(track_id) for track_id in track_ids)))
+
+# endregion
@@ -0,0 +1,67 @@
+"""Persistent memo of track audio features. Audio features never change, so entries are never revalidated"""
+
+__all__ = ['AudioFeaturesStore']
+
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+
+from _env_manager import EnvironmentManager
+
+# SQLite limits the number of host parameters per statement, so large lookups are split
+MAX_IDS_PER_QUERY = 500
+
+
+class AudioFeaturesStore:
+    __connection = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_store_path() -> str:
+        store_dir = os.path.join(EnvironmentManager.get_app_data_dir(), 'store')
+        pathlib.Path(store_dir).mkdir(parents=True, exist_ok=True)
+        return os.path.join(store_dir, 'audio_features.db')
+
+    @staticmethod
+    def _get_connection() -> sqlite3.Connection:
+        if AudioFeaturesStore.__connection is None:
+            connection = sqlite3.connect(AudioFeaturesStore.get_store_path(), check_same_thread=False)
+            connection.execute('CREATE TABLE IF NOT EXISTS audio_features ('
+                               'track_id TEXT PRIMARY KEY, '
+                               'payload TEXT NOT NULL)')
+            connection.commit()
+            AudioFeaturesStore.__connection = connection
+        return AudioFeaturesStore.__connection
+
+    @staticmethod
+    def get_many(track_ids: List[str]) -> Dict[str, dict]:
+        """Return the stored features for the given ids. Unknown ids are left out of the result"""
+        found = {}
+        with AudioFeaturesStore.__lock:
+            connection = AudioFeaturesStore._get_connection()
+            for start in range(0, len(track_ids), MAX_IDS_PER_QUERY):
+                id_batch = track_ids[start:start + MAX_IDS_PER_QUERY]
+                placeholders = ','.join('?' * len(id_batch))
+                rows = connection.execute(f'SELECT track_id, payload FROM audio_features '
+                                          f'WHERE track_id IN ({placeholders})', id_batch)
+                found.update((track_id, json.loads(payload)) for track_id, payload in rows)
+        return found
+
+    @staticmethod
+    def put_many(features: Iterable[dict]) -> int:
+        rows = [(item['id'], json.dumps(item)) for item in features if item]
+        with AudioFeaturesStore.__lock:
+            connection = AudioFeaturesStore._get_connection()
+            connection.executemany('INSERT OR REPLACE INTO audio_features (track_id, payload) VALUES (?, ?)', rows)
+            connection.commit()
+        return len(rows)
+
+    @staticmethod
+    def close():
+        with AudioFeaturesStore.__lock:
+            if AudioFeaturesStore.__connection is not None:
+                AudioFeaturesStore.__connection.close()
+                AudioFeaturesStore.__connection = None
@@ -0,0 +1,136 @@
+"""Local listener for the OAuth redirect. Only imported and bound while a login is pending"""
+
+__all__ = ['AuthorizationServer', 'AuthServerStatus']
+
+import os
+import threading
+import traceback
+import typing
+from enum import Enum
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import _shared_mod
+from _logger import default_logger as log
+
+DEFAULT_CALLBACK_PATH = '/authcallback'
+POLL_INTERVAL = 0.2  # In seconds. How quickly a shutdown request is noticed
+
+
+class AuthServerStatus(Enum):
+    RUNNING = 'RUNNING'
+    STOPPED = 'STOPPED'
+
+
+class _CallbackRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        log.debug(f'Authorization server: {format % args}')
+
+    @property
+    def listener(self) -> 'AuthorizationServer':
+        return self.server.listener
+
+    def _send_text(self, text: str, status=HTTPStatus.OK):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != self.listener.callback_path:
+            return self._send_text('Nothing to see here', HTTPStatus.NOT_FOUND)
+
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        try:
+            code = query.get('code')
+            if code in (None, ''):
+                raise _shared_mod.SpotifyAuthenticationError(f'Authorization code not granted. {query}')
+            self.listener.on_code_received(code, query.get('state'))
+        except Exception as ex:
+            log.error(traceback.format_exc())
+            self._send_text(f'Unexpected authentication error. Please try again later.\n{ex}', HTTPStatus.BAD_REQUEST)
+            self.listener.on_completed(True)
+            return
+
+        # Answer the browser before reporting completion, since the CLI may exit as soon as it is notified
+        self._send_text('Authorization Code granted. You can close this window.')
+        self.listener.on_completed(False)
+
+
+class AuthorizationServer:
+    """Receives the authorization code on the redirect URI, then hands it to `on_code_received`.
+
+    `on_completed(has_error)` is called after the browser has been answered.
+    """
+
+    def __init__(self, host: str, port: int, callback_path: str,
+                 on_code_received: typing.Callable[[str, typing.Optional[str]], typing.Any],
+                 on_completed: typing.Callable[[bool], typing.Any]):
+        self.host = host
+        self.port = port
+        self.callback_path = callback_path.rstrip('/') or DEFAULT_CALLBACK_PATH
+        self.on_code_received = on_code_received
+        self.on_completed = on_completed
+        self._httpd: HTTPServer = None
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, on_code_received, on_completed):
+        """Listen on SPT_HOST_IP:SPT_HOST_PORT, on the path of SPT_REDIRECT_URI"""
+        callback_path = urlparse(os.getenv('SPT_REDIRECT_URI', '')).path or DEFAULT_CALLBACK_PATH
+        return cls(os.getenv('SPT_HOST_IP'), int(os.getenv('SPT_HOST_PORT')), callback_path,
+                   on_code_received, on_completed)
+
+    @property
+    def status(self) -> AuthServerStatus:
+        return AuthServerStatus.RUNNING if self._httpd is not None else AuthServerStatus.STOPPED
+
+    def start(self):
+        """Bind the port on the calling thread, so startup errors surface here, and serve in the background"""
+        with self._lock:
+            if self._httpd is not None:
+                return self.status
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join()  # A shutdown requested by the previous login may still be releasing the port
+            try:
+                httpd = HTTPServer((self.host, self.port), _CallbackRequestHandler)
+            except Exception as ex:
+                raise _shared_mod.LocalAuthServerStartupError(ex)
+            httpd.listener = self
+            self._httpd = httpd
+            # Daemon thread, so a cancelled or timed out login does not keep the process alive
+            self._thread = threading.Thread(target=self._serve, args=[httpd], name='spt-auth-server', daemon=True)
+            self._thread.start()
+        log.debug(f'Authorization Server listening at {self.host}:{self.port}{self.callback_path}')
+        return self.status
+
+    @staticmethod
+    def _serve(httpd: HTTPServer):
+        try:
+            httpd.serve_forever(poll_interval=POLL_INTERVAL)
+        finally:
+            httpd.server_close()
+
+    def shutdown(self):
+        """Stop listening. Safe to call from a request handler, which runs on the serving thread"""
+        with self._lock:
+            httpd, self._httpd = self._httpd, None
+            thread = self._thread
+        if httpd is None:
+            log.debug('Server not running. Ignoring shutdown signal')
+            return self.status
+
+        log.debug('Shutdown Authorization Sever signal received')
+        if threading.current_thread() is thread:
+            # serve_forever returns once the current request has been handled
+            threading.Thread(target=httpd.shutdown, name='spt-auth-server-shutdown', daemon=True).start()
+        else:
+            httpd.shutdown()
+        return self.status
@@ -1,26 +1,30 @@
 """Handles Spotify Authorization Code Flow"""
 
-__all__ = ['AuthorizerService', 'AuthorizationServer', 'AuthEvent', 'AuthServerStatus']
+__all__ = ['AuthorizerService', 'AuthEvent', 'CredentialManager', 'TokenManager', 'UserContext']
 
-import json
+import hashlib
+import heapq
+import itertools
 import os
 import threading
-import traceback
+import time
 import typing
 import urllib.parse as urllib
 import uuid
 import webbrowser
+from collections import OrderedDict
+from concurrent.futures import Future
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from http import HTTPStatus
 
-import flask
 import requests
 
 import _app_config as cfg
-import _env_manager
 import _shared_mod
+from _credential_store import DEFAULT_PROFILE, CredentialStore, create_credential_store
+from _http_session import HttpSessionManager
 from _logger import default_logger as log
 
 DEFAULT_SCOPES = ' '.join([_shared_mod.SpotifyScope.READ_PRIVATE.value,
@@ -30,6 +34,10 @@ DEFAULT_SCOPES = ' '.join([_shared_mod.SpotifyScope.READ_PRIVATE.value,
 STD_DATETIME_FMT = '%Y%m%d_%H:%M:%S'
 AUTHENTICATION_ERROR = 'Authorization code not received.\nError Code: Http %s.\nError Message: %s'
 TOKEN_REFRESH_ERROR = 'Token refresh request failed.\nError Code: Http %s.\nError Message: %s'
+DEFAULT_LOGIN_TIMEOUT = 300  # In seconds
+DEFAULT_REFRESH_AHEAD_RATIO = 0.8  # Refresh once this fraction of the token lifetime has passed
+REFRESH_RETRY_DELAY = 30  # In seconds
+DEFAULT_MAX_LOADED_PROFILES = 256
 
 
 class AuthEvent(Enum):
@@ -39,11 +47,6 @@ class AuthEvent(Enum):
     AUTH_STARTED = 'AUTH_STARTED'
 
 
-class AuthServerStatus(Enum):
-    RUNNING = 'RUNNING'
-    STOPPED = 'STOPPED'
-
-
 @dataclass
 class SpotifyToken:
     access_token: str = ''
@@ -61,8 +64,14 @@ class SpotifyToken:
         token.token_type = json_response[_shared_mod.SpotifyAuthSections.TOKEN_TYPE.value]
         token.scopes = json_response[_shared_mod.SpotifyAuthSections.SCOPE.value]
         token.expires_in = json_response[_shared_mod.SpotifyAuthSections.EXPIRES_IN.value]
+        token.last_refreshed = datetime.now()
         return token
 
+    def get_seconds_until_refresh(self, refresh_ahead_ratio: float) -> float:
+        """Seconds until `refresh_ahead_ratio` of the token lifetime has passed. Negative when already due"""
+        elapsed_seconds = (datetime.now() - self.last_refreshed).total_seconds()
+        return int(self.expires_in or 0) * refresh_ahead_ratio - elapsed_seconds
+
     @property
     def has_expired(self):
         elapsed_seconds = (datetime.now() - self.last_refreshed).total_seconds()
@@ -79,8 +88,8 @@ class SpotifyToken:
 
     def has_scopes(self, scopes: str):
         """Verify that the currently granted token has the passed in scopes"""
-        input_scopes_list = filter(lambda x: x not in (None, ''), scopes.split(' '))
-        granted_scopes_list = filter(lambda x: x not in (None, ''), self.scopes.split(' '))
+        input_scopes_list = [x for x in scopes.split(' ') if x not in (None, '')]
+        granted_scopes_list = [x for x in self.scopes.split(' ') if x not in (None, '')]
         return all(item in granted_scopes_list for item in input_scopes_list)
 
     def to_dict(self):
@@ -95,25 +104,268 @@ class SpotifyToken:
         return token
 
 
+@dataclass(frozen=True)
+class UserContext:
+    """The user a request is made for. Every profile has its own token, refresh schedule and granted scopes"""
+    profile: str = DEFAULT_PROFILE
+
+    @classmethod
+    def get_default(cls):
+        return cls(os.getenv('SPT_PROFILE') or DEFAULT_PROFILE)
+
+
+class _RefreshScheduler:
+    """Runs the background refreshes of every loaded profile on one daemon thread, soonest first.
+
+    A manager has at most one pending refresh. Rescheduling or cancelling clears the previous heap entry, so it no
+    longer holds on to the manager and its token, e.g. after the profile was evicted.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._queue = []  # Heap of [due at, sequence number, manager, credentials]. Cancelled entries hold None
+        self._pending: typing.Dict['CredentialManager', list] = {}
+        self._cancelled = 0
+        self._sequence = itertools.count()
+        self._thread = None
+
+    def _cancel_entry(self, manager: 'CredentialManager'):
+        entry = self._pending.pop(manager, None)
+        if entry is not None:
+            entry[2] = entry[3] = None
+            self._cancelled += 1
+            if self._cancelled > len(self._queue) // 2:  # Drop cancelled entries instead of waiting until they are due
+                self._queue = [entry for entry in self._queue if entry[2] is not None]
+                heapq.heapify(self._queue)
+                self._cancelled = 0
+
+    def schedule(self, delay_seconds: float, manager: 'CredentialManager', credentials: SpotifyToken):
+        with self._condition:
+            self._cancel_entry(manager)
+            entry = [time.monotonic() + max(0.0, delay_seconds), next(self._sequence), manager, credentials]
+            heapq.heappush(self._queue, entry)
+            self._pending[manager] = entry
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='spt-token-refresh', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, manager: 'CredentialManager'):
+        with self._condition:
+            self._cancel_entry(manager)
+
+    def get_pending_count(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    self._condition.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                _, _, manager, credentials = heapq.heappop(self._queue)
+                if manager is None:
+                    self._cancelled -= 1
+                    continue
+                del self._pending[manager]
+            manager._refresh_in_background(credentials)
+
+
+class CredentialManager:
+    """Keeps one profile's token in memory and refreshes it in the background before it expires.
+
+    The credential store is read once. Afterwards tokens are handed out from memory, and a refresh is scheduled at
+    REFRESH_AHEAD_RATIO of the token lifetime, so requests never wait for a token POST unless the process was
+    suspended past the expiry time.
+    """
+    __scheduler = _RefreshScheduler()
+
+    def __init__(self, profile: str, store: CredentialStore):
+        self.profile = profile
+        self._store = store
+        self._credentials: SpotifyToken = None
+        self._loaded = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def get_refresh_ahead_ratio() -> float:
+        return float(cfg.GlobalConfiguration.get_setting('AUTH_SETTINGS', 'REFRESH_AHEAD_RATIO',
+                                                         fallback=DEFAULT_REFRESH_AHEAD_RATIO))
+
+    @property
+    def store(self) -> CredentialStore:
+        return self._store
+
+    def load_saved_credentials(self) -> typing.Optional[SpotifyToken]:
+        credentials = self._store.load()
+        if credentials is None:
+            return None
+
+        saved_credentials = SpotifyToken.from_json_response(credentials)
+        saved_credentials.last_refreshed = datetime.strptime(credentials['last_refreshed'], STD_DATETIME_FMT)
+        return saved_credentials
+
+    def save(self, json_response: dict) -> SpotifyToken:
+        token_object = SpotifyToken.from_json_response(json_response)
+        self._store.save(token_object.to_dict())
+        log.debug(f'Security info succcessfully stored for profile {self.profile}.')
+        return self.set_credentials(token_object)
+
+    def get_credentials(self) -> typing.Optional[SpotifyToken]:
+        if self._loaded:
+            return self._credentials
+
+        with self._lock:
+            if not self._loaded:
+                credentials = self.load_saved_credentials()
+                self._loaded = True
+                self._replace(credentials)
+        return self._credentials
+
+    def set_credentials(self, credentials: SpotifyToken):
+        with self._lock:
+            self._loaded = True
+            self._replace(credentials)
+        return credentials
+
+    def _replace(self, credentials: SpotifyToken):
+        self._credentials = credentials
+        if credentials is not None:
+            self._schedule_refresh(credentials.get_seconds_until_refresh(CredentialManager.get_refresh_ahead_ratio()))
+
+    def _schedule_refresh(self, delay_seconds: float):
+        credentials = self._credentials
+        if self._closed or credentials is None or not credentials.has_refresh_token:
+            return
+        CredentialManager.__scheduler.schedule(delay_seconds, self, credentials)
+        log.debug(f'Access token refresh for profile {self.profile} scheduled in {max(0.0, delay_seconds):.0f} '
+                  f'seconds')
+
+    def _refresh_in_background(self, credentials: SpotifyToken):
+        if self._closed or self._credentials is not credentials:
+            return  # Replaced or evicted since the refresh was scheduled
+        try:
+            self.refresh(credentials)
+        except Exception as ex:
+            # Once the token has expired, the next request refreshes inline instead
+            log.warn(f'Background access token refresh for profile {self.profile} failed. {ex}')
+            with self._lock:
+                if self._credentials is credentials and not credentials.has_expired:
+                    log.debug(f'Retrying access token refresh in {REFRESH_RETRY_DELAY} seconds')
+                    self._schedule_refresh(REFRESH_RETRY_DELAY)
+
+    def refresh(self, stale_credentials: SpotifyToken) -> SpotifyToken:
+        """Refresh the token, unless another thread or process already replaced `stale_credentials`.
+
+        Threads are serialised with a lock and processes with the credential store's lock. Whoever gets the lock
+        second re-reads the store and adopts the token the first one saved, instead of refreshing again.
+        """
+        with self._refresh_lock:
+            current = self._credentials
+            if current is not None and current.access_token != stale_credentials.access_token:
+                return current
+
+            with self._store.lock():
+                saved_credentials = self.load_saved_credentials()
+                if saved_credentials is not None and saved_credentials.get_seconds_until_refresh(
+                        CredentialManager.get_refresh_ahead_ratio()) > 0:
+                    log.debug('Access token already refreshed by another process')
+                    return self.set_credentials(saved_credentials)
+                return self.save(AuthorizerService.request_token_refresh(stale_credentials))
+
+    def close(self):
+        """Stop refreshing. Used when the profile is evicted from the TokenManager"""
+        self._closed = True
+        CredentialManager.__scheduler.cancel(self)
+
+
+class TokenManager:
+    """One CredentialManager per profile. Only the MAX_LOADED_PROFILES most recently used profiles stay loaded"""
+    __managers: 'OrderedDict[str, CredentialManager]' = OrderedDict()
+    __stores: typing.Dict[str, CredentialStore] = {}
+    __lock = threading.Lock()
+
+    @staticmethod
+    def get_max_loaded_profiles() -> int:
+        return int(cfg.GlobalConfiguration.get_setting('AUTH_SETTINGS', 'MAX_LOADED_PROFILES',
+                                                       fallback=DEFAULT_MAX_LOADED_PROFILES))
+
+    @staticmethod
+    def _resolve_profile(user: UserContext = None) -> str:
+        return (user or UserContext.get_default()).profile
+
+    @staticmethod
+    def get_store(user: UserContext = None) -> CredentialStore:
+        profile = TokenManager._resolve_profile(user)
+        with TokenManager.__lock:
+            store = TokenManager.__stores.get(profile)
+            if store is None:
+                store = TokenManager.__stores[profile] = create_credential_store(profile=profile)
+        return store
+
+    @staticmethod
+    def set_store(store: CredentialStore, user: UserContext = None):
+        """Use another backend for a profile, e.g. a MemoryCredentialStore in tests. The token is reloaded from it"""
+        profile = TokenManager._resolve_profile(user)
+        with TokenManager.__lock:
+            TokenManager.__stores[profile] = store
+        TokenManager.reset(user)
+        return store
+
+    @staticmethod
+    def get(user: UserContext = None) -> CredentialManager:
+        profile = TokenManager._resolve_profile(user)
+        with TokenManager.__lock:
+            manager = TokenManager.__managers.get(profile)
+            if manager is not None:
+                TokenManager.__managers.move_to_end(profile)
+                return manager
+
+        manager = CredentialManager(profile, TokenManager.get_store(user))
+        with TokenManager.__lock:
+            manager = TokenManager.__managers.setdefault(profile, manager)
+            TokenManager.__managers.move_to_end(profile)
+            while len(TokenManager.__managers) > TokenManager.get_max_loaded_profiles():
+                evicted_profile, evicted = TokenManager.__managers.popitem(last=False)
+                evicted.close()
+                log.debug(f'Unloaded the token of profile {evicted_profile}')
+        return manager
+
+    @staticmethod
+    def reset(user: UserContext = None):
+        """Forget the in-memory token of a profile, so the next access loads it from the credential store again"""
+        with TokenManager.__lock:
+            manager = TokenManager.__managers.pop(TokenManager._resolve_profile(user), None)
+        if manager is not None:
+            manager.close()
+
+    @staticmethod
+    def get_loaded_profiles() -> typing.List[str]:
+        with TokenManager.__lock:
+            return list(TokenManager.__managers.keys())
+
+
 class AuthorizerService:
-    __default_security_store = '.credentials.json'
-    __current_user_email = 'todo@spotify.com'
     __auth_subscribers = {}
-    __credentials = None
     __state_key = ''
+    __login_user: UserContext = None
+    __pending_login: Future = None
+    __callback_server = None
+    __login_lock = threading.Lock()
 
     @staticmethod
-    def _load_saved_credentials():
-        credpath = os.getenv('SPT_SECURITY_STORE', default=AuthorizerService.__default_security_store)
-        if not os.path.exists(credpath):
-            return None
+    def get_credential_store(user: UserContext = None) -> CredentialStore:
+        return TokenManager.get_store(user)
+
+    @staticmethod
+    def set_credential_store(store: CredentialStore, user: UserContext = None):
+        return TokenManager.set_store(store, user)
 
-        with open(credpath) as json_file:
-            credentials = json.load(json_file)
-            last_refreshed = datetime.strptime(credentials['last_refreshed'], STD_DATETIME_FMT)
-            AuthorizerService.__credentials = SpotifyToken.from_json_response(credentials)
-            AuthorizerService.__credentials.last_refreshed = last_refreshed
-            return AuthorizerService.__credentials
+    @staticmethod
+    def _load_saved_credentials(user: UserContext = None):
+        return TokenManager.get(user).load_saved_credentials()
 
     # region Event handlers
 
@@ -126,16 +378,23 @@ class AuthorizerService:
             return
         AuthorizerService.__auth_subscribers[event_id] = [event_handler]
 
+    @staticmethod
+    def _complete_pending_login(succeeded: bool):
+        with AuthorizerService.__login_lock:
+            pending_login, AuthorizerService.__pending_login = AuthorizerService.__pending_login, None
+        if pending_login is not None and not pending_login.done():
+            pending_login.set_result(succeeded)
+
     @staticmethod
     def notify_auth_completed(has_error: bool):
+        AuthorizerService._complete_pending_login(succeeded=not has_error)
+        AuthorizerService._stop_callback_server()
         subscriber_list = AuthorizerService.__auth_subscribers.get(AuthEvent.AUTH_COMPLETED)
+
         if not subscriber_list:
             log.debug(f'No subscriibers registered for {AuthEvent.AUTH_COMPLETED} event')
             return
 
-        if not has_error:
-            AuthorizationServer.shutdown()
-
         log.debug(f'Raise {AuthEvent.AUTH_COMPLETED} event. Subscribers {subscriber_list}')
         for event_handler in subscriber_list:
             event_handler(has_error)
@@ -144,31 +403,45 @@ class AuthorizerService:
 
     # region Authorization code flow handlers
     @staticmethod
-    def _save_credentials(json_response):
-        token_object = SpotifyToken.from_json_response(json_response)
-        credentials_file = os.getenv('SPT_SECURITY_STORE', default=AuthorizerService.__default_security_store)
-        with open(credentials_file, 'w') as json_file:
-            json.dump(token_object.to_dict(), json_file, indent=4)
-            os.system(f"attrib +h {credentials_file}")
-            log.debug('Security info succcessfully stored.')
-            return token_object  # TODO: Is this secure?
+    def _save_credentials(json_response, user: UserContext = None):
+        return TokenManager.get(user).save(json_response)
+
+    @staticmethod
+    def _start_callback_server():
+        from _auth_callback_server import AuthorizationServer  # Only needed while a login is pending
+
+        with AuthorizerService.__login_lock:
+            if AuthorizerService.__callback_server is None:
+                AuthorizerService.__callback_server = AuthorizationServer.from_environment(
+                    on_code_received=AuthorizerService.on_auth_code_received,
+                    on_completed=AuthorizerService.notify_auth_completed)
+            callback_server = AuthorizerService.__callback_server
+        return callback_server.start()
+
+    @staticmethod
+    def _stop_callback_server():
+        if AuthorizerService.__callback_server is not None:
+            AuthorizerService.__callback_server.shutdown()
 
     @staticmethod
-    def on_auth_code_received(request_object: flask.Request):
+    def on_auth_code_received(code: str, state: typing.Optional[str]):
         """Going to use the  authoization code we received to reuqest  an Access/Refresh token from Spotify"""
+        if not state or state != str(AuthorizerService.__state_key):  # A missing state is a forged callback too
+            raise _shared_mod.SpotifyAuthenticationError('Authorization response does not match the login request')
 
-        code = request_object.args.get('code')
         body = {'grant_type': 'authorization_code',
                 'code': code,
                 'client_id': os.getenv('SPT_CLIENT_ID'),
                 'client_secret': os.getenv('SPT_CLIENT_SECRET'),
                 'redirect_uri': os.getenv('SPT_REDIRECT_URI')
                 }
-        response: requests.Response = requests.post(_shared_mod.SpotifyEndPoints.TOKEN_EXCHANGE_URL.value, data=body)
+        response: requests.Response = HttpSessionManager.get_session().post(
+            HttpSessionManager.resolve_url(_shared_mod.SpotifyEndPoints.TOKEN_EXCHANGE_URL.value),
+            data=body, timeout=HttpSessionManager.get_timeout())
         if response.status_code == HTTPStatus.OK:
-            saved_credentials = AuthorizerService._save_credentials(response.json())
-            AuthorizerService.__credentials = saved_credentials
-            AuthorizerService.notify_auth_completed(has_error=False)
+            AuthorizerService._save_credentials(response.json(), AuthorizerService.__login_user)
+            from _response_cache import ResponseCache  # The profile may now belong to another Spotify account
+            ResponseCache.clear()
             return 0
         raise _shared_mod.SpotifyAuthenticationError(AUTHENTICATION_ERROR % (response.status_code, response.text))
 
@@ -177,33 +450,44 @@ class AuthorizerService:
     # region Accessor methods
 
     @staticmethod
-    def get_user_credentials():
-        if AuthorizerService.__credentials is not None:
-            return AuthorizerService.__credentials
-        return AuthorizerService._load_saved_credentials()
+    def get_user_credentials(user: UserContext = None):
+        return TokenManager.get(user).get_credentials()
 
     @staticmethod
-    def get_access_token():
-        credentials = AuthorizerService.get_user_credentials()
+    def get_access_token(user: UserContext = None):
+        credentials = AuthorizerService.get_user_credentials(user)
         return credentials.access_token if credentials is not None else ''
 
     @staticmethod
-    def is_logged_in():
-        if AuthorizerService.get_user_credentials() is None:
+    def get_user_cache_key(user: UserContext = None):
+        """Stable, non-secret identifier of the signed-in profile, used to keep cached responses per user. Not
+        derived from the tokens, which Spotify may rotate on any refresh"""
+        user = user or UserContext.get_default()
+        if AuthorizerService.get_user_credentials(user) is None:
+            return ''
+        return hashlib.sha256(user.profile.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def is_logged_in(user: UserContext = None):
+        manager = TokenManager.get(user)
+        credentials = manager.get_credentials()
+        if credentials is None:
             return False
-        is_authenticated = AuthorizerService.get_user_credentials().is_authenticated
-        if not is_authenticated and AuthorizerService.get_user_credentials().has_expired and \
-                AuthorizerService.get_user_credentials().has_refresh_token:
-            AuthorizerService.refresh_access_token(credentials=AuthorizerService.get_user_credentials())
+        if credentials.is_authenticated:
             return True
-        return is_authenticated
+        if credentials.has_expired and credentials.has_refresh_token:
+            # Normally refreshed ahead of time in the background. Expired here, e.g. after the machine slept
+            manager.refresh(credentials)
+            return True
+        return False
 
     @staticmethod
-    def check_scopes(scopes, request_required_scope=True):
+    def check_scopes(scopes, request_required_scope=True, user: UserContext = None):
         """Check if the required scopes are already granted, else request the scopes from auth server"""
         if isinstance(scopes, list):
             scopes = ' '.join(scopes).strip()
-        has_scopes = AuthorizerService.get_user_credentials().has_scopes(scopes)
+        credentials = AuthorizerService.get_user_credentials(user)
+        has_scopes = credentials is not None and credentials.has_scopes(scopes)
         if has_scopes is False and request_required_scope:
             pass
         return has_scopes
@@ -211,11 +495,9 @@ class AuthorizerService:
     # endregion
 
     @staticmethod
-    def login(scopes=DEFAULT_SCOPES):
-        if AuthorizerService.is_logged_in():
-            log.info(f'Abort. Already logged in as..{AuthorizerService.__current_user_email}')
-            AuthorizerService.notify_auth_completed(has_error=False)
-            return False
+    def _request_authorization(scopes: str, user: UserContext):
+        """Open the Spotify consent page and start the local server that receives the authorization code"""
+        AuthorizerService.__login_user = user
         AuthorizerService.__state_key = uuid.uuid4()
         auth_req_params = {'response_type': 'code',
                            'client_id': os.getenv('SPT_CLIENT_ID'),
@@ -224,33 +506,65 @@ class AuthorizerService:
                            'state': str(AuthorizerService.__state_key),
                            'show_dialog': 'true'}
         auth_url = _shared_mod.SpotifyEndPoints.AUTHORIZE_URL.value + urllib.urlencode(auth_req_params)
+        AuthorizerService._start_callback_server()  # Listen before the browser can be redirected
         log.debug(f'Sending Authentication request to..{auth_url}')
         webbrowser.open_new_tab(auth_url)
-        AuthorizationServer.start()
+
+    @staticmethod
+    def _begin_pending_login(start_flow: typing.Callable[[], typing.Any]) -> Future:
+        pending_login = Future()
+        pending_login.set_running_or_notify_cancel()
+        with AuthorizerService.__login_lock:
+            AuthorizerService.__pending_login = pending_login
+        try:
+            start_flow()
+        except Exception as ex:
+            with AuthorizerService.__login_lock:
+                AuthorizerService.__pending_login = None
+            pending_login.set_exception(ex)
+        return pending_login
+
+    @staticmethod
+    def login(scopes=DEFAULT_SCOPES, user: UserContext = None):
+        user = user or UserContext.get_default()
+        if AuthorizerService.is_logged_in(user):
+            log.info(f'Abort. Already logged in as..{user.profile}')
+            AuthorizerService.notify_auth_completed(has_error=False)
+            return False
+        AuthorizerService._request_authorization(scopes, user)
         return True
 
     @staticmethod
-    def get_more_scopes(new_scopes: str):
-        if AuthorizerService.is_logged_in() is False:
+    def login_async(scopes=DEFAULT_SCOPES, user: UserContext = None) -> Future:
+        """Start the login flow without blocking. The future resolves to True once signed in, or False when the
+        flow failed or was cancelled. Use cancel_login() to give up on it; Future.cancel() is not supported."""
+        return AuthorizerService._begin_pending_login(lambda: AuthorizerService.login(scopes, user))
+
+    @staticmethod
+    def cancel_login():
+        log.debug('Login cancelled. Pending login resolved as failed')
+        AuthorizerService._complete_pending_login(succeeded=False)
+        AuthorizerService._stop_callback_server()
+
+    @staticmethod
+    def get_login_timeout() -> float:
+        return float(cfg.GlobalConfiguration.get_setting('AUTH_SETTINGS', 'LOGIN_TIMEOUT',
+                                                         fallback=DEFAULT_LOGIN_TIMEOUT))
+
+    @staticmethod
+    def get_more_scopes(new_scopes: str, user: UserContext = None) -> Future:
+        """Ask the user to grant additional scopes. Returns a pending login, like login_async"""
+        user = user or UserContext.get_default()
+        if AuthorizerService.is_logged_in(user) is False:
             raise _shared_mod.InvalidOperationError('You must be logged-in in order to request more scopes. ')
 
-        existing_scopes = AuthorizerService.get_user_credentials().scopes
+        existing_scopes = AuthorizerService.get_user_credentials(user).scopes
         scopes = f'{existing_scopes.strip()} {new_scopes.strip()}'
-        AuthorizerService.__state_key = uuid.uuid4()
-
-        auth_req_params = {'response_type': 'code',
-                           'client_id': os.getenv('SPT_CLIENT_ID'),
-                           'redirect_uri': os.getenv('SPT_REDIRECT_URI'),
-                           'scope': scopes,
-                           'state': str(AuthorizerService.__state_key),
-                           'show_dialog': 'true'}
-        auth_url = _shared_mod.SpotifyEndPoints.AUTHORIZE_URL.value + urllib.urlencode(auth_req_params)
-        log.debug(f'Sending Authentication request to..{auth_url}')
-        webbrowser.open_new_tab(auth_url)
-        AuthorizationServer.start()
+        return AuthorizerService._begin_pending_login(lambda: AuthorizerService._request_authorization(scopes, user))
 
     @staticmethod
-    def refresh_access_token(credentials: SpotifyToken):
+    def request_token_refresh(credentials: SpotifyToken) -> dict:
+        """POST the refresh token and return the token response. Nothing is stored"""
         log.debug('Refreshing access token')
         body = {'grant_type': 'refresh_token',
                 'refresh_token': credentials.refresh_token,
@@ -258,92 +572,16 @@ class AuthorizerService:
                 'client_secret': os.getenv('SPT_CLIENT_SECRET'),
                 'redirect_uri': os.getenv('SPT_REDIRECT_URI')
                 }
-        response: requests.Response = requests.post(_shared_mod.SpotifyEndPoints.TOKEN_EXCHANGE_URL.value, data=body)
+        response: requests.Response = HttpSessionManager.get_session().post(
+            HttpSessionManager.resolve_url(_shared_mod.SpotifyEndPoints.TOKEN_EXCHANGE_URL.value),
+            data=body, timeout=HttpSessionManager.get_timeout())
         if response.status_code == HTTPStatus.OK:
             log.debug('Access token successfully refreshed')
             json_res = response.json()
             json_res['refresh_token'] = credentials.refresh_token  # Spotify doesnt send back refresh token
-            saved_credentials = AuthorizerService._save_credentials(json_res)
-            AuthorizerService.__credentials = saved_credentials
-            return AuthorizerService.__credentials
+            return json_res
         raise _shared_mod.SpotifyAuthenticationError(TOKEN_REFRESH_ERROR % (response.status_code, response.text))
 
-
-class AuthorizationServer:
-    app = flask.Flask(cfg.GlobalConfiguration.get_app_name())
-    __status = AuthServerStatus.STOPPED
-
-    # region Attribute accessors
-
-    @staticmethod
-    def get_server_status():
-        return AuthorizationServer.__status
-
-    # endregion
-
-    # region Helper methods
-    @staticmethod
-    def _shutdown_dev_server():
-        func = flask.request.environ.get('werkzeug.server.shutdown')
-        if func is None:
-            raise RuntimeError('Not running with the Werkzeug Server')
-        func()
-
-    @staticmethod
-    def _start():
-        host_ip, host_port = os.getenv('SPT_HOST_IP'), os.getenv('SPT_HOST_PORT')
-        log.debug(f'Starting Authorization Server at {host_ip}:{host_port}')
-        is_debug_mode = not _env_manager.EnvironmentManager.is_production()
-        AuthorizationServer.app.run(host_ip, host_port, debug=is_debug_mode)
-        AuthorizerService.__status = AuthServerStatus.RUNNING
-        return AuthorizationServer.__status
-
-    # endregion
-
-    # region Server routes
-
-    @staticmethod
-    @app.route('/')
-    def index():
-        return 'Nothing to see here'
-
     @staticmethod
-    @app.route('/authcallback')
-    def on_auth_callback():
-        try:
-            code = flask.request.args.get('code')
-            if code not in (None, ''):
-                AuthorizerService.on_auth_code_received(request_object=flask.request)
-                return 'Authorization Code granted'
-
-            raise _shared_mod.SpotifyAuthenticationError(f'Authorization code not granted. {flask.request.args}')
-        except Exception as ex:
-            log.error(traceback.format_exc())
-            AuthorizerService.notify_auth_completed(has_error=True)
-            return f'Unexpected authentication error. Please try again later.\n{ex}'
-
-    # endregion
-
-    @staticmethod
-    def start():
-        try:
-            t = threading.Thread(target=AuthorizationServer._start)
-            t.start()
-            return AuthorizationServer.__status
-        except Exception as ex:
-            raise _shared_mod.LocalAuthServerStartupError(ex)
-
-    @staticmethod
-    def shutdown():
-        try:
-            log.debug('Shutdown Authorization Sever signal received')
-            if AuthorizationServer.__status == AuthServerStatus.STOPPED:
-                log.debug('Server not running. Ignoring shutdown signal')
-                return AuthorizationServer.__status
-
-            AuthorizationServer._shutdown_dev_server()
-            AuthorizationServer.__status = AuthServerStatus.STOPPED
-            log.debug('Authorization Sever shutdown successful.')
-            return AuthorizationServer.__status
-        except Exception as ex:
-            raise _shared_mod.LocalAuthServerShutdownError(ex)
+    def refresh_access_token(credentials: SpotifyToken, user: UserContext = None):
+        return TokenManager.get(user).refresh(credentials)
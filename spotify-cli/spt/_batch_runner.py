@@ -0,0 +1,150 @@
+"""Runs many spt commands in one process on a pool of worker threads, so a job issuing hundreds of commands pays the
+interpreter startup, configuration and sign in once"""
+
+__all__ = ['BatchRunner', 'BatchCommand', 'BatchResult', 'parse_batch_commands', 'get_worker_count']
+
+import contextvars
+import io
+import os
+import pathlib
+import re
+import shlex
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+
+import _app_config as cfg
+import _json_backend
+import _shared_mod
+from _command_dispatcher import CommandDispatcher
+from _logger import default_logger as log
+from _output_capture import capture_output
+
+DEFAULT_WORKERS = 4
+NESTED_COMMANDS = ('batch', 'daemon', 'shell')  # Cannot run inside a batch
+UNSAFE_FILE_NAME_CHARACTERS = re.compile(r'[^A-Za-z0-9.-]+')
+
+
+def get_worker_count() -> int:
+    return int(cfg.GlobalConfiguration.get_setting('BATCH_SETTINGS', 'WORKERS', fallback=DEFAULT_WORKERS))
+
+
+@dataclass
+class BatchCommand:
+    index: int  # Position in the batch, starting at 0
+    argv: typing.List[str]
+
+    @property
+    def command_line(self) -> str:
+        return ' '.join(shlex.quote(argument) for argument in self.argv)
+
+
+@dataclass
+class BatchResult:
+    index: int
+    command: str
+    exit_code: int
+    elapsed_ms: float
+    result: typing.Any = None  # The command's output, parsed as JSON where possible
+    output_file: str = None  # Set instead of result when outputs are written to a folder
+
+    def to_dict(self):
+        record = asdict(self)
+        record.pop('result' if self.output_file is not None else 'output_file')
+        return record
+
+
+def _split_entry(entry, position: int) -> typing.List[str]:
+    try:
+        if isinstance(entry, str):
+            return shlex.split(entry, comments=True)
+        if isinstance(entry, list):
+            return [str(argument) for argument in entry]
+    except ValueError as ex:
+        raise _shared_mod.InvalidOperationError(f'Batch entry {position + 1} could not be read. {ex}')
+    raise _shared_mod.InvalidOperationError(f'Batch entry {position + 1} must be a command line or a list of '
+                                            f'arguments, not {type(entry).__name__}')
+
+
+def parse_batch_commands(text: str) -> typing.List[BatchCommand]:
+    """One command per line, e.g. `personalise GetTopTracks --limit 5`, or a JSON list of command lines or argument
+    lists. Blank lines, # comments and a leading `spt` are ignored"""
+    if text.lstrip().startswith('['):
+        entries = _json_backend.loads(text)
+    else:
+        entries = text.splitlines()
+
+    commands = []
+    for position, entry in enumerate(entries):
+        argv = _split_entry(entry, position)
+        if argv and argv[0] == 'spt':
+            argv = argv[1:]
+        if argv:
+            commands.append(BatchCommand(index=len(commands), argv=argv))
+    return commands
+
+
+def _parse_output(text: str):
+    """A JSON document, a list of NDJSON records, or the text itself when it is not JSON"""
+    if not text.strip():
+        return None
+    try:
+        return _json_backend.loads(text)
+    except ValueError:
+        pass
+    try:
+        return [_json_backend.loads(line) for line in text.splitlines() if line.strip()]
+    except ValueError:
+        return text
+
+
+class BatchRunner:
+    """Runs commands through a shared CommandDispatcher on a thread pool, yielding results as commands finish.
+
+    Every command runs in its own copy of the caller's context, so its response cache flags (--no-cache, --refresh)
+    and request timings stay separate from the commands running next to it. Output is captured per command, either
+    in memory or in `output_dir`, and commands never prompt on stdin.
+    """
+
+    def __init__(self, commands: typing.List[BatchCommand], workers: int = None, output_dir: str = None,
+                 working_dir: str = None):
+        self._commands = commands
+        self._workers = max(1, workers or get_worker_count())
+        self._output_dir = output_dir
+        self._working_dir = working_dir or os.getcwd()
+        self._dispatcher = CommandDispatcher()
+
+    def _get_output_path(self, command: BatchCommand) -> str:
+        name = UNSAFE_FILE_NAME_CHARACTERS.sub('_', '_'.join(command.argv[:2])).strip('_')
+        extension = 'ndjson' if _shared_mod.SptOutputFormats.NdJson.value in command.argv else 'json'
+        return os.path.join(self._output_dir, f'{command.index:04d}_{name}.{extension}')
+
+    def _run_command(self, command: BatchCommand) -> BatchResult:
+        started = time.perf_counter()
+        if command.argv[0].strip().lower() in NESTED_COMMANDS:
+            log.error(f'[{command.index}] {command.argv[0]} cannot run inside a batch')
+            return BatchResult(command.index, command.command_line, exit_code=2, elapsed_ms=0.0)
+
+        if self._output_dir is not None:
+            output_path = self._get_output_path(command)
+            with open(output_path, 'w') as output_file, capture_output(stdout=output_file):
+                exit_code = self._dispatcher.run(command.argv, self._working_dir, interactive=False)
+            return BatchResult(command.index, command.command_line, exit_code,
+                               round((time.perf_counter() - started) * 1000, 3), output_file=output_path)
+
+        output = io.StringIO()
+        with capture_output(stdout=output):
+            exit_code = self._dispatcher.run(command.argv, self._working_dir, interactive=False)
+        return BatchResult(command.index, command.command_line, exit_code,
+                           round((time.perf_counter() - started) * 1000, 3), result=_parse_output(output.getvalue()))
+
+    def iter_results(self) -> typing.Iterator[BatchResult]:
+        if self._output_dir is not None:
+            pathlib.Path(self._output_dir).mkdir(parents=True, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='spt-batch-worker') as pool:
+            pending = [pool.submit(contextvars.copy_context().run, self._run_command, command)
+                       for command in self._commands]
+            for finished in as_completed(pending):
+                yield finished.result()
@@ -1,15 +1,8 @@
-import abc
+"""Argument parser for every spt command. Kept free of heavy imports, so usage errors and help print quickly.
+The handlers that run the commands live in _command_handlers"""
 import argparse
-import datetime
-import sys
-import traceback
 
-from progress.spinner import Spinner
-
-import _authorizer
 import _shared_mod
-import _spotify_web_api as spotify
-from _logger import default_logger as log
 
 # region Parser Configuration
 
@@ -19,6 +12,19 @@ parent_parser.add_argument('--out', '-o', default=None, dest='output_file',
                            help='Path to the output json file')
 parent_parser.add_argument('--no_stdout', dest='no_stdout', action="store_true",
                            help='Do not print the json payload to the console')
+parent_parser.add_argument('--format', '-f', dest='output_format', default=_shared_mod.SptOutputFormats.Json.value,
+                           choices=[item.value for item in _shared_mod.SptOutputFormats],
+                           help='json (default) or ndjson, i.e. one record per line')
+parent_parser.add_argument('--no-cache', dest='no_cache', action='store_true',
+                           help='Neither read nor write the local response cache')
+parent_parser.add_argument('--refresh', dest='refresh', action='store_true',
+                           help='Ignore cached responses and re-download, updating the cache')
+parent_parser.add_argument('--timings', dest='show_timings', action='store_true',
+                           help='Print a summary of request timings to stderr when the command finishes')
+parent_parser.add_argument('--profile', '-p', dest='profile', default=None,
+                           help='Act as this signed-in account. Default: SPT_PROFILE or "default"')
+parent_parser.add_argument('--timings-file', dest='timings_file', default=None,
+                           help='Write per-endpoint request timing histograms to this json file')
 
 common_fetch_parser = argparse.ArgumentParser(add_help=False)
 common_fetch_parser.add_argument('--limit', '-l', default=30, dest='limit', help='The maximum number of objects to '
@@ -26,6 +32,11 @@ common_fetch_parser.add_argument('--limit', '-l', default=30, dest='limit', help
                                                                                  'Maximum: 50')
 common_fetch_parser.add_argument('--offset', '-of', default=0, dest='offset',
                                  help='Index of the first object to return')
+common_fetch_parser.add_argument('--all', dest='fetch_all', action='store_true',
+                                 help='Follow the paging links and return every object, ignoring --limit')
+common_fetch_parser.add_argument('--fields', dest='fields', default=None,
+                                 help='Comma separated paths to keep from each response, dropping everything else. '
+                                      'Example: --fields items.name,items.id,items.album.name')
 
 # Top-level/Parent main_cli_parser
 main_cli_parser = argparse.ArgumentParser(prog='Interact with the Spotify Web API via the command line')
@@ -34,14 +45,38 @@ subparsers = main_cli_parser.add_subparsers(help='Typical usage: spt <subcommand
 # [Spotify] Authentication subparser
 login_parser = subparsers.add_parser('login', help='Authenticate against Spotify Web API using OAuth',
                                      parents=[parent_parser])
+login_parser.add_argument('--timeout', dest='login_timeout', type=float, default=None,
+                          help='Seconds to wait for the browser sign in to complete. '
+                               'Default: LOGIN_TIMEOUT in the AUTH_SETTINGS config section')
 
 # [Spotify] Library API subparser
 library_parser = subparsers.add_parser('library',
-                                       parents=[parent_parser],
                                        help='Get current users saved tracks, shows, albums etc.'
                                             'Example: spt library GetSavedAlbums')
-library_parser.add_argument('--limit', '-l', default=30, dest='limit', type=int,
-                            help='Maximum no. of results per query')
+library_subparsers = library_parser.add_subparsers()
+
+saved_albums_parser = library_subparsers.add_parser('GetSavedAlbums',
+                                                    parents=[parent_parser, common_fetch_parser],
+                                                    help='Example: spt library GetSavedAlbums --limit 10')
+
+saved_tracks_parser = library_subparsers.add_parser('GetSavedTracks',
+                                                    parents=[parent_parser, common_fetch_parser],
+                                                    help='Example: spt library GetSavedTracks --all --format ndjson '
+                                                         '--out tracks.ndjson')
+
+saved_shows_parser = library_subparsers.add_parser('GetSavedShows',
+                                                   parents=[parent_parser, common_fetch_parser],
+                                                   help='Example: spt library GetSavedShows')
+
+library_sync_parser = library_subparsers.add_parser('sync', parents=[parent_parser],
+                                                    help='Update the local SQLite mirror of your library with '
+                                                         'everything saved since the last sync. '
+                                                         'Example: spt library sync --only tracks')
+library_sync_parser.add_argument('--full', dest='full_sync', action='store_true',
+                                 help='Re-download the whole library, also removing items you have unsaved')
+library_sync_parser.add_argument('--only', dest='sync_entities', action='append',
+                                 choices=['tracks', 'albums', 'shows'],
+                                 help='Only sync the given item type. Can be repeated. Default: all')
 
 # [Spotify] Personalisation API subparser
 
@@ -65,138 +100,42 @@ top_tracks_parser = personalize_subparsers.add_parser('GetTopTracks',
                                                                common_fetch_parser, personalise_base_parser],
                                                       help="Example: spt personalise GetTopTracks --limit 2")
 
+# Handlers look up the function to run by its subcommand name
+for function_subparsers in (library_subparsers, personalize_subparsers):
+    for function_name, function_parser in function_subparsers.choices.items():
+        function_parser.set_defaults(function_name=function_name)
+
+# Daemon subparser
+daemon_parser = subparsers.add_parser('daemon', parents=[parent_parser],
+                                      help='Keep spt loaded in the background and run commands sent by the spt '
+                                           'launcher over a Unix domain socket. Example: spt daemon &')
+daemon_parser.add_argument('--socket', dest='socket_path', default=None,
+                           help='Path of the socket. Default: SPT_DAEMON_SOCKET or daemon.sock in the app data folder')
+daemon_parser.add_argument('--idle-timeout', dest='idle_timeout', type=float, default=None,
+                           help='Exit after this many seconds without a command. 0 never exits. '
+                                'Default: IDLE_TIMEOUT in the DAEMON_SETTINGS config section')
+daemon_parser.add_argument('--stop', dest='stop_daemon', action='store_true',
+                           help='Stop the daemon listening on the socket')
+
+# Shell subparser
+shell_parser = subparsers.add_parser('shell', parents=[parent_parser],
+                                     help='Interactive shell that keeps spt loaded between commands, with history and '
+                                          'tab completion. Example: spt shell')
+shell_parser.add_argument('--history-file', dest='history_file', default=None,
+                          help='Where to keep the command history. Default: shell_history in the app data folder')
+
+# Batch subparser
+batch_parser = subparsers.add_parser('batch', parents=[parent_parser],
+                                     help='Run many commands in one process, one command per line or a JSON list of '
+                                          'commands. Example: spt batch nightly.txt --format ndjson')
+batch_parser.add_argument('batch_source', metavar='FILE',
+                          help='File with the commands to run, or - to read them from stdin')
+batch_parser.add_argument('--workers', '-w', dest='workers', type=int, default=None,
+                          help='Number of commands to run at the same time. '
+                               'Default: WORKERS in the BATCH_SETTINGS config section')
+batch_parser.add_argument('--output-dir', dest='output_dir', default=None,
+                          help='Write the output of every command to its own file in this folder, instead of '
+                               'including it in the results')
 
-# endregion
-
-
-# region Command handlers
-
-class CommandHandler(abc.ABC):
-    def __init__(self, context_object: argparse.Namespace):
-        self._Context = context_object
-        self._output_writer = None
-
-    def _prepare_output_writer(self):
-        output_channels = [_shared_mod.SptOutputChannels.SdtOut.value]
-        if self._Context.no_stdout:
-            output_channels.remove(_shared_mod.SptOutputChannels.SdtOut.value)
-
-        output_file = self._Context.output_file
-        if output_file not in (None, ''):
-            output_channels.append(_shared_mod.SptOutputChannels.JsonFile.value)
-
-        self._output_writer = _shared_mod.SptOutputWriter(channels=output_channels)
-        if not output_channels:
-            log.warn('There is not output channel specified. Results will not be displayed!')
-        return self._output_writer
-
-    @staticmethod
-    def handle_missing_scopes_error(scopes):
-        response = input('Would you like to request additional scopes [Y or N]?    ')
-        if str(response) not in ('Y', 'y', 'yes'):
-            return
-        log.info(f'Initiating request to get additional scopes: {scopes}')
-        if isinstance(scopes, list):
-            scopes = ' '.join(scopes).strip()
-
-        _authorizer.AuthorizerService.add_auth_subsciber(_authorizer.AuthEvent.AUTH_COMPLETED,
-                                                         LoginCommandHandler.on_auth_finished)
-        _authorizer.AuthorizerService.get_more_scopes(new_scopes=scopes)
-
-    @abc.abstractmethod
-    def handle(self):
-        pass
-
-    def execute(self):
-        try:
-            self._prepare_output_writer()
-            return self.handle()
-        except _shared_mod.NotLoggedInError:
-            log.error(traceback.format_exc())
-        except _shared_mod.MissingScopesError as ex:
-            log.error(traceback.format_exc())
-            self.handle_missing_scopes_error(ex.scopes)
-        except _shared_mod.SpotifyAPICallError:
-            log.error(traceback.format_exc())
-        except Exception as ex:
-            log.error(f'[ {type(self).__name__} - handle() encountered an unexpected error. {ex}.')
-            log.debug(traceback.format_exc())
-
-
-class LoginCommandHandler(CommandHandler):
-    __SignInInprogress = False
-
-    @staticmethod
-    def on_auth_finished(has_error: bool):
-        log.debug(f'Handle Auth Completed Event. Has Errors = {has_error} ')
-        LoginCommandHandler.__SignInInprogress = False
-        if has_error:
-            log.warn('Authorization flow completed with errors. Please try again')
-            return -1
-        return 0
-
-    @staticmethod
-    def _wait_for_sign_in_completion():
-        log.info('Authentication in progress')
-        spinner = Spinner('Please wait...')
-        while LoginCommandHandler.__SignInInprogress:
-            spinner.next()  # Wait until we get a completed event from the auth service
-        spinner.finish()
-
-    def handle(self):
-        log.info(f'Authorization Code Flow intialised at {datetime.datetime.now()}')
-        _authorizer.AuthorizerService.add_auth_subsciber(_authorizer.AuthEvent.AUTH_COMPLETED,
-                                                         LoginCommandHandler.on_auth_finished)
-        LoginCommandHandler.__SignInInprogress = True
-        login_in_progress = _authorizer.AuthorizerService.login()
-        if login_in_progress:
-            self._wait_for_sign_in_completion()
-
-
-class LibraryCommandHandler(CommandHandler):
-    def handle(self):
-        print('Library API handler intialised')
-
-
-class PersonalisationCommandHandler(CommandHandler):
-    def __init__(self, context_object):
-        super().__init__(context_object)
-        self._args = self._populate_args()
-        self._func_command_map = {
-            'GetTopArtists': self._get_top_artists,
-            'GetTopTracks': self._get_top_tracks
-        }
-
-    def _populate_args(self):
-        self._args = _shared_mod.PersonlisationParams()
-        self._args.time_range = self._Context.time_range
-        self._args.offset = self._Context.offset
-        self._args.limit = self._Context.limit
-        return self._args
-
-    def _get_top_artists(self):
-        log.info('Finding your top artists..')
-        self._args.entity_type = _shared_mod.PersonalisationEntityTypes.Artists.value
-        api = spotify.PersonalisationAPI(params=self._args)
-        json_payload = api.get_top_tracks_and_artists()
-        self._output_writer.execute(json_payload)
-        return json_payload
-
-    def _get_top_tracks(self):
-        log.info('Finding your top tracks..')
-        self._args.entity_type = _shared_mod.PersonalisationEntityTypes.Tracks.value
-        api = spotify.PersonalisationAPI(params=self._args)
-        json_payload = api.get_top_tracks_and_artists()
-        self._output_writer.execute(json_payload)
-        return json_payload
-
-    def handle(self):
-        function_name = sys.argv[2]
-        log.debug(f'Personalisation API handler intialised. Function to call: {function_name}')
-        func = self._func_command_map.get(function_name)
-        if func is None:
-            raise _shared_mod.InvalidCommandError(f'[{PersonalisationCommandHandler.__name__}] - '
-                                                  f'Command {function_name} is invalid or not supported')
-        return func()
 
 # endregion
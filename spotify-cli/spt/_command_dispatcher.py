@@ -0,0 +1,171 @@
+"""Routes an spt argument list to its command handler. Used by __main__, the daemon, the shell and batches, and by
+code embedding spt through CommandDispatcher.invoke"""
+__all__ = ['CommandDispatcher', 'CommandResult', 'COMMAND_HANDLERS_MODULE']
+
+import argparse
+import contextvars
+import functools
+import importlib
+import io
+import os
+import sys
+import traceback
+import typing
+from dataclasses import dataclass
+
+import _cli_parser as cli
+import _shared_mod
+from _logger import default_logger as log
+from _output_capture import capture_output
+
+COMMAND_HANDLERS_MODULE = '_command_handlers'
+HELP_COMMANDS = ('help', '-h', '--help')
+PATH_OPTIONS = ('output_file', 'timings_file', 'output_dir', 'batch_source', 'history_file')
+
+
+@dataclass
+class CommandResult:
+    """Outcome of CommandDispatcher.invoke"""
+    argv: typing.List[str]
+    exit_code: int
+    results: typing.Any = None  # What the command would have printed: a JSON document or a list of items
+    error: typing.Optional[Exception] = None
+    output: str = ''  # Text the command printed instead, e.g. argparse usage errors or --help
+
+    @property
+    def succeeded(self) -> bool:
+        return self.exit_code == 0
+
+
+class CommandDispatcher:
+    def __init__(self, parser_obj: argparse.ArgumentParser = cli.main_cli_parser):
+        self._parser = parser_obj
+        # Handler class names. Their module, and the HTTP stack behind it, is only imported to run a command
+        self._command_handler_map = {
+            'login': 'LoginCommandHandler',
+            'library': 'LibraryCommandHandler',
+            'personalise': 'PersonalisationCommandHandler',
+            'daemon': 'DaemonCommandHandler',
+            'batch': 'BatchCommandHandler',
+            'shell': 'ShellCommandHandler'
+        }
+
+    def _extract_subcommand(self, argv: typing.List[str]):
+        log.debug(f'Extracting command to execute from arguments: {argv}')
+        subcommand = str(argv[0]).strip().lower()
+        if subcommand not in self._command_handler_map.keys() and subcommand not in HELP_COMMANDS:
+            raise _shared_mod.InvalidCommandError(f'Invalid or unsupported command | {subcommand} |')
+        return subcommand
+
+    def _get_command_handler(self, command: str) -> typing.Type:
+        handlers = importlib.import_module(COMMAND_HANDLERS_MODULE)
+        handler_class = getattr(handlers, self._command_handler_map.get(command))
+        if not issubclass(handler_class, handlers.CommandHandler):
+            raise _shared_mod.InvalidCommandHandlerError(f'Handler must be a subclass of '
+                                                         f'{handlers.CommandHandler.__name__}')
+        log.debug(f'Found handler {handler_class.__name__} for  command {command}')
+        return handler_class
+
+    @staticmethod
+    def _validate_args(argv: typing.List[str]):
+        if not len(argv) >= 1:
+            raise _shared_mod.InvalidUsageError
+
+    @staticmethod
+    def _resolve_paths(handler_context: argparse.Namespace, working_dir: str):
+        """Relative paths are relative to the caller, which is not our working directory in the daemon, nor after
+        importing the spt package"""
+        handler_context.working_dir = working_dir  # For commands that run other commands, e.g. batch
+        for option in PATH_OPTIONS:
+            path = getattr(handler_context, option, None)
+            if path not in (None, '', '-') and not os.path.isabs(path):
+                setattr(handler_context, option, os.path.join(working_dir, path))
+        return handler_context
+
+    def _create_handler(self, argv: typing.List[str] = None, working_dir: str = None):
+        """The handler for argv, or None when help was asked for"""
+        log.debug('Executing CommandDispatcher')
+        argv = list(sys.argv[1:] if argv is None else argv)
+        self._validate_args(argv)
+        selected_command = self._extract_subcommand(argv)
+        if selected_command in HELP_COMMANDS:
+            return None
+        handler_context = self._parser.parse_args(argv)  # Before the import, so --help and usage errors stay cheap
+        command_handler = self._get_command_handler(selected_command)
+        self._resolve_paths(handler_context, working_dir or os.getcwd())
+        return command_handler(handler_context)
+
+    def execute(self, argv: typing.List[str] = None, working_dir: str = None):
+        """Run one command, e.g. ['personalise', 'GetTopTracks', '--limit', '5']. Defaults to sys.argv"""
+        handlder_obj = self._create_handler(argv, working_dir)
+        if handlder_obj is None:
+            self._parser.print_help()
+            return None
+        return handlder_obj.execute()
+
+    def invoke(self, argv: typing.Sequence[str], working_dir: str = None) -> CommandResult:
+        """Run one command and return its results instead of printing them, e.g.
+        invoke(['personalise', 'GetTopTracks', '--limit', '5']).results
+
+        Every call gets its own handler and context, so calls may run at the same time from several threads. Relative
+        paths such as --out resolve against `working_dir`, by default the current directory.
+        """
+        argv = [str(argument) for argument in argv]
+        output = io.StringIO()
+        try:
+            with capture_output(stdout=output, stderr=output):  # argparse prints usage errors and --help
+                handler_obj = self._create_handler(argv, working_dir or os.getcwd())
+        except SystemExit as ex:
+            exit_code = ex.code if isinstance(ex.code, int) else int(ex.code is not None)
+            return CommandResult(argv, exit_code, error=_shared_mod.InvalidUsageError() if exit_code else None,
+                                 output=output.getvalue())
+        except (_shared_mod.InvalidCommandError, _shared_mod.InvalidUsageError) as ex:
+            return CommandResult(argv, 2, error=ex, output=output.getvalue())
+        if handler_obj is None:
+            return CommandResult(argv, 0, output=self._parser.format_help())
+
+        handler_obj.keep_results = True
+        handler_obj.interactive = False  # Embedded callers cannot be prompted
+        with capture_output(stdout=output):
+            contextvars.copy_context().run(handler_obj.execute)
+        return CommandResult(argv, handler_obj.exit_code, handler_obj.results, handler_obj.error, output.getvalue())
+
+    async def invoke_async(self, argv: typing.Sequence[str], working_dir: str = None) -> CommandResult:
+        """invoke for asyncio code. The command runs on the loop's default executor, so the loop stays responsive"""
+        import asyncio  # Not needed by the command line
+
+        call = functools.partial(contextvars.copy_context().run, self.invoke, argv, working_dir)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    def run(self, argv: typing.List[str] = None, working_dir: str = None, interactive: bool = True) -> int:
+        """Like execute, but reports problems the way the command line does and returns an exit code.
+        `interactive=False` stops the command from asking questions on stdin"""
+        exit_code = 0
+        try:
+            handlder_obj = self._create_handler(argv, working_dir)
+            if handlder_obj is None:
+                self._parser.print_help()
+            else:
+                handlder_obj.interactive = interactive
+                handlder_obj.execute()
+                exit_code = handlder_obj.exit_code
+        except _shared_mod.InvalidCommandError:
+            log.error("Unknown command detected, please see usage instructions below")
+            self._parser.print_help()
+            exit_code = 2  # Same as argparse usage errors
+        except _shared_mod.InvalidUsageError:
+            log.error("Wrong usage, please see usage instructions below")
+            self._parser.print_help()
+            exit_code = 2  # Same as argparse usage errors
+        except SystemExit as ex:  # argparse exits after printing usage errors or --help
+            exit_code = ex.code if isinstance(ex.code, int) else int(ex.code is not None)
+        except Exception as ex:
+            log.error(_shared_mod.CRITICAL_ERROR_LOG % ex)
+            exit_code = 1
+        finally:
+            # Dump error details to file logger for trouble-shooting
+            log.debug(traceback.format_exc())
+            request_scheduler = sys.modules.get('_request_scheduler')  # Not loaded when no command ran
+            if request_scheduler is not None:
+                log.debug(f'Request scheduler stats: {request_scheduler.RequestScheduler.get_stats()}')
+        return exit_code
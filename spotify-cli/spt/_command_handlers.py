@@ -0,0 +1,331 @@
+"""Handlers for the spt commands. Imported by the dispatcher once a command has been parsed"""
+import abc
+import argparse
+import concurrent.futures
+import datetime
+import sys
+import time
+import traceback
+import typing
+
+import _authorizer
+import _json_backend
+import _shared_mod
+import _spotify_web_api as spotify
+from _logger import default_logger as log
+from _request_metrics import RequestMetrics
+from _response_cache import ResponseCache
+
+# region Command handlers
+
+class CommandHandler(abc.ABC):
+    def __init__(self, context_object: argparse.Namespace):
+        self._Context = context_object
+        self._output_writer = None
+        self.exit_code = 0  # Reported to the shell. Set to 1 when the command fails
+        self.error: typing.Optional[Exception] = None  # Why the command failed
+        self.keep_results = False  # Keep the output in `results` instead of printing it
+        self.interactive = True  # May ask questions on stdin, e.g. whether to request missing scopes
+        profile = getattr(context_object, 'profile', None)
+        self._user = _authorizer.UserContext(profile) if profile else _authorizer.UserContext.get_default()
+
+    def _prepare_output_writer(self):
+        output_channels = [_shared_mod.SptOutputChannels.SdtOut.value]
+        if self._Context.no_stdout or self.keep_results:
+            output_channels.remove(_shared_mod.SptOutputChannels.SdtOut.value)
+        if self.keep_results:
+            output_channels.append(_shared_mod.SptOutputChannels.Memory.value)
+
+        output_file = self._Context.output_file
+        if output_file not in (None, ''):
+            output_channels.append(_shared_mod.SptOutputChannels.JsonFile.value)
+
+        self._output_writer = _shared_mod.SptOutputWriter(channels=output_channels, output_path=output_file,
+                                                          output_format=self._Context.output_format)
+        if not output_channels:
+            log.warn('There is not output channel specified. Results will not be displayed!')
+        return self._output_writer
+
+    @property
+    def results(self):
+        """What the command wrote, as a JSON document or a list of items, when `keep_results` is set"""
+        return self._output_writer.results if self._output_writer is not None else None
+
+    def _apply_projection(self, api: spotify.SpotifyAPIBase):
+        fields = getattr(self._Context, 'fields', None)
+        if fields:
+            api.Projection = _json_backend.FieldProjection.parse(fields)
+        return api
+
+    def _write_results(self, get_page: typing.Callable[[], dict], iter_items: typing.Callable[[], typing.Iterator]):
+        """Write a single page, or stream every item when --all is set"""
+        if self._Context.fetch_all:
+            item_count = self._output_writer.execute_items(iter_items())
+            log.info(f'{item_count} items retrieved')
+            return item_count
+
+        json_payload = get_page()
+        self._output_writer.execute(json_payload)
+        return json_payload
+
+    def handle_missing_scopes_error(self, scopes):
+        try:
+            response = input('Would you like to request additional scopes [Y or N]?    ')
+        except EOFError:  # Nobody to answer
+            response = 'N'
+        if str(response) not in ('Y', 'y', 'yes'):
+            return
+        log.info(f'Initiating request to get additional scopes: {scopes}')
+        if isinstance(scopes, list):
+            scopes = ' '.join(scopes).strip()
+
+        pending_login = _authorizer.AuthorizerService.get_more_scopes(new_scopes=scopes, user=self._user)
+        LoginCommandHandler._wait_for_sign_in_completion(pending_login,
+                                                         _authorizer.AuthorizerService.get_login_timeout())
+
+    @abc.abstractmethod
+    def handle(self):
+        pass
+
+    def _configure_response_cache(self):
+        ResponseCache.configure(enabled=not getattr(self._Context, 'no_cache', False),
+                                refresh=getattr(self._Context, 'refresh', False))
+
+    def _report_timings(self):
+        if getattr(self._Context, 'show_timings', False):
+            # One write, so the summaries of commands running side by side in a batch do not interleave
+            sys.stderr.write(RequestMetrics.get_summary() + '\n')
+        timings_file = getattr(self._Context, 'timings_file', None)
+        if timings_file not in (None, ''):
+            RequestMetrics.dump(timings_file)
+            log.debug(f'Request timings written to {timings_file}')
+
+    def execute(self):
+        with RequestMetrics.collect():  # --timings reports on this command only
+            return self._execute()
+
+    def _execute(self):
+        try:
+            self._configure_response_cache()
+            self._prepare_output_writer()
+            return self.handle()
+        except _shared_mod.NotLoggedInError as ex:
+            self.exit_code, self.error = 1, ex
+            log.error(traceback.format_exc())
+        except _shared_mod.MissingScopesError as ex:
+            self.exit_code, self.error = 1, ex
+            log.error(traceback.format_exc())
+            if self.interactive:
+                self.handle_missing_scopes_error(ex.scopes)
+        except _shared_mod.SpotifyAPICallError as ex:
+            self.exit_code, self.error = 1, ex
+            log.error(traceback.format_exc())
+        except Exception as ex:
+            self.exit_code, self.error = 1, ex
+            log.error(f'[ {type(self).__name__} - handle() encountered an unexpected error. {ex}.')
+            log.debug(traceback.format_exc())
+        finally:
+            self._report_timings()
+
+
+class LoginCommandHandler(CommandHandler):
+    SPINNER_REDRAW_INTERVAL = 0.1  # In seconds
+
+    @staticmethod
+    def _wait_for_sign_in_completion(pending_login: concurrent.futures.Future, timeout: float) -> bool:
+        """Block until the auth service resolves the login, redrawing the spinner between waits"""
+        if pending_login.done():  # E.g. already logged in
+            return pending_login.result()
+
+        from progress.spinner import Spinner  # Only the login flow draws a spinner
+
+        log.info('Authentication in progress')
+        spinner = Spinner('Please wait...')
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            while True:
+                try:
+                    signed_in = pending_login.result(timeout=LoginCommandHandler.SPINNER_REDRAW_INTERVAL)
+                    if not signed_in:
+                        log.warn('Authorization flow completed with errors. Please try again')
+                    return signed_in
+                except concurrent.futures.TimeoutError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        _authorizer.AuthorizerService.cancel_login()
+                        log.warn(f'Sign in did not complete within {timeout:g} seconds. Please try again')
+                        return False
+                    spinner.next()
+        except KeyboardInterrupt:
+            _authorizer.AuthorizerService.cancel_login()
+            log.warn('Sign in cancelled')
+            return False
+        finally:
+            spinner.finish()
+
+    def handle(self):
+        log.info(f'Authorization Code Flow intialised at {datetime.datetime.now()}')
+        pending_login = _authorizer.AuthorizerService.login_async(user=self._user)
+        timeout = getattr(self._Context, 'login_timeout', None)
+        if timeout is None:
+            timeout = _authorizer.AuthorizerService.get_login_timeout()
+
+        signed_in = self._wait_for_sign_in_completion(pending_login, timeout)
+        self.exit_code = 0 if signed_in else 1
+        return 0 if signed_in else -1
+
+
+class LibraryCommandHandler(CommandHandler):
+    def __init__(self, context_object):
+        super().__init__(context_object)
+        self._args = self._populate_args()
+        self._func_command_map = {
+            'GetSavedAlbums': self._get_saved_albums,
+            'GetSavedTracks': self._get_saved_tracks,
+            'GetSavedShows': self._get_saved_shows,
+            'sync': self._sync_library
+        }
+
+    def _populate_args(self):
+        self._args = _shared_mod.UserLibraryParams()
+        self._args.offset = getattr(self._Context, 'offset', self._args.offset)
+        self._args.limit = getattr(self._Context, 'limit', self._args.limit)
+        return self._args
+
+    def _get_saved_albums(self):
+        log.info('Finding your saved albums..')
+        api = self._apply_projection(spotify.LibraryAPI(params=self._args, user=self._user))
+        return self._write_results(api.get_saved_albums, api.iter_saved_albums)
+
+    def _get_saved_tracks(self):
+        log.info('Finding your saved tracks..')
+        api = self._apply_projection(spotify.LibraryAPI(params=self._args, user=self._user))
+        return self._write_results(api.get_saved_tracks, api.iter_saved_tracks)
+
+    def _get_saved_shows(self):
+        log.info('Finding your saved shows..')
+        api = self._apply_projection(spotify.LibraryAPI(params=self._args, user=self._user))
+        return self._write_results(api.get_saved_shows, api.iter_saved_shows)
+
+    def _sync_library(self):
+        from _library_mirror import LIBRARY_ENTITIES, LibraryMirror
+
+        entity_names = self._Context.sync_entities or list(LIBRARY_ENTITIES.keys())
+        if not _authorizer.AuthorizerService.is_logged_in(self._user):
+            raise _shared_mod.NotLoggedInError  # Before the mirror file is created
+        mirror = LibraryMirror(user=self._user)
+        try:
+            log.info(f'Syncing your library to {mirror.db_path}..')
+            api = spotify.LibraryAPI(params=self._args, user=self._user)
+            results = {}
+            for entity_name in dict.fromkeys(entity_names):
+                result = mirror.sync(api, LIBRARY_ENTITIES[entity_name], full=self._Context.full_sync)
+                log.info(f'{entity_name}: {result.updated} added or updated, {result.removed} removed, '
+                         f'{result.total} in total ({result.requests} requests)')
+                results[entity_name] = result.to_dict()
+        finally:
+            mirror.close()
+
+        self._output_writer.execute(results)
+        return results
+
+    def handle(self):
+        function_name = getattr(self._Context, 'function_name', None)
+        log.debug(f'Library API handler intialised. Function to call: {function_name}')
+        func = self._func_command_map.get(function_name)
+        if func is None:
+            raise _shared_mod.InvalidCommandError(f'[{LibraryCommandHandler.__name__}] - '
+                                                  f'Command {function_name} is invalid or not supported')
+        return func()
+
+
+class PersonalisationCommandHandler(CommandHandler):
+    def __init__(self, context_object):
+        super().__init__(context_object)
+        self._args = self._populate_args()
+        self._func_command_map = {
+            'GetTopArtists': self._get_top_artists,
+            'GetTopTracks': self._get_top_tracks
+        }
+
+    def _populate_args(self):
+        self._args = _shared_mod.PersonlisationParams()
+        self._args.time_range = self._Context.time_range
+        self._args.offset = self._Context.offset
+        self._args.limit = self._Context.limit
+        return self._args
+
+    def _fetch_and_write(self):
+        api = self._apply_projection(spotify.PersonalisationAPI(params=self._args, user=self._user))
+        return self._write_results(api.get_top_tracks_and_artists, api.iter_top_tracks_and_artists)
+
+    def _get_top_artists(self):
+        log.info('Finding your top artists..')
+        self._args.entity_type = _shared_mod.PersonalisationEntityTypes.Artists.value
+        return self._fetch_and_write()
+
+    def _get_top_tracks(self):
+        log.info('Finding your top tracks..')
+        self._args.entity_type = _shared_mod.PersonalisationEntityTypes.Tracks.value
+        return self._fetch_and_write()
+
+    def handle(self):
+        function_name = getattr(self._Context, 'function_name', None)
+        log.debug(f'Personalisation API handler intialised. Function to call: {function_name}')
+        func = self._func_command_map.get(function_name)
+        if func is None:
+            raise _shared_mod.InvalidCommandError(f'[{PersonalisationCommandHandler.__name__}] - '
+                                                  f'Command {function_name} is invalid or not supported')
+        return func()
+
+
+class DaemonCommandHandler(CommandHandler):
+    def handle(self):
+        from _daemon import SptDaemon  # Only the daemon needs the socket server
+
+        daemon = SptDaemon(socket_path=self._Context.socket_path, idle_timeout=self._Context.idle_timeout)
+        if self._Context.stop_daemon:
+            self.exit_code = daemon.request_stop()
+            return self.exit_code
+        return daemon.serve_forever()
+
+
+class ShellCommandHandler(CommandHandler):
+    def handle(self):
+        from _interactive_shell import SptShell  # Only the shell needs readline
+
+        self.exit_code = SptShell(history_file=self._Context.history_file, working_dir=self._Context.working_dir).run()
+        return self.exit_code
+
+
+class BatchCommandHandler(CommandHandler):
+    def _read_commands(self):
+        from _batch_runner import parse_batch_commands
+
+        source = self._Context.batch_source
+        if source == '-':
+            return parse_batch_commands(sys.stdin.read())
+        with open(source, 'r') as batch_file:
+            return parse_batch_commands(batch_file.read())
+
+    def handle(self):
+        from _batch_runner import BatchRunner  # Only batches need the worker pool
+
+        commands = self._read_commands()
+        log.info(f'Running {len(commands)} commands')
+        runner = BatchRunner(commands, workers=self._Context.workers, output_dir=self._Context.output_dir,
+                             working_dir=self._Context.working_dir)
+        failed_commands = []
+
+        def iter_records():
+            for result in runner.iter_results():
+                if result.exit_code:
+                    failed_commands.append(result.index)
+                yield result.to_dict()
+
+        command_count = self._output_writer.execute_items(iter_records())
+        if failed_commands:
+            self.exit_code = 1
+            log.warn(f'{len(failed_commands)} of {command_count} commands failed: {sorted(failed_commands)}')
+        return command_count
+
+# endregion
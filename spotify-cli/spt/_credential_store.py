@@ -0,0 +1,189 @@
+"""Pluggable storage for the signed-in user's token. Pick a backend with SPT_CREDENTIAL_STORE=file|sqlite|memory"""
+
+__all__ = ['CredentialStore', 'FileCredentialStore', 'MemoryCredentialStore', 'SQLiteCredentialStore',
+           'CredentialStoreTypes', 'create_credential_store', 'DEFAULT_PROFILE']
+
+import abc
+import contextlib
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from enum import Enum
+from typing import ContextManager, Optional
+
+import _shared_mod
+from _env_manager import EnvironmentManager
+from _file_lock import FileLock, atomic_write
+
+DEFAULT_CREDENTIALS_FILE = '.credentials.json'
+DEFAULT_PROFILE = 'default'
+FILE_ATTRIBUTE_HIDDEN = 0x02
+FILE_ATTRIBUTE_NORMAL = 0x80
+UNSAFE_PROFILE_CHARACTERS = re.compile(r'[^A-Za-z0-9@._-]')
+
+
+class CredentialStoreTypes(Enum):
+    File = 'file'  # JSON file, the default
+    SQLite = 'sqlite'
+    Memory = 'memory'  # Nothing is persisted, e.g. for tests
+
+
+class CredentialStore(abc.ABC):
+    """Loads and saves the token as the dict produced by SpotifyToken.to_dict"""
+
+    @abc.abstractmethod
+    def load(self) -> Optional[dict]:
+        pass
+
+    @abc.abstractmethod
+    def save(self, credentials: dict):
+        pass
+
+    @abc.abstractmethod
+    def clear(self):
+        pass
+
+    @abc.abstractmethod
+    def lock(self) -> ContextManager:
+        """Held around read-refresh-write sequences, so concurrent users of the store refresh only once"""
+        pass
+
+    @property
+    @abc.abstractmethod
+    def location(self) -> str:
+        pass
+
+
+class FileCredentialStore(CredentialStore):
+    """JSON file readable by the current user only. Written atomically, locked across processes"""
+
+    def __init__(self, path: str = DEFAULT_CREDENTIALS_FILE):
+        self._path = path
+
+    @property
+    def location(self) -> str:
+        return self._path
+
+    def load(self) -> Optional[dict]:
+        if not os.path.exists(self._path):
+            return None
+        with open(self._path) as json_file:
+            return json.load(json_file)
+
+    def _set_windows_attributes(self, attributes: int):
+        if sys.platform == 'win32' and os.path.exists(self._path):
+            import ctypes
+            ctypes.windll.kernel32.SetFileAttributesW(self._path, attributes)
+
+    def save(self, credentials: dict):
+        self._set_windows_attributes(FILE_ATTRIBUTE_NORMAL)  # Replacing a hidden file is not allowed
+        atomic_write(self._path, json.dumps(credentials, indent=4))  # Temp files are created with 0600
+        self._set_windows_attributes(FILE_ATTRIBUTE_HIDDEN)
+
+    def clear(self):
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    def lock(self) -> ContextManager:
+        return FileLock(self._path + '.lock')
+
+
+class MemoryCredentialStore(CredentialStore):
+    def __init__(self, credentials: dict = None):
+        self._credentials = dict(credentials) if credentials else None
+        self._lock = threading.Lock()
+
+    @property
+    def location(self) -> str:
+        return ':memory:'
+
+    def load(self) -> Optional[dict]:
+        return dict(self._credentials) if self._credentials else None
+
+    def save(self, credentials: dict):
+        self._credentials = dict(credentials)
+
+    def clear(self):
+        self._credentials = None
+
+    def lock(self) -> ContextManager:
+        return self._lock
+
+
+class SQLiteCredentialStore(CredentialStore):
+    """One row per profile in a SQLite database, e.g. to keep tokens next to the other spt stores"""
+
+    def __init__(self, db_path: str = None, profile: str = DEFAULT_PROFILE):
+        self._db_path = db_path or SQLiteCredentialStore.get_default_path()
+        self._profile = profile
+
+    @staticmethod
+    def get_default_path() -> str:
+        store_dir = os.path.join(EnvironmentManager.get_app_data_dir(), 'store')
+        pathlib.Path(store_dir).mkdir(parents=True, exist_ok=True)
+        return os.path.join(store_dir, 'credentials.db')
+
+    @property
+    def location(self) -> str:
+        return self._db_path
+
+    @contextlib.contextmanager
+    def _connect(self):
+        is_new = not os.path.exists(self._db_path)
+        connection = sqlite3.connect(self._db_path)
+        try:
+            if is_new and sys.platform != 'win32':
+                os.chmod(self._db_path, 0o600)
+            connection.execute('CREATE TABLE IF NOT EXISTS credentials ('
+                               'profile TEXT PRIMARY KEY, '
+                               'payload TEXT NOT NULL, '
+                               'updated_at TEXT NOT NULL)')
+            yield connection
+            connection.commit()
+        finally:
+            connection.close()
+
+    def load(self) -> Optional[dict]:
+        with self._connect() as connection:
+            row = connection.execute('SELECT payload FROM credentials WHERE profile = ?', (self._profile,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, credentials: dict):
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO credentials (profile, payload, updated_at) VALUES (?, ?, ?)',
+                               (self._profile, json.dumps(credentials), datetime.now().isoformat()))
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM credentials WHERE profile = ?', (self._profile,))
+
+    def lock(self) -> ContextManager:
+        return FileLock(self._db_path + '.lock')
+
+
+def get_profile_file_path(path: str, profile: str) -> str:
+    """The default profile uses `path` itself, others a sibling file, e.g. .credentials.json -> .credentials.bob.json"""
+    if profile == DEFAULT_PROFILE:
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}.{UNSAFE_PROFILE_CHARACTERS.sub("_", profile)}{extension}'
+
+
+def create_credential_store(store_type: str = None, location: str = None,
+                            profile: str = DEFAULT_PROFILE) -> CredentialStore:
+    """Build the store named by `store_type`, defaulting to SPT_CREDENTIAL_STORE and SPT_SECURITY_STORE"""
+    store_type = (store_type or os.getenv('SPT_CREDENTIAL_STORE') or CredentialStoreTypes.File.value).lower()
+    location = location or os.getenv('SPT_SECURITY_STORE') or None
+    if store_type == CredentialStoreTypes.File.value:
+        return FileCredentialStore(get_profile_file_path(location or DEFAULT_CREDENTIALS_FILE, profile))
+    if store_type == CredentialStoreTypes.SQLite.value:
+        return SQLiteCredentialStore(location, profile)
+    if store_type == CredentialStoreTypes.Memory.value:
+        return MemoryCredentialStore()
+    raise _shared_mod.InvalidOperationError(f'Unknown credential store "{store_type}". '
+                                            f'Expected one of {[item.value for item in CredentialStoreTypes]}')
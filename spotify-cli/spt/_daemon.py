@@ -0,0 +1,253 @@
+"""Long-running spt process that runs commands sent over a Unix domain socket, so imports, configuration,
+credentials and the HTTP connection pool stay warm between calls.
+
+Protocol, one JSON document per line. The client sends {"argv": [...], "cwd": "..."} or {"action": "stop"}. The
+daemon streams {"stdout": "..."} and {"stderr": "..."} as the command writes output, then {"exit_code": 0}.
+"""
+__all__ = ['SptDaemon', 'get_socket_path']
+
+import importlib
+import io
+import json
+import os
+import pathlib
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import typing
+
+import _app_config as cfg
+import _json_backend
+import _shared_mod
+from _command_dispatcher import COMMAND_HANDLERS_MODULE, CommandDispatcher
+from _env_manager import EnvironmentManager
+from _logger import default_logger as log
+from _output_capture import capture_output, install_stream_proxies
+
+DEFAULT_SOCKET_FILE = 'daemon.sock'
+DEFAULT_IDLE_TIMEOUT = 0  # In seconds. 0 keeps the daemon running until it is stopped
+MAX_REQUEST_BYTES = 1024 * 1024
+MAX_BUFFERED_CHARS = 8192
+CONNECT_TIMEOUT = 1  # In seconds
+
+
+def get_socket_path() -> str:
+    return os.getenv('SPT_DAEMON_SOCKET') or os.path.join(EnvironmentManager.get_app_data_dir(), DEFAULT_SOCKET_FILE)
+
+
+def get_idle_timeout() -> float:
+    return float(cfg.GlobalConfiguration.get_setting('DAEMON_SETTINGS', 'IDLE_TIMEOUT', fallback=DEFAULT_IDLE_TIMEOUT))
+
+
+# region Output redirection
+
+class _ClientChannel:
+    """Sends JSON lines to one connected client. Shared by the stdout and stderr of a command"""
+
+    def __init__(self, wfile: typing.BinaryIO):
+        self._wfile = wfile
+        self._lock = threading.Lock()
+
+    def send(self, message: dict):
+        data = (_json_backend.dumps(message) + '\n').encode('utf-8')
+        with self._lock:
+            self._wfile.write(data)  # Raises BrokenPipeError once the client has gone, which stops the command
+            self._wfile.flush()
+
+
+class _ClientStream(io.TextIOBase):
+    """Text stream that forwards whole lines to the client as {"stdout": ...} or {"stderr": ...} messages"""
+
+    def __init__(self, channel: _ClientChannel, name: str):
+        self._channel = channel
+        self._name = name
+        self._buffer = []
+        self._buffered_chars = 0
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        if '\n' in text or self._buffered_chars >= MAX_BUFFERED_CHARS:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            text, self._buffer, self._buffered_chars = ''.join(self._buffer), [], 0
+            self._channel.send({self._name: text})
+
+
+# endregion
+
+
+class _DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        spt_daemon: SptDaemon = self.server.spt_daemon
+        channel = _ClientChannel(self.wfile)
+        try:
+            request = json.loads(self.rfile.readline(MAX_REQUEST_BYTES) or b'{}')
+            if request.get('action') == 'stop':
+                channel.send({'exit_code': 0})
+                spt_daemon.stop()
+                return
+            exit_code = spt_daemon.run_command(request.get('argv') or [], request.get('cwd'), channel)
+            channel.send({'exit_code': exit_code})
+        except (BrokenPipeError, ConnectionResetError):
+            log.debug('spt daemon client disconnected before the command completed')
+        except Exception as ex:
+            log.debug(traceback.format_exc())
+            channel.send({'stderr': f'spt daemon could not run the command. {ex}\n', 'exit_code': 1})
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class SptDaemon:
+    """Serves spt commands on a Unix domain socket until stopped, or until idle for `idle_timeout` seconds.
+
+    Commands run one at a time, in the order clients send them, and never prompt on stdin. Each command runs with
+    the daemon's environment, e.g. SPT_PROFILE; pass --profile to act as another account.
+    """
+
+    def __init__(self, socket_path: str = None, idle_timeout: float = None):
+        self.socket_path = socket_path or get_socket_path()
+        self.idle_timeout = get_idle_timeout() if idle_timeout is None else idle_timeout
+        self._dispatcher = CommandDispatcher()
+        self._command_lock = threading.Lock()
+        self._last_activity = time.monotonic()
+        self._server: _DaemonServer = None
+        self._stopped = threading.Event()
+
+    # region Client side
+
+    def _connect(self) -> socket.socket:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(CONNECT_TIMEOUT)
+        try:
+            client.connect(self.socket_path)
+        except OSError:
+            client.close()
+            raise
+        return client
+
+    def is_running(self) -> bool:
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(self.socket_path):
+            return False
+        try:
+            self._connect().close()
+            return True
+        except OSError:
+            return False
+
+    def request_stop(self) -> int:
+        """Ask the daemon listening on the socket to exit"""
+        if not self.is_running():
+            log.info(f'No spt daemon is listening on {self.socket_path}')
+            return 1
+        with self._connect() as client:
+            client.sendall(b'{"action": "stop"}\n')
+            client.recv(1024)
+        log.info('spt daemon stopped')
+        return 0
+
+    # endregion
+
+    # region Server side
+
+    def run_command(self, argv: typing.List[str], working_dir: str, channel: _ClientChannel) -> int:
+        stdout, stderr = _ClientStream(channel, 'stdout'), _ClientStream(channel, 'stderr')
+        if argv and str(argv[0]).strip().lower() == 'daemon':
+            if '--stop' in argv:
+                self.stop()
+                return 0
+            stderr.write(f'spt daemon is already running on {self.socket_path}\n')
+            stderr.flush()
+            return 1
+
+        with self._command_lock:
+            self._last_activity = time.monotonic()
+            try:
+                with capture_output(stdout, stderr):
+                    try:
+                        return self._dispatcher.run(argv, working_dir, interactive=False)
+                    finally:
+                        stdout.flush()
+                        stderr.flush()
+            finally:
+                self._last_activity = time.monotonic()
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        if self.is_running():
+            raise _shared_mod.InvalidOperationError(f'An spt daemon is already listening on {self.socket_path}')
+        os.remove(self.socket_path)
+
+    def _warm_up(self):
+        """Load what every command needs before the first client arrives"""
+        importlib.import_module(COMMAND_HANDLERS_MODULE)
+        try:
+            import _authorizer
+            _authorizer.TokenManager.get().get_credentials()
+        except Exception as ex:
+            log.debug(f'Credentials not loaded ahead of the first command. {ex}')
+
+    def _watch_idle_time(self):
+        while not self._stopped.wait(min(self.idle_timeout, 5)):
+            idle_for = time.monotonic() - self._last_activity
+            if not self._command_lock.locked() and idle_for >= self.idle_timeout:
+                log.info(f'spt daemon idle for {idle_for:.0f} seconds. Stopping')
+                self.stop()
+                return
+
+    def stop(self):
+        """Stop serving. Returns straight away, so it is safe to call from a request or signal handler"""
+        self._stopped.set()
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, name='spt-daemon-shutdown', daemon=True).start()
+
+    def serve_forever(self) -> int:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise _shared_mod.InvalidOperationError('spt daemon needs Unix domain sockets, which this platform '
+                                                    'does not support')
+        self._remove_stale_socket()
+        pathlib.Path(os.path.dirname(os.path.abspath(self.socket_path))).mkdir(parents=True, exist_ok=True)
+        previous_umask = os.umask(0o177)  # Only the current user may connect
+        try:
+            self._server = _DaemonServer(self.socket_path, _DaemonRequestHandler)
+        finally:
+            os.umask(previous_umask)
+        self._server.spt_daemon = self
+
+        install_stream_proxies()
+        sys.stdin = io.StringIO()  # Commands cannot prompt the client
+        self._warm_up()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        if self.idle_timeout:
+            threading.Thread(target=self._watch_idle_time, name='spt-daemon-idle', daemon=True).start()
+
+        log.info(f'spt daemon listening on {self.socket_path}. Stop it with spt daemon --stop')
+        try:
+            self._server.serve_forever(poll_interval=0.5)
+        except KeyboardInterrupt:
+            log.info('spt daemon interrupted')
+        finally:
+            self._stopped.set()
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        return 0
+
+    # endregion
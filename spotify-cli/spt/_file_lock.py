@@ -0,0 +1,87 @@
+"""Advisory file locks shared between processes, e.g. several spt jobs using one credentials file"""
+
+__all__ = ['FileLock', 'atomic_write']
+
+import os
+import tempfile
+import time
+
+import _shared_mod
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Exclusive lock on `lock_path`, held while inside the `with` block.
+
+    The lock is released by the OS when the process exits, so a crashed process never leaves it stuck. The lock file
+    itself is left in place; deleting it would let two processes lock different files.
+    """
+    POLL_INTERVAL = 0.05  # In seconds
+
+    def __init__(self, lock_path: str, timeout: float = 30.0):
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self._lock_file = None
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        self._lock_file = open(self.lock_path, 'a+')
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock():
+            if time.monotonic() >= deadline:
+                self._lock_file.close()
+                self._lock_file = None
+                raise _shared_mod.FileLockTimeoutError(self.lock_path, self.timeout)
+            time.sleep(FileLock.POLL_INTERVAL)
+        return self
+
+    def release(self):
+        if self._lock_file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def atomic_write(path: str, content: str):
+    """Write to a temporary file next to `path` and rename it over `path`, so readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'w') as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
@@ -0,0 +1,167 @@
+"""Process-wide pooled HTTP session shared by the Spotify API and token requests"""
+
+__all__ = ['HttpSessionManager', 'HttpSettings']
+
+import atexit
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import _app_config as cfg
+from _logger import default_logger as log
+from _request_metrics import RequestMetrics
+
+HTTP_SETTINGS_SECTION = 'HTTP_SETTINGS'
+SPOTIFY_API_BASE_URL = 'https://api.spotify.com'
+SPOTIFY_ACCOUNTS_BASE_URL = 'https://accounts.spotify.com'
+
+
+@dataclass
+class HttpSettings:
+    pool_connections: int = 4  # Number of host pools to cache
+    pool_maxsize: int = 16  # Keep-alive connections kept per host
+    connect_timeout: float = 5.0  # In seconds
+    read_timeout: float = 30.0  # In seconds
+    max_concurrency: int = 16  # Requests allowed in flight at once by the concurrent helpers
+
+    @classmethod
+    def from_configuration(cls):
+        defaults = cls()
+        settings = cls()
+        settings.pool_connections = int(cfg.GlobalConfiguration.get_setting(
+            HTTP_SETTINGS_SECTION, 'POOL_CONNECTIONS', fallback=defaults.pool_connections))
+        settings.pool_maxsize = int(cfg.GlobalConfiguration.get_setting(
+            HTTP_SETTINGS_SECTION, 'POOL_MAXSIZE', fallback=defaults.pool_maxsize))
+        settings.connect_timeout = float(cfg.GlobalConfiguration.get_setting(
+            HTTP_SETTINGS_SECTION, 'CONNECT_TIMEOUT', fallback=defaults.connect_timeout))
+        settings.read_timeout = float(cfg.GlobalConfiguration.get_setting(
+            HTTP_SETTINGS_SECTION, 'READ_TIMEOUT', fallback=defaults.read_timeout))
+        settings.max_concurrency = int(cfg.GlobalConfiguration.get_setting(
+            HTTP_SETTINGS_SECTION, 'MAX_CONCURRENCY', fallback=defaults.max_concurrency))
+        return settings
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+
+# region Timed connections
+
+class _TimedConnectionMixin:
+    """Reports connection setup phases of new connections to the request being timed on this thread"""
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        RequestMetrics.add_phase('connect_s', time.perf_counter() - started)
+        return sock
+
+    def connect(self):
+        connect_before = RequestMetrics.get_phase('connect_s')
+        started = time.perf_counter()
+        super().connect()
+        elapsed = time.perf_counter() - started
+        # Whatever connect() spent beyond the TCP connect is the TLS handshake
+        RequestMetrics.add_phase('tls_s', max(0.0, elapsed - (RequestMetrics.get_phase('connect_s') - connect_before)))
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+# endregion
+
+
+class HttpSessionManager:
+    """Hands out a single keep-alive requests.Session so connections (and TLS handshakes) are reused across calls"""
+    __session = None
+    __settings = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def _create_session(settings: HttpSettings) -> requests.Session:
+        log.debug(f'Creating pooled HTTP session. {settings}')
+        session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=settings.pool_connections,
+                                   pool_maxsize=settings.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
+    @staticmethod
+    def get_settings() -> HttpSettings:
+        if HttpSessionManager.__settings is None:
+            HttpSessionManager.__settings = HttpSettings.from_configuration()
+        return HttpSessionManager.__settings
+
+    @staticmethod
+    def configure(settings: HttpSettings):
+        """Replace the session settings. The current session (if any) is closed and rebuilt on next use"""
+        with HttpSessionManager.__lock:
+            HttpSessionManager.__settings = settings
+            if HttpSessionManager.__session is not None:
+                HttpSessionManager.__session.close()
+                HttpSessionManager.__session = None
+        return settings
+
+    @staticmethod
+    def get_session() -> requests.Session:
+        if HttpSessionManager.__session is not None:
+            return HttpSessionManager.__session
+
+        with HttpSessionManager.__lock:
+            if HttpSessionManager.__session is None:
+                HttpSessionManager.__session = HttpSessionManager._create_session(HttpSessionManager.get_settings())
+            return HttpSessionManager.__session
+
+    @staticmethod
+    def resolve_url(url: str) -> str:
+        """Point Spotify URLs at SPT_API_BASE_URL/SPT_ACCOUNTS_BASE_URL when set, e.g. a local stub server"""
+        api_base_url = os.getenv('SPT_API_BASE_URL')
+        if api_base_url and url.startswith(SPOTIFY_API_BASE_URL):
+            return api_base_url.rstrip('/') + url[len(SPOTIFY_API_BASE_URL):]
+
+        accounts_base_url = os.getenv('SPT_ACCOUNTS_BASE_URL')
+        if accounts_base_url and url.startswith(SPOTIFY_ACCOUNTS_BASE_URL):
+            return accounts_base_url.rstrip('/') + url[len(SPOTIFY_ACCOUNTS_BASE_URL):]
+        return url
+
+    @staticmethod
+    def get_timeout():
+        return HttpSessionManager.get_settings().timeout
+
+    @staticmethod
+    def close():
+        with HttpSessionManager.__lock:
+            if HttpSessionManager.__session is not None:
+                HttpSessionManager.__session.close()
+                HttpSessionManager.__session = None
+
+
+atexit.register(HttpSessionManager.close)
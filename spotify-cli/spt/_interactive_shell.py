@@ -0,0 +1,185 @@
+"""Interactive `spt shell`. Bootstraps once, then runs commands in the same process, so credentials, the HTTP
+connection pool and the response cache stay warm between commands"""
+
+__all__ = ['SptShell', 'ParserCompleter', 'get_history_file']
+
+import argparse
+import importlib
+import os
+import shlex
+import typing
+
+import _app_config as cfg
+import _cli_parser as cli
+from _command_dispatcher import COMMAND_HANDLERS_MODULE, CommandDispatcher
+from _env_manager import EnvironmentManager
+from _logger import default_logger as log
+
+try:
+    import readline
+except ImportError:  # Windows without pyreadline: no history or completion
+    readline = None
+
+HISTORY_FILE = 'shell_history'
+DEFAULT_HISTORY_SIZE = 1000
+PROMPT = 'spt> '
+EXIT_COMMANDS = ('exit', 'quit')
+HELP_COMMANDS = ('help', '?')
+NESTED_COMMANDS = ('shell', 'daemon')  # Cannot run inside the shell
+
+
+def get_history_file() -> str:
+    return os.path.join(EnvironmentManager.get_app_data_dir(), HISTORY_FILE)
+
+
+def get_history_size() -> int:
+    return int(cfg.GlobalConfiguration.get_setting('SHELL_SETTINGS', 'HISTORY_SIZE', fallback=DEFAULT_HISTORY_SIZE))
+
+
+class ParserCompleter:
+    """Completion candidates taken from an argparse tree: subcommands, options, and the choices of an option that
+    expects a value, e.g. `--format <TAB>`"""
+
+    def __init__(self, parser_obj: argparse.ArgumentParser, extra_commands: typing.Iterable[str] = ()):
+        self._parser = parser_obj
+        self._extra_commands = list(extra_commands)
+
+    @staticmethod
+    def _get_subcommands(parser_obj: argparse.ArgumentParser) -> dict:
+        for action in parser_obj._actions:
+            if isinstance(action, argparse._SubParsersAction):
+                return action.choices
+        return {}
+
+    @staticmethod
+    def _get_option(parser_obj: argparse.ArgumentParser, word: str) -> typing.Optional[argparse.Action]:
+        return parser_obj._option_string_actions.get(word)
+
+    def get_candidates(self, words: typing.List[str]) -> typing.List[str]:
+        """Candidates for the word after `words`, the words already typed on the line"""
+        parser_obj = self._parser
+        for word in words:
+            subcommand = self._get_subcommands(parser_obj).get(word)
+            if subcommand is not None:
+                parser_obj = subcommand
+
+        last_option = self._get_option(parser_obj, words[-1]) if words else None
+        if last_option is not None and last_option.nargs != 0:
+            return [str(choice) for choice in last_option.choices or ()]  # Free text values are not completed
+
+        candidates = list(self._get_subcommands(parser_obj).keys())
+        candidates.extend(option for action in parser_obj._actions for option in action.option_strings
+                          if option.startswith('--'))
+        if parser_obj is self._parser:
+            candidates.extend(self._extra_commands)
+        return candidates
+
+    def complete(self, text: str, words: typing.List[str]) -> typing.List[str]:
+        return sorted(candidate for candidate in set(self.get_candidates(words)) if candidate.startswith(text))
+
+
+class SptShell:
+    """Reads commands such as `personalise GetTopTracks --limit 5` and runs them through a CommandDispatcher.
+    Relative paths in those commands, e.g. --out, resolve against `working_dir`, the directory spt was started in"""
+
+    def __init__(self, parser_obj: argparse.ArgumentParser = cli.main_cli_parser, history_file: str = None,
+                 working_dir: str = None):
+        self._parser = parser_obj
+        self._working_dir = working_dir or os.getcwd()
+        self._dispatcher = CommandDispatcher(parser_obj)
+        self._completer = ParserCompleter(self._parser, extra_commands=EXIT_COMMANDS + HELP_COMMANDS)
+        self._history_file = history_file or get_history_file()
+        self._matches: typing.List[str] = []
+
+    # region readline
+
+    def _complete(self, text: str, state: int):
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            try:
+                words = shlex.split(line)
+            except ValueError:  # Unclosed quote
+                words = []
+            self._matches = [match + ' ' for match in self._completer.complete(text, words)]  # Ready for the next word
+        return self._matches[state] if state < len(self._matches) else None
+
+    def _setup_readline(self):
+        if readline is None:
+            return
+        readline.set_completer(self._complete)
+        readline.set_completer_delims(' \t\n')  # Options such as --format are completed as one word
+        if 'libedit' in (readline.__doc__ or ''):  # macOS
+            readline.parse_and_bind('bind ^I rl_complete')
+        else:
+            readline.parse_and_bind('tab: complete')
+        readline.set_history_length(get_history_size())
+        try:
+            readline.read_history_file(self._history_file)
+        except OSError:  # First session
+            pass
+
+    def _save_history(self):
+        if readline is None:
+            return
+        try:
+            readline.write_history_file(self._history_file)
+        except OSError as ex:
+            log.debug(f'Shell history not saved to {self._history_file}. {ex}')
+
+    # endregion
+
+    def _warm_up(self):
+        """Load what every command needs before the first prompt"""
+        importlib.import_module(COMMAND_HANDLERS_MODULE)
+        try:
+            import _authorizer
+            _authorizer.TokenManager.get().get_credentials()
+        except Exception as ex:
+            log.debug(f'Credentials not loaded ahead of the first command. {ex}')
+
+    def run_line(self, line: str) -> typing.Optional[int]:
+        """Run one line of input. Returns the exit code of the command, or None when there was nothing to run"""
+        try:
+            argv = shlex.split(line)
+        except ValueError as ex:
+            log.error(f'Could not read the command. {ex}')
+            return 2
+        if argv and argv[0] == 'spt':
+            argv = argv[1:]
+        if not argv:
+            return None
+        if argv[0] in HELP_COMMANDS:
+            self._parser.print_help()
+            return 0
+        if argv[0].strip().lower() in NESTED_COMMANDS:
+            log.error(f'{argv[0]} cannot run inside the shell')
+            return 2
+        return self._dispatcher.run(argv, self._working_dir)
+
+    def run(self) -> int:
+        self._setup_readline()
+        self._warm_up()
+        print('Type help for the commands, exit or Ctrl-D to leave')
+        exit_code = 0
+        try:
+            while True:
+                try:
+                    line = input(PROMPT)
+                except KeyboardInterrupt:  # Clears the line, like other shells
+                    print()
+                    continue
+                except EOFError:
+                    print()
+                    break
+                if line.strip() in EXIT_COMMANDS:
+                    break
+                try:
+                    result = self.run_line(line)
+                except KeyboardInterrupt:
+                    log.warn('Command interrupted')
+                    result = 130
+                if result is not None:
+                    exit_code = result
+        finally:
+            self._save_history()
+        return exit_code
@@ -0,0 +1,73 @@
+"""JSON encode/decode helpers. Uses orjson when it is installed, falling back to the standard library"""
+
+__all__ = ['loads', 'dumps', 'BACKEND_NAME', 'FieldProjection']
+
+import json
+from typing import Dict, Iterable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # Optional dependency: pip install spt[fast-json]
+    orjson = None
+
+BACKEND_NAME = 'orjson' if orjson is not None else 'json'
+
+
+def loads(data: Union[bytes, str]):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(payload) -> str:
+    """Compact encoding, e.g. for NDJSON records. Indented output stays on the standard library (4 space indent)"""
+    if orjson is not None:
+        return orjson.dumps(payload).decode('utf-8')
+    return json.dumps(payload)
+
+
+class FieldProjection:
+    """Keeps only the requested dotted paths of a JSON document, e.g. `items.name,items.album.id,total`.
+
+    Lists are projected element by element, so `items.name` keeps the name of every item. A path that ends on an
+    object keeps the whole object, even when deeper paths below it are asked for too, e.g. `items.name,items`.
+    """
+
+    def __init__(self, tree: Dict[str, Optional[dict]]):
+        self._tree = tree
+
+    @classmethod
+    def parse(cls, fields: Union[str, Iterable[str]]):
+        if isinstance(fields, str):
+            fields = fields.split(',')
+        tree = {}  # None marks a value that is kept whole
+        for path in fields:
+            keys = [part.strip() for part in path.strip().split('.') if part.strip()]
+            if not keys:
+                continue
+            node = tree
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+                if node is None:  # A shorter path already keeps this value whole
+                    break
+            else:
+                node[keys[-1]] = None
+        return cls(tree)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._tree
+
+    @staticmethod
+    def _project(value, tree: Optional[Dict[str, dict]]):
+        if not tree:
+            return value
+        if isinstance(value, list):
+            return [FieldProjection._project(item, tree) for item in value]
+        if isinstance(value, dict):
+            return {key: FieldProjection._project(value[key], subtree) for key, subtree in tree.items()
+                    if key in value}
+        return value
+
+    def apply(self, value):
+        return FieldProjection._project(value, self._tree)
@@ -0,0 +1,199 @@
+"""Local SQLite mirror of the current user's saved tracks, albums and shows, kept up to date with delta syncs"""
+
+__all__ = ['LibraryMirror', 'SyncResult', 'LIBRARY_ENTITIES']
+
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+from dataclasses import asdict, dataclass
+from typing import List
+
+import _authorizer
+import _shared_mod
+import _spotify_web_api as spotify
+from _credential_store import UNSAFE_PROFILE_CHARACTERS
+from _env_manager import EnvironmentManager
+from _logger import default_logger as log
+
+
+@dataclass
+class LibraryEntity:
+    name: str  # Name used on the command line, e.g. tracks
+    table: str
+    id_column: str
+    item_key: str  # Key of the saved object inside each paging item, e.g. {"added_at": ..., "track": {...}}
+    endpoint: _shared_mod.SpotifyEndPoints
+    artists_table: str = ''  # Empty when the entity has no artists (shows)
+
+
+TRACKS = LibraryEntity('tracks', 'saved_tracks', 'track_id', 'track', _shared_mod.SpotifyEndPoints.SAVED_TRACKS,
+                       'track_artists')
+ALBUMS = LibraryEntity('albums', 'saved_albums', 'album_id', 'album', _shared_mod.SpotifyEndPoints.SAVED_ALBUMS,
+                       'album_artists')
+SHOWS = LibraryEntity('shows', 'saved_shows', 'show_id', 'show', _shared_mod.SpotifyEndPoints.SAVED_SHOWS)
+LIBRARY_ENTITIES = {entity.name: entity for entity in (TRACKS, ALBUMS, SHOWS)}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saved_tracks (
+    track_id TEXT PRIMARY KEY,
+    added_at TEXT NOT NULL,
+    name TEXT,
+    album_id TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS track_artists (
+    track_id TEXT NOT NULL,
+    artist_id TEXT NOT NULL,
+    PRIMARY KEY (track_id, artist_id)
+);
+CREATE TABLE IF NOT EXISTS saved_albums (
+    album_id TEXT PRIMARY KEY,
+    added_at TEXT NOT NULL,
+    name TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS album_artists (
+    album_id TEXT NOT NULL,
+    artist_id TEXT NOT NULL,
+    PRIMARY KEY (album_id, artist_id)
+);
+CREATE TABLE IF NOT EXISTS saved_shows (
+    show_id TEXT PRIMARY KEY,
+    added_at TEXT NOT NULL,
+    name TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_saved_tracks_added_at ON saved_tracks (added_at);
+CREATE INDEX IF NOT EXISTS idx_saved_tracks_album_id ON saved_tracks (album_id);
+CREATE INDEX IF NOT EXISTS idx_track_artists_artist_id ON track_artists (artist_id);
+CREATE INDEX IF NOT EXISTS idx_saved_albums_added_at ON saved_albums (added_at);
+CREATE INDEX IF NOT EXISTS idx_album_artists_artist_id ON album_artists (artist_id);
+CREATE INDEX IF NOT EXISTS idx_saved_shows_added_at ON saved_shows (added_at);
+"""
+
+
+@dataclass
+class SyncResult:
+    entity: str
+    updated: int = 0  # Items inserted or refreshed
+    removed: int = 0
+    requests: int = 0
+    total: int = 0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class LibraryMirror:
+    def __init__(self, db_path: str = None, user: _authorizer.UserContext = None):
+        self._db_path = db_path or LibraryMirror.get_default_path(user)
+        self._connection = sqlite3.connect(self._db_path)
+        self._connection.executescript(SCHEMA)
+
+    @staticmethod
+    def _adopt_legacy_mirror(mirror_dir: str, db_path: str, user: _authorizer.UserContext):
+        """Mirrors used to be named after the refresh token. Keep syncing into it rather than downloading again"""
+        credentials = _authorizer.AuthorizerService.get_user_credentials(user)
+        if credentials is None or not credentials.refresh_token:
+            return
+        token_hash = hashlib.sha256(credentials.refresh_token.encode('utf-8')).hexdigest()[:16]
+        legacy_path = os.path.join(mirror_dir, f'library_{token_hash}.db')
+        if os.path.exists(legacy_path):
+            os.replace(legacy_path, db_path)
+            log.debug(f'Library mirror {legacy_path} renamed to {db_path}')
+
+    @staticmethod
+    def get_default_path(user: _authorizer.UserContext = None) -> str:
+        """One mirror per profile, under the app data directory. Signing in again keeps the mirror"""
+        user = user or _authorizer.UserContext.get_default()
+        mirror_dir = os.path.join(EnvironmentManager.get_app_data_dir(), 'store')
+        pathlib.Path(mirror_dir).mkdir(parents=True, exist_ok=True)
+        db_path = os.path.join(mirror_dir, f'library_{UNSAFE_PROFILE_CHARACTERS.sub("_", user.profile)}.db')
+        if not os.path.exists(db_path):
+            LibraryMirror._adopt_legacy_mirror(mirror_dir, db_path, user)
+        return db_path
+
+    @property
+    def db_path(self) -> str:
+        return self._db_path
+
+    # region Helper methods
+
+    def _get_stored_added_at(self, entity: LibraryEntity, entity_id: str):
+        row = self._connection.execute(f'SELECT added_at FROM {entity.table} WHERE {entity.id_column} = ?',
+                                       (entity_id,)).fetchone()
+        return row[0] if row else None
+
+    def _upsert(self, entity: LibraryEntity, items: List[dict]):
+        for item in items:
+            saved_object = item[entity.item_key]
+            entity_id = saved_object['id']
+            if entity is TRACKS:
+                self._connection.execute('INSERT OR REPLACE INTO saved_tracks '
+                                         '(track_id, added_at, name, album_id, payload) VALUES (?, ?, ?, ?, ?)',
+                                         (entity_id, item['added_at'], saved_object.get('name'),
+                                          (saved_object.get('album') or {}).get('id'), json.dumps(saved_object)))
+            else:
+                self._connection.execute(f'INSERT OR REPLACE INTO {entity.table} '
+                                         f'({entity.id_column}, added_at, name, payload) VALUES (?, ?, ?, ?)',
+                                         (entity_id, item['added_at'], saved_object.get('name'),
+                                          json.dumps(saved_object)))
+            if entity.artists_table:
+                self._connection.executemany(f'INSERT OR IGNORE INTO {entity.artists_table} '
+                                             f'({entity.id_column}, artist_id) VALUES (?, ?)',
+                                             [(entity_id, artist['id']) for artist in saved_object.get('artists', [])])
+
+    def _remove_missing(self, entity: LibraryEntity, seen_ids: set) -> int:
+        stored_ids = [row[0] for row in self._connection.execute(f'SELECT {entity.id_column} FROM {entity.table}')]
+        removed_ids = [(entity_id,) for entity_id in stored_ids if entity_id not in seen_ids]
+        self._connection.executemany(f'DELETE FROM {entity.table} WHERE {entity.id_column} = ?', removed_ids)
+        if entity.artists_table:
+            self._connection.executemany(f'DELETE FROM {entity.artists_table} WHERE {entity.id_column} = ?',
+                                         removed_ids)
+        return len(removed_ids)
+
+    def count(self, entity: LibraryEntity) -> int:
+        return self._connection.execute(f'SELECT COUNT(*) FROM {entity.table}').fetchone()[0]
+
+    # endregion
+
+    def sync(self, api: spotify.LibraryAPI, entity: LibraryEntity, full: bool = False) -> SyncResult:
+        """Fetch saved items newest first and stop at the first item already in the mirror.
+
+        Spotify returns saved items ordered by `added_at` (most recent first), so everything after a known item is
+        known too. A delta sync cannot see removals; `full=True` walks the whole library and drops removed items.
+        An interrupted sync stores nothing, so the next one starts over.
+        """
+        result = SyncResult(entity=entity.name)
+        seen_ids = set()
+        url_params = {'limit': spotify.MAX_PAGE_SIZE, 'offset': 0}
+        # One transaction per sync. Committing page by page would let an interrupted sync store the newest items,
+        # and every later delta sync would stop at them without fetching the rest
+        with self._connection:
+            for page in api.iter_pages(entity.endpoint.value, url_params, prefetch=False):
+                result.requests += 1
+                new_items = []
+                reached_known_items = False
+                for item in page.get('items', []):
+                    entity_id = item[entity.item_key]['id']
+                    seen_ids.add(entity_id)
+                    if not full and self._get_stored_added_at(entity, entity_id) == item['added_at']:
+                        reached_known_items = True
+                        break
+                    new_items.append(item)
+
+                self._upsert(entity, new_items)
+                result.updated += len(new_items)
+                if reached_known_items:
+                    break
+
+            if full:
+                result.removed = self._remove_missing(entity, seen_ids)
+        result.total = self.count(entity)
+        log.debug(f'Library sync finished. {result}')
+        return result
+
+    def close(self):
+        self._connection.close()
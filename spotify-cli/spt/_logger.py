@@ -60,14 +60,26 @@ server_formatter = \
 default_logger = logging.getLogger('Spotify Logger')
 default_logger.setLevel(logging.DEBUG)
 
-# Create console handler for logging for minimal app info logs
-console_handler = StreamHandler(sys.stdout)
+# Create console handler for logging for minimal app info logs. On stderr, so stdout carries only command output
+console_handler = StreamHandler(sys.stderr)
 console_handler.setLevel(INFO)
 console_handler.setFormatter(default_formatter)
 default_logger.addHandler(console_handler)
 
+
+class _DailyLogFileHandler(FileHandler):
+    """Resolves (and creates) today's logfile when the first record is written, not when this module is imported"""
+
+    def __init__(self):
+        super().__init__(filename='spt.log', delay=True)
+
+    def _open(self):
+        self.baseFilename = _get_log_file()
+        return super()._open()
+
+
 # Create a file handler for to store more detailed logs
-filehandler = FileHandler(filename=_get_log_file())
+filehandler = _DailyLogFileHandler()
 filehandler.setLevel(DEBUG)
 filehandler.setFormatter(detailed_formatter)
 default_logger.addHandler(filehandler)
@@ -0,0 +1,71 @@
+"""Per-thread redirection of stdout and stderr, so commands running side by side in one process, e.g. in the daemon or
+a batch, each write to their own destination"""
+
+__all__ = ['ThreadLocalStream', 'install_stream_proxies', 'capture_output']
+
+import contextlib
+import io
+import sys
+import threading
+import typing
+
+from _logger import console_handler
+
+
+class ThreadLocalStream(io.TextIOBase):
+    """Installed as sys.stdout and sys.stderr. Writes go to the stream bound to the current thread, if any, otherwise
+    to the stream that was replaced"""
+
+    def __init__(self, default: typing.TextIO):
+        self._default = default
+        self._local = threading.local()
+
+    @property
+    def current(self) -> typing.TextIO:
+        return getattr(self._local, 'stream', None) or self._default
+
+    def bind(self, stream: typing.Optional[typing.TextIO]):
+        previous = getattr(self._local, 'stream', None)
+        self._local.stream = stream
+        return previous
+
+    @property
+    def encoding(self):
+        return getattr(self.current, 'encoding', 'utf-8')
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self.current.isatty()
+
+    def write(self, text):
+        return self.current.write(text)
+
+    def flush(self):
+        self.current.flush()
+
+
+def install_stream_proxies() -> typing.Tuple[ThreadLocalStream, ThreadLocalStream]:
+    """Replace sys.stdout and sys.stderr with ThreadLocalStreams. Safe to call more than once"""
+    if not isinstance(sys.stdout, ThreadLocalStream):
+        sys.stdout = ThreadLocalStream(sys.stdout)
+    if not isinstance(sys.stderr, ThreadLocalStream):
+        sys.stderr = ThreadLocalStream(sys.stderr)
+        console_handler.setStream(sys.stderr)
+    return sys.stdout, sys.stderr
+
+
+@contextlib.contextmanager
+def capture_output(stdout: typing.TextIO = None, stderr: typing.TextIO = None):
+    """Send what the current thread writes to stdout/stderr to the given streams. None leaves a stream as it is"""
+    stdout_proxy, stderr_proxy = install_stream_proxies()
+    previous_stdout = stdout_proxy.bind(stdout) if stdout is not None else None
+    previous_stderr = stderr_proxy.bind(stderr) if stderr is not None else None
+    try:
+        yield stdout, stderr
+    finally:
+        if stdout is not None:
+            stdout_proxy.bind(previous_stdout)
+        if stderr is not None:
+            stderr_proxy.bind(previous_stderr)
@@ -0,0 +1,241 @@
+"""Per-request timing instrumentation, aggregated into in-process histograms per endpoint"""
+
+__all__ = ['RequestMetrics', 'RequestTiming', 'LatencyHistogram', 'get_endpoint_template']
+
+import bisect
+import contextlib
+import contextvars
+import json
+import re
+import threading
+import urllib.parse as urllib
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List
+
+# Upper bounds of the histogram buckets, in milliseconds. The last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+STATIC_PATH_SEGMENTS = {'v1', 'me', 'top', 'tracks', 'artists', 'albums', 'shows', 'contains', 'users',
+                        'audio-features', 'audio-analysis', 'api', 'token', 'authorize'}
+NON_ALPHANUMERIC_PATTERN = re.compile(r'[^A-Za-z0-9-]')
+
+
+def get_endpoint_template(url: str) -> str:
+    """Collapse ids in a request URL, e.g. https://api.spotify.com/v1/tracks/4iV5W9 -> /v1/tracks/{id}"""
+    path = urllib.urlparse(url).path.rstrip('/')
+    segments = [segment if segment in STATIC_PATH_SEGMENTS or NON_ALPHANUMERIC_PATTERN.search(segment) else '{id}'
+                for segment in path.split('/') if segment]
+    return '/' + '/'.join(segments)
+
+
+@dataclass
+class RequestTiming:
+    """Timings are in seconds. connect_s covers the DNS lookup and TCP connect, which urllib3 performs as one step.
+    Network phases are zero when a pooled connection was reused or the response was served from the cache."""
+    endpoint: str = ''
+    method: str = 'GET'
+    status: int = 0
+    connect_s: float = 0.0
+    tls_s: float = 0.0
+    ttfb_s: float = 0.0  # From sending the request until the response headers were received
+    download_s: float = 0.0
+    total_s: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+    from_cache: bool = False
+    error: str = ''
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class LatencyHistogram:
+    counts: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    count: int = 0
+    total_ms: float = 0.0
+    min_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def add(self, value_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.min_ms = value_ms if self.count == 0 else min(self.min_ms, value_ms)
+        self.max_ms = max(self.max_ms, value_ms)
+        self.count += 1
+        self.total_ms += value_ms
+
+    def percentile(self, percent: float) -> float:
+        """Upper bound of the bucket holding the given percentile, capped at the largest value seen"""
+        if self.count == 0:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                upper_bound = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+                return min(upper_bound, self.max_ms)
+        return self.max_ms
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean_ms, 3),
+            'min_ms': round(self.min_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': round(self.percentile(50), 3),
+            'p90_ms': round(self.percentile(90), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'buckets_ms': dict(zip([str(bound) for bound in LATENCY_BUCKETS_MS] + ['+inf'], self.counts))
+        }
+
+
+@dataclass
+class EndpointStats:
+    total: LatencyHistogram = field(default_factory=LatencyHistogram)
+    connect: LatencyHistogram = field(default_factory=LatencyHistogram)
+    tls: LatencyHistogram = field(default_factory=LatencyHistogram)
+    ttfb: LatencyHistogram = field(default_factory=LatencyHistogram)
+    download: LatencyHistogram = field(default_factory=LatencyHistogram)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    bytes: int = 0
+    retries: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+
+    def add(self, timing: RequestTiming):
+        self.total.add(timing.total_s * 1000)
+        if not timing.from_cache:
+            self.ttfb.add(timing.ttfb_s * 1000)
+            self.download.add(timing.download_s * 1000)
+        if timing.connect_s:
+            self.connect.add(timing.connect_s * 1000)
+        if timing.tls_s:
+            self.tls.add(timing.tls_s * 1000)
+        status = str(timing.status)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes += timing.bytes
+        self.retries += timing.retries
+        self.cache_hits += int(timing.from_cache)
+        self.errors += int(bool(timing.error))
+
+    def to_dict(self):
+        return {
+            'total': self.total.to_dict(),
+            'connect': self.connect.to_dict(),
+            'tls': self.tls.to_dict(),
+            'ttfb': self.ttfb.to_dict(),
+            'download': self.download.to_dict(),
+            'statuses': dict(self.statuses),
+            'bytes': self.bytes,
+            'retries': self.retries,
+            'cache_hits': self.cache_hits,
+            'errors': self.errors
+        }
+
+
+class RequestMetrics:
+    """Collects a RequestTiming for every request, notifies listeners and aggregates per endpoint template"""
+    __listeners: List[Callable[[RequestTiming], None]] = []
+    __endpoints: Dict[str, EndpointStats] = {}  # Requests made outside of a collect() block
+    # Stats of the enclosing collect() blocks, innermost last. Threads that copy the context add to the same stats
+    __scopes = contextvars.ContextVar('spt_request_metrics_scopes', default=())
+    __lock = threading.Lock()
+    __current = threading.local()
+
+    # region Listeners
+
+    @staticmethod
+    def add_listener(listener: Callable[[RequestTiming], None]):
+        with RequestMetrics.__lock:
+            RequestMetrics.__listeners.append(listener)
+        return listener
+
+    @staticmethod
+    def remove_listener(listener: Callable[[RequestTiming], None]):
+        with RequestMetrics.__lock:
+            if listener in RequestMetrics.__listeners:
+                RequestMetrics.__listeners.remove(listener)
+
+    # endregion
+
+    # region Connection phase hooks
+
+    @staticmethod
+    def begin(timing: RequestTiming):
+        """Attach a timing to the current thread, so connection-level hooks can add their phases to it"""
+        RequestMetrics.__current.timing = timing
+        return timing
+
+    @staticmethod
+    def end():
+        RequestMetrics.__current.timing = None
+
+    @staticmethod
+    def add_phase(phase: str, seconds: float):
+        timing = getattr(RequestMetrics.__current, 'timing', None)
+        if timing is not None:
+            setattr(timing, phase, getattr(timing, phase) + seconds)
+
+    @staticmethod
+    def get_phase(phase: str) -> float:
+        timing = getattr(RequestMetrics.__current, 'timing', None)
+        return getattr(timing, phase) if timing is not None else 0.0
+
+    # endregion
+
+    @staticmethod
+    @contextlib.contextmanager
+    def collect():
+        """Aggregate the requests made in the block separately, e.g. per command, so commands running side by side
+        in one process each report their own timings. Outer blocks still see the requests"""
+        token = RequestMetrics.__scopes.set(RequestMetrics.__scopes.get() + ({},))
+        try:
+            yield
+        finally:
+            RequestMetrics.__scopes.reset(token)
+
+    @staticmethod
+    def _get_endpoints() -> Dict[str, EndpointStats]:
+        scopes = RequestMetrics.__scopes.get()
+        return scopes[-1] if scopes else RequestMetrics.__endpoints
+
+    @staticmethod
+    def record(timing: RequestTiming):
+        with RequestMetrics.__lock:
+            for endpoints in RequestMetrics.__scopes.get() or (RequestMetrics.__endpoints,):
+                endpoints.setdefault(timing.endpoint, EndpointStats()).add(timing)
+            listeners = list(RequestMetrics.__listeners)
+        for listener in listeners:
+            listener(timing)
+        return timing
+
+    @staticmethod
+    def reset():
+        with RequestMetrics.__lock:
+            RequestMetrics._get_endpoints().clear()
+
+    @staticmethod
+    def to_dict() -> dict:
+        with RequestMetrics.__lock:
+            return {endpoint: stats.to_dict() for endpoint, stats in RequestMetrics._get_endpoints().items()}
+
+    @staticmethod
+    def dump(path: str):
+        with open(path, 'w') as metrics_file:
+            json.dump(RequestMetrics.to_dict(), metrics_file, indent=4)
+        return path
+
+    @staticmethod
+    def get_summary() -> str:
+        header = f"{'endpoint':<36}{'calls':>7}{'p50 ms':>9}{'p99 ms':>9}{'ttfb':>8}{'connect':>9}{'KiB':>9}" \
+                 f"{'retries':>9}{'cached':>8}"
+        lines = ['Request timings', header, '-' * len(header)]
+        for endpoint, stats in sorted(RequestMetrics.to_dict().items()):
+            lines.append(f"{endpoint:<36}{stats['total']['count']:>7}{stats['total']['p50_ms']:>9}"
+                         f"{stats['total']['p99_ms']:>9}{stats['ttfb']['p50_ms']:>8}{stats['connect']['p50_ms']:>9}"
+                         f"{round(stats['bytes'] / 1024, 1):>9}{stats['retries']:>9}{stats['cache_hits']:>8}")
+        return '\n'.join(lines)
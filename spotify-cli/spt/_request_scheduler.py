@@ -0,0 +1,176 @@
+"""Client-side rate limiting and retry policy for Spotify Web API calls"""
+
+__all__ = ['RequestScheduler', 'TokenBucket', 'SchedulerStats']
+
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from typing import Callable
+
+import requests
+
+import _app_config as cfg
+from _logger import default_logger as log
+
+RATE_LIMIT_SETTINGS_SECTION = 'RATE_LIMIT_SETTINGS'
+RETRYABLE_STATUS_CODES = (HTTPStatus.INTERNAL_SERVER_ERROR, HTTPStatus.BAD_GATEWAY,
+                          HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.GATEWAY_TIMEOUT)
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0  # Attempts sent, including retries
+    throttled: int = 0  # Calls delayed by the local token bucket
+    rate_limited: int = 0  # 429 responses received
+    retried: int = 0  # Attempts repeated after a 429, 5xx or connection error
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class TokenBucket:
+    """Thread-safe token bucket. A Retry-After pause blocks every caller, not just the one that was rejected.
+    A rate of 0 or less does not limit the rate, only the pauses apply"""
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def pause_for(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns the number of seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self._rate <= 0:
+                    if now >= self._paused_until:
+                        return waited
+                    delay = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if now >= self._paused_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = max(self._paused_until - now, (1 - self._tokens) / self._rate)
+            time.sleep(delay)
+            waited += delay
+
+
+class RequestScheduler:
+    __bucket = None
+    __stats = SchedulerStats()
+    __lock = threading.Lock()
+
+    # region Settings
+
+    @staticmethod
+    def _get_setting(option: str, fallback: float) -> float:
+        return float(cfg.GlobalConfiguration.get_setting(RATE_LIMIT_SETTINGS_SECTION, option, fallback=fallback))
+
+    @staticmethod
+    def _get_bucket() -> TokenBucket:
+        if RequestScheduler.__bucket is None:
+            with RequestScheduler.__lock:
+                if RequestScheduler.__bucket is None:
+                    RequestScheduler.__bucket = TokenBucket(
+                        rate=RequestScheduler._get_setting('REQUESTS_PER_SECOND', 0),
+                        capacity=RequestScheduler._get_setting('BURST', 10))
+        return RequestScheduler.__bucket
+
+    # endregion
+
+    # region Helper methods
+
+    @staticmethod
+    def _count(counter: str):
+        with RequestScheduler.__lock:
+            setattr(RequestScheduler.__stats, counter, getattr(RequestScheduler.__stats, counter) + 1)
+
+    @staticmethod
+    def _get_backoff_delay(attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        base = RequestScheduler._get_setting('BACKOFF_BASE', 0.5)
+        cap = RequestScheduler._get_setting('BACKOFF_CAP', 30)
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+    @staticmethod
+    def _get_retry_after_delay(response: requests.Response, attempt: int) -> float:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is None:
+            return RequestScheduler._get_backoff_delay(attempt)
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return RequestScheduler._get_backoff_delay(attempt)
+
+    # endregion
+
+    @staticmethod
+    def get_stats() -> SchedulerStats:
+        with RequestScheduler.__lock:
+            return SchedulerStats(**RequestScheduler.__stats.to_dict())
+
+    @staticmethod
+    def reset():
+        with RequestScheduler.__lock:
+            RequestScheduler.__bucket = None
+            RequestScheduler.__stats = SchedulerStats()
+
+    @staticmethod
+    def submit(send_request: Callable[[], requests.Response]) -> requests.Response:
+        """Send a request within the allowed rate, retrying 429s, 5xx responses and connection errors.
+
+        Once retries are exhausted the last response is returned (or the last error raised) for the caller to handle.
+        """
+        max_retries = int(RequestScheduler._get_setting('MAX_RETRIES', 4))
+        bucket = RequestScheduler._get_bucket()
+        attempt = 0
+        while True:
+            if bucket.acquire() > 0:
+                RequestScheduler._count('throttled')
+            RequestScheduler._count('requests')
+
+            try:
+                response = send_request()
+            except RETRYABLE_EXCEPTIONS as ex:
+                if attempt >= max_retries:
+                    raise
+                delay = RequestScheduler._get_backoff_delay(attempt)
+                log.debug(f'Request failed with {type(ex).__name__}. Retrying in {delay:.2f} seconds')
+            else:
+                if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+                    RequestScheduler._count('rate_limited')
+                    delay = RequestScheduler._get_retry_after_delay(response, attempt)
+                    bucket.pause_for(delay)
+                elif response.status_code in RETRYABLE_STATUS_CODES:
+                    delay = RequestScheduler._get_backoff_delay(attempt)
+                else:
+                    return response
+
+                if attempt >= max_retries:
+                    return response
+                log.debug(f'Request returned HTTPStatus={response.status_code}. Retrying in {delay:.2f} seconds')
+
+            RequestScheduler._count('retried')
+            attempt += 1
+            time.sleep(delay)
@@ -0,0 +1,206 @@
+"""Persistent on-disk cache for Spotify API GET responses, revalidated with ETags"""
+
+__all__ = ['ResponseCache', 'CachedResponse']
+
+import contextvars
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import time
+import typing
+from dataclasses import dataclass, field
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import _app_config as cfg
+from _env_manager import EnvironmentManager
+from _logger import default_logger as log
+
+CACHE_SETTINGS_SECTION = 'CACHE_SETTINGS'
+DEFAULT_MAX_SIZE_MB = 50
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Cache-Control')
+
+
+@dataclass
+class CachedResponse:
+    url: str = ''
+    etag: str = ''
+    cache_control: str = ''
+    stored_at: float = 0.0
+    headers: dict = field(default_factory=dict)
+    body: str = ''
+
+    @classmethod
+    def from_response(cls, response: requests.Response):
+        entry = cls()
+        entry.url = response.url
+        entry.etag = response.headers.get('ETag', '')
+        entry.cache_control = response.headers.get('Cache-Control', '')
+        entry.stored_at = time.time()
+        entry.headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        entry.body = response.text
+        return entry
+
+    @property
+    def max_age(self) -> int:
+        match = MAX_AGE_PATTERN.search(self.cache_control or '')
+        return int(match.group(1)) if match else 0
+
+    @property
+    def is_fresh(self) -> bool:
+        """Still inside its max-age window, so it can be served without contacting Spotify"""
+        if 'no-cache' in self.cache_control:
+            return False
+        return (time.time() - self.stored_at) < self.max_age
+
+    @property
+    def is_storable(self) -> bool:
+        if 'no-store' in self.cache_control:
+            return False
+        return self.etag not in (None, '') or self.max_age > 0
+
+    def revalidated(self, not_modified_response: requests.Response):
+        """Refresh the freshness metadata from a 304 Not Modified response"""
+        self.cache_control = not_modified_response.headers.get('Cache-Control', self.cache_control)
+        self.etag = not_modified_response.headers.get('ETag', self.etag)
+        self.stored_at = time.time()
+        return self
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = 'utf-8'
+        response._content = self.body.encode('utf-8')
+        return response
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'etag': self.etag,
+            'cache_control': self.cache_control,
+            'stored_at': self.stored_at,
+            'headers': self.headers,
+            'body': self.body
+        }
+
+
+class ResponseCache:
+    """Size-bounded LRU of response bodies stored under the app data directory. Recency is tracked via file mtime"""
+    # (enabled, refresh) of the running command. Only set in the command's context, and the threads it starts copy
+    # that context, so commands running side by side in one process keep their own flags
+    __command_settings = contextvars.ContextVar('spt_response_cache_settings', default=(True, False))
+    __cache_dir = None
+    __lock = threading.Lock()
+
+    # region Configuration
+
+    @staticmethod
+    def configure(enabled: bool = True, refresh: bool = False):
+        """`enabled=False` bypasses the cache completely, `refresh=True` skips lookups but still stores responses"""
+        ResponseCache.__command_settings.set((enabled, refresh))
+
+    @staticmethod
+    def get_command_settings() -> typing.Tuple[bool, bool]:
+        """(enabled, refresh) of the running command"""
+        return ResponseCache.__command_settings.get()
+
+    @staticmethod
+    def is_enabled() -> bool:
+        enabled, _ = ResponseCache.get_command_settings()
+        if not enabled:
+            return False
+        setting = cfg.GlobalConfiguration.get_setting(CACHE_SETTINGS_SECTION, 'ENABLED', fallback='True')
+        return str(setting) in ('True', 'TRUE', 'true', '1')
+
+    @staticmethod
+    def get_max_size_bytes() -> int:
+        max_size_mb = cfg.GlobalConfiguration.get_setting(CACHE_SETTINGS_SECTION, 'MAX_SIZE_MB',
+                                                          fallback=DEFAULT_MAX_SIZE_MB)
+        return int(float(max_size_mb) * 1024 * 1024)
+
+    @staticmethod
+    def get_cache_dir() -> str:
+        if ResponseCache.__cache_dir is None:
+            cache_dir = os.path.join(EnvironmentManager.get_app_data_dir(), 'cache', 'http')
+            pathlib.Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            ResponseCache.__cache_dir = cache_dir
+        return ResponseCache.__cache_dir
+
+    # endregion
+
+    # region Helper methods
+
+    @staticmethod
+    def make_key(url: str, params: dict, user_key: str) -> str:
+        canonical_params = json.dumps(params or {}, sort_keys=True, default=str)
+        return hashlib.sha256(f'{user_key}|{url}|{canonical_params}'.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _entry_path(key: str) -> str:
+        return os.path.join(ResponseCache.get_cache_dir(), f'{key}.json')
+
+    @staticmethod
+    def _write_entry(key: str, entry: CachedResponse):
+        # Write to a temp file and rename, so concurrent readers never see a partially written entry
+        file_descriptor, temp_path = tempfile.mkstemp(dir=ResponseCache.get_cache_dir(), suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w') as cache_file:
+            json.dump(entry.to_dict(), cache_file)
+        os.replace(temp_path, ResponseCache._entry_path(key))
+
+    @staticmethod
+    def _evict_least_recently_used():
+        max_size = ResponseCache.get_max_size_bytes()
+        entries = []
+        for entry_file in pathlib.Path(ResponseCache.get_cache_dir()).glob('*.json'):
+            try:
+                stat = entry_file.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_file))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_file in sorted(entries, key=lambda item: item[0]):
+            if total_size <= max_size:
+                break
+            log.debug(f'Evicting cached response {entry_file.name}')
+            entry_file.unlink(missing_ok=True)  # Another spt process may have evicted it first
+            total_size -= size
+
+    # endregion
+
+    @staticmethod
+    def lookup(key: str):
+        if not ResponseCache.is_enabled() or ResponseCache.get_command_settings()[1]:
+            return None
+
+        entry_path = ResponseCache._entry_path(key)
+        try:
+            with open(entry_path) as cache_file:
+                entry = CachedResponse(**json.load(cache_file))
+            os.utime(entry_path)  # Mark as most recently used
+        except (FileNotFoundError, ValueError, TypeError):  # Also when another spt process evicted it meanwhile
+            return None
+        return entry
+
+    @staticmethod
+    def store(key: str, entry: CachedResponse):
+        if not ResponseCache.is_enabled() or not entry.is_storable:
+            return None
+
+        with ResponseCache.__lock:
+            ResponseCache._write_entry(key, entry)
+            ResponseCache._evict_least_recently_used()
+        return entry
+
+    @staticmethod
+    def clear():
+        for entry_file in pathlib.Path(ResponseCache.get_cache_dir()).glob('*.json'):
+            entry_file.unlink(missing_ok=True)
@@ -1,7 +1,11 @@
 import json
+import sys
+import textwrap
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Union
+from typing import Iterable, List, Union
+
+import _json_backend
 
 APP_INFO_LOG = 'Spotify Shell. @Copyright 2020'
 LEGAL_NOTICE = """"
@@ -80,6 +84,15 @@ class LocalAuthServerShutdownError(Exception):
         return f'Authortization server failed to shutdown\n{self._inner_exception}'
 
 
+class FileLockTimeoutError(Exception):
+    def __init__(self, lock_path: str, timeout: float):
+        self.lock_path = lock_path
+        self.timeout = timeout
+
+    def __str__(self):
+        return f'Could not acquire the lock on {self.lock_path} within {self.timeout} seconds'
+
+
 # endregion
 
 
@@ -101,6 +114,12 @@ class SpotifyEndPoints(Enum):
     CURRENT_USER = 'https://api.spotify.com/v1/me'
     PUBLIC_USERS = 'https://api.spotify.com/v1/users'
     TOP_TRACKS_ARTISTS = 'https://api.spotify.com/v1/me/top'
+    SAVED_ALBUMS = 'https://api.spotify.com/v1/me/albums'
+    SAVED_TRACKS = 'https://api.spotify.com/v1/me/tracks'
+    SAVED_SHOWS = 'https://api.spotify.com/v1/me/shows'
+    TRACKS = 'https://api.spotify.com/v1/tracks'
+    AUDIO_FEATURES = 'https://api.spotify.com/v1/audio-features'
+    AUDIO_ANALYSIS = 'https://api.spotify.com/v1/audio-analysis'
 
 
 class SpotifyAuthSections(Enum):
@@ -131,7 +150,8 @@ class PersonlisationParams:
 
 @dataclass
 class UserLibraryParams:
-    pass
+    limit = 20
+    offset = 0
 
 
 # region
@@ -140,36 +160,103 @@ class UserLibraryParams:
 class SptOutputChannels(Enum):
     SdtOut = "StdOut"
     JsonFile = "JsonFile"
+    Memory = "Memory"  # Kept on the writer as `results`, for callers of CommandDispatcher.invoke
+
+
+class SptOutputFormats(Enum):
+    Json = 'json'  # One indented JSON document
+    NdJson = 'ndjson'  # One compact JSON record per line
 
 
 class SptOutputWriter:
     """Given a json output from a REST API call, print results to the console or json file
     """
 
-    def __init__(self, channels: List[SptOutputChannels], output_path=None):
+    def __init__(self, channels: List[SptOutputChannels], output_path=None,
+                 output_format: str = SptOutputFormats.Json.value):
         self._channels = channels
         self._outpath = output_path
+        self._format = output_format
+        self.results = None
         self._channel_handler_map = {
-            SptOutputChannels.SdtOut.value: SptOutputWriter.print_to_std_out,
-            SptOutputChannels.JsonFile.value: SptOutputWriter.print_to_json_file,
+            SptOutputChannels.SdtOut.value: self.print_to_std_out,
+            SptOutputChannels.JsonFile.value: self.print_to_json_file,
+            SptOutputChannels.Memory.value: self.keep_in_memory,
         }
 
+    @property
+    def is_ndjson(self) -> bool:
+        return self._format == SptOutputFormats.NdJson.value
+
     @staticmethod
     def pretify_json(json_data: dict) -> str:
         pretty_json = json.dumps(json_data, indent=4)
         return pretty_json
 
-    @staticmethod
-    def print_to_std_out(payload):
-        pretty_payload = SptOutputWriter.pretify_json(payload)
-        print(pretty_payload)
+    def format_payload(self, payload) -> str:
+        if self.is_ndjson:
+            return _json_backend.dumps(payload)
+        return SptOutputWriter.pretify_json(payload)
+
+    def print_to_std_out(self, payload):
+        print(self.format_payload(payload))
 
     def print_to_json_file(self, payload):
         with open(self._outpath, 'w') as json_file:
-            json.dump(payload, json_file, indent=4)
+            json_file.write(self.format_payload(payload))
+            json_file.write('\n')
+
+    def keep_in_memory(self, payload):
+        self.results = payload
 
     def execute(self, payload: dict):
         for out_channel in self._channels:
             handler = self._channel_handler_map.get(out_channel)
             if handler is not None:
                 handler(payload)
+
+    def _open_channel_streams(self):
+        streams = []
+        for out_channel in self._channels:
+            if out_channel == SptOutputChannels.SdtOut.value:
+                streams.append((sys.stdout, False))
+            elif out_channel == SptOutputChannels.JsonFile.value:
+                streams.append((open(self._outpath, 'w'), True))
+        return streams
+
+    def _format_item(self, item, position: int) -> str:
+        if self.is_ndjson:
+            return _json_backend.dumps(item) + '\n'
+        separator = ',\n' if position else '\n'
+        return separator + textwrap.indent(SptOutputWriter.pretify_json(item), ' ' * 4)
+
+    def execute_items(self, items: Iterable[dict]) -> int:
+        """Write items one at a time as they arrive, so the full result set is never held in memory.
+
+        JSON output is a single array, NDJSON output is one record per line.
+        """
+        streams = self._open_channel_streams()
+        kept_items = [] if SptOutputChannels.Memory.value in self._channels else None
+        count = 0
+        try:
+            if not self.is_ndjson:
+                for stream, _ in streams:
+                    stream.write('[')
+            for item in items:
+                chunk = self._format_item(item, count)
+                for stream, _ in streams:
+                    stream.write(chunk)
+                if kept_items is not None:
+                    kept_items.append(item)
+                count += 1
+            for stream, _ in streams:
+                if not self.is_ndjson:
+                    stream.write('\n]\n' if count else ']\n')
+                stream.flush()
+            if kept_items is not None:
+                self.results = kept_items
+            return count
+        finally:
+            for stream, owned in streams:
+                if owned:
+                    stream.close()
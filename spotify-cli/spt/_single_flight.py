@@ -0,0 +1,58 @@
+"""Coalesce identical concurrent calls so that only one of them does the work"""
+
+__all__ = ['SingleFlight']
+
+import threading
+import typing
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """While a call for a key is running, later callers with the same key wait for it and share its outcome.
+
+    The result (or exception) of the leading call is handed to every waiter. Nothing is remembered once the call
+    completes, so this is not a cache; the next call for the key runs again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: typing.Dict[typing.Hashable, _InFlightCall] = {}
+        self._coalesced_calls = 0
+
+    def do(self, key: typing.Hashable, func: typing.Callable[[], typing.Any]):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+            else:
+                self._coalesced_calls += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @property
+    def coalesced_calls(self) -> int:
+        """Number of calls that were served by another caller's in-flight call"""
+        return self._coalesced_calls
@@ -1,20 +1,47 @@
 import abc
+import contextvars
 import json
+import time
 import urllib.parse as urllib
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
-from typing import List
-
-import requests
+from typing import Callable, Dict, Iterable, Iterator, List
 
 import _authorizer
+import _json_backend
 import _shared_mod
+from _audio_features_store import AudioFeaturesStore
+from _http_session import HttpSessionManager
+from _logger import default_logger as log
+from _request_metrics import RequestMetrics, RequestTiming, get_endpoint_template
+from _request_scheduler import RequestScheduler
+from _response_cache import CachedResponse, ResponseCache
+from _single_flight import SingleFlight
+
+MAX_PAGE_SIZE = 50  # Largest `limit` accepted by the Spotify paging endpoints
+# Largest `ids` lists the /contains endpoints accept, per the Spotify Web API reference. Albums allow fewer than
+# tracks and shows, and a longer list is rejected with 400 Bad Request
+MAX_ALBUM_IDS_PER_CHECK = 20
+MAX_TRACK_IDS_PER_CHECK = 50
+MAX_SHOW_IDS_PER_CHECK = 50
+MAX_IDS_PER_TRACKS_REQUEST = 50
+MAX_IDS_PER_AUDIO_FEATURES_REQUEST = 100
+
+
+def dedupe_ids(ids: Iterable[str]) -> List[str]:
+    """Drop repeated and empty ids, keeping the order in which ids were first seen"""
+    return [item for item in dict.fromkeys(ids) if item not in (None, '')]
+
+
+def split_into_batches(ids: List[str], batch_size: int) -> List[List[str]]:
+    return [ids[index:index + batch_size] for index in range(0, len(ids), batch_size)]
 
 
 class RequestExecutorBase(abc.ABC):
-    def __init__(self, request_url: str, scopes: List):
+    def __init__(self, request_url: str, scopes: List, user: _authorizer.UserContext = None):
         self._requet_url = request_url
         self._scopes = scopes
+        self._user = user  # None acts for the default profile, see UserContext.get_default
         self._headers = {}
         self._params = {}
         self._body = {}
@@ -59,14 +86,14 @@ class RequestExecutorBase(abc.ABC):
         return self._body[key]
 
     def check_authorization(self):
-        if _authorizer.AuthorizerService.is_logged_in() is False:
+        if _authorizer.AuthorizerService.is_logged_in(self._user) is False:
             raise _shared_mod.NotLoggedInError
 
-        if _authorizer.AuthorizerService.check_scopes(self._scopes) is False:
+        if _authorizer.AuthorizerService.check_scopes(self._scopes, user=self._user) is False:
             raise _shared_mod.MissingScopesError(self._scopes)
 
     def _add_authorization_header(self):
-        self._headers['Authorization'] = f'Bearer {_authorizer.AuthorizerService.get_access_token()}'
+        self._headers['Authorization'] = f'Bearer {_authorizer.AuthorizerService.get_access_token(self._user)}'
 
     @abc.abstractmethod
     def execute_request(self):
@@ -86,29 +113,103 @@ class RequestExecutorBase(abc.ABC):
 
 
 class GetRequestExecutor(RequestExecutorBase):
-    def __init__(self, request_url, scopes):
-        super().__init__(request_url, scopes)
+    __in_flight_requests = SingleFlight()
+
+    def __init__(self, request_url, scopes, use_cache=True, coalesce=True, user: _authorizer.UserContext = None):
+        super().__init__(request_url, scopes, user)
+        self._use_cache = use_cache
+        self._coalesce = coalesce
+        self._attempts = 0
+
+    @staticmethod
+    def get_coalesced_request_count() -> int:
+        return GetRequestExecutor.__in_flight_requests.coalesced_calls
+
+    def _get_cache_key(self):
+        if not self._use_cache or not ResponseCache.is_enabled():
+            return None
+        return ResponseCache.make_key(self._requet_url, self._params,
+                                      _authorizer.AuthorizerService.get_user_cache_key(self._user))
+
+    def _get_request_key(self):
+        # The authorization header keeps identical requests made on behalf of different users apart, and the cache
+        # settings keep a --refresh or --no-cache command from sharing the outcome of a cached lookup
+        return (self._requet_url,
+                tuple(sorted((str(name), str(value)) for name, value in self._params.items())),
+                self._headers.get('Authorization', ''),
+                self._use_cache, ResponseCache.get_command_settings())
 
     def execute_request(self):
-        start_time = datetime.now()
-        full_url = self._requet_url + urllib.urlencode(self._params)
-        print(f'[{start_time}] Initialising get request to {full_url}')
-        response = requests.get(self._requet_url,
-                                headers=self._headers,
-                                params=self._params)
-        if not response.status_code == HTTPStatus.OK:
+        """Concurrent identical GETs share one network call, each caller receives its outcome"""
+        if not self._coalesce:
+            return self._send_request()
+        return GetRequestExecutor.__in_flight_requests.do(self._get_request_key(), self._send_request)
+
+    def _send_once(self, timing: RequestTiming, request_headers: dict):
+        """A single attempt on the wire. The body is streamed so that TTFB and download time can be told apart"""
+        self._attempts += 1
+        timing.retries = self._attempts - 1
+        phases_before = timing.connect_s + timing.tls_s
+        attempt_started = time.perf_counter()
+        response = HttpSessionManager.get_session().get(HttpSessionManager.resolve_url(self._requet_url),
+                                                        headers=request_headers,
+                                                        params=self._params,
+                                                        timeout=HttpSessionManager.get_timeout(),
+                                                        stream=True)
+        headers_received = time.perf_counter()
+        timing.bytes += len(response.content)  # Reads the body and returns the connection to the pool
+        timing.download_s = time.perf_counter() - headers_received
+        connection_setup = timing.connect_s + timing.tls_s - phases_before
+        timing.ttfb_s = headers_received - attempt_started - connection_setup
+        timing.status = response.status_code
+        return response
+
+    def _send_request(self):
+        timing = RequestTiming(endpoint=get_endpoint_template(self._requet_url))
+        self._attempts = 0
+        started = time.perf_counter()
+        RequestMetrics.begin(timing)
+        try:
+            return self._send_cached_request(timing)
+        except Exception as ex:
+            timing.error = type(ex).__name__
+            raise
+        finally:
+            RequestMetrics.end()
+            timing.total_s = time.perf_counter() - started
+            RequestMetrics.record(timing)
+            log.debug(f'GET {self._requet_url} {urllib.urlencode(self._params)} processed. {timing}')
+
+    def _send_cached_request(self, timing: RequestTiming):
+        cache_key = self._get_cache_key()
+        cached_entry = ResponseCache.lookup(cache_key) if cache_key else None
+        if cached_entry is not None and cached_entry.is_fresh:
+            timing.from_cache = True
+            timing.status = HTTPStatus.OK
+            return cached_entry.to_response()
+
+        request_headers = dict(self._headers)
+        if cached_entry is not None and cached_entry.etag:
+            request_headers['If-None-Match'] = cached_entry.etag
+
+        response = RequestScheduler.submit(lambda: self._send_once(timing, request_headers))
+        if response.status_code == HTTPStatus.NOT_MODIFIED and cached_entry is not None:
+            ResponseCache.store(cache_key, cached_entry.revalidated(response))
+            response = cached_entry.to_response()
+        elif not response.status_code == HTTPStatus.OK:
             raise _shared_mod.SpotifyAPICallError(f'Get request failed. HTTPStatus = {response.status_code}.'
                                                   f'\n{response.text}')
-        end_time = datetime.now()
-        print(f'[{end_time}] Get request successfuly processed. HTTPStatus={response.status_code}.'
-              f' Elapsed time = {(end_time - start_time).total_seconds()} seconds')
+        elif cache_key:
+            ResponseCache.store(cache_key, CachedResponse.from_response(response))
         return response
 
 
 # region Spotify API Reference
 class SpotifyAPIBase:
-    def __init__(self):
+    def __init__(self, user: _authorizer.UserContext = None):
         self.RequiredScopes = ''
+        self.User = user
+        self.Projection: _json_backend.FieldProjection = None  # Fields to keep from each response, e.g. --fields
 
     def get_fullname(self, func_name: str):
         return type(self).__name__ + func_name
@@ -118,72 +219,181 @@ class SpotifyAPIBase:
         pretty = json.dumps(json_data, indent=4)
         return pretty
 
+    def _fetch_json(self, url: str, url_params: dict = None):
+        req = GetRequestExecutor(request_url=url,
+                                 scopes=self.RequiredScopes,
+                                 user=self.User)
+        req.params = url_params or {}
+        return _json_backend.loads(req.execute().content)
+
+    def _project(self, payload):
+        if self.Projection is None or self.Projection.is_empty:
+            return payload
+        return self.Projection.apply(payload)
+
+    def _fetch_page(self, url: str, url_params: dict = None) -> dict:
+        return self._project(self._fetch_json(url, url_params))
+
+    def _fetch_paging_object(self, url: str, url_params: dict = None):
+        """Returns the `next` link and the projected page, so the full page can be dropped as soon as it is decoded"""
+        page = self._fetch_json(url, url_params)
+        return page.get('next'), self._project(page)
+
+    def iter_pages(self, url: str, url_params: dict = None, prefetch: bool = True) -> Iterator[dict]:
+        """Follow the `next` links of a Spotify paging object, fetching page N+1 while page N is being consumed.
+
+        Use `prefetch=False` when the caller may stop early, so no page is requested that will not be read.
+        """
+        if not prefetch:
+            while url:
+                # The next link already carries the query string, so no extra parameters are sent
+                url, page = self._fetch_paging_object(url, url_params)
+                url_params = None
+                yield page
+            return
+
+        # Pages are fetched with a copy of the caller's context, e.g. its response cache settings
+        prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='spt-page-prefetch')
+        pending_page = prefetcher.submit(contextvars.copy_context().run, self._fetch_paging_object, url, url_params)
+        try:
+            while pending_page is not None:
+                next_url, page = pending_page.result()
+                pending_page = prefetcher.submit(contextvars.copy_context().run, self._fetch_paging_object,
+                                                 next_url) if next_url else None
+                yield page
+        finally:
+            if pending_page is not None:
+                pending_page.cancel()
+            prefetcher.shutdown(wait=False)
+
+    def iter_items(self, url: str, url_params: dict = None, prefetch: bool = True) -> Iterator[dict]:
+        for page in self.iter_pages(url, url_params, prefetch):
+            yield from page.get('items', [])
+
+    @staticmethod
+    def map_concurrently(func: Callable, batches: List) -> List:
+        """Call `func` once per batch on a thread pool. Results are returned in batch order"""
+        if len(batches) <= 1:
+            return [func(batch) for batch in batches]
+
+        max_workers = min(len(batches), HttpSessionManager.get_settings().max_concurrency)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='spt-batch') as batch_executor:
+            pending_batches = [batch_executor.submit(contextvars.copy_context().run, func, batch) for batch in batches]
+            return [pending_batch.result() for pending_batch in pending_batches]
+
+    def _check_saved_items(self, url: str, ids: Iterable[str], batch_size: int) -> Dict[str, bool]:
+        unique_ids = dedupe_ids(ids)
+        batches = split_into_batches(unique_ids, batch_size)
+        batch_results = self.map_concurrently(lambda batch: self._fetch_json(url, {'ids': ','.join(batch)}), batches)
+
+        is_saved = {}
+        for batch, saved_flags in zip(batches, batch_results):
+            is_saved.update(zip(batch, saved_flags))
+        return is_saved
+
 
 class UserProfileAPI(SpotifyAPIBase):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, user: _authorizer.UserContext = None):
+        super().__init__(user)
         self.RequiredScopes = [
-            _shared_mod.SpotifyScope.READ_EMAIL,
-            _shared_mod.SpotifyScope.READ_PRIVATE
+            _shared_mod.SpotifyScope.READ_EMAIL.value,
+            _shared_mod.SpotifyScope.READ_PRIVATE.value
         ]
 
     def get_current_users_profile(self):
         req = GetRequestExecutor(_shared_mod.SpotifyEndPoints.CURRENT_USER.value,
-                                 scopes=self.RequiredScopes)
+                                 scopes=self.RequiredScopes,
+                                 user=self.User)
         json_response = req.execute()
         return json_response
 
     def get_public_users_profile(self, user_id: str):
-        fullurl = f'{_shared_mod.SpotifyEndPoints.PUBLIC_USERS}/{user_id}'
+        fullurl = f'{_shared_mod.SpotifyEndPoints.PUBLIC_USERS.value}/{user_id}'
         req = GetRequestExecutor(request_url=fullurl,
-                                 scopes=self.RequiredScopes)
+                                 scopes=self.RequiredScopes,
+                                 user=self.User)
         json_response = req.execute()
         return json_response
 
 
 class PersonalisationAPI(SpotifyAPIBase):
-    def __init__(self, params: _shared_mod.PersonlisationParams):
-        super().__init__()
+    def __init__(self, params: _shared_mod.PersonlisationParams, user: _authorizer.UserContext = None):
+        super().__init__(user)
         self._params = params
         self.RequiredScopes = [
             _shared_mod.SpotifyScope.READ_TOP.value
         ]
 
+    def get_top_items_url(self):
+        return f'{_shared_mod.SpotifyEndPoints.TOP_TRACKS_ARTISTS.value}/{self._params.entity_type}'
+
     def get_top_tracks_and_artists(self):
-        url = f'{_shared_mod.SpotifyEndPoints.TOP_TRACKS_ARTISTS.value}/{self._params.entity_type}'
         url_params = {
             'time_range': self._params.time_range,
             'limit': self._params.limit,
             'offset': self._params.offset
         }
-        req = GetRequestExecutor(request_url=url,
-                                 scopes=self.RequiredScopes)
-        req.params = url_params
-        json_response = req.execute()
-        return json_response.json()
+        return self._fetch_page(self.get_top_items_url(), url_params)
+
+    def iter_top_tracks_and_artists(self) -> Iterator[dict]:
+        """Yield every top track/artist, starting at the requested offset and using the largest page size"""
+        return self.iter_items(self.get_top_items_url(), self.get_all_items_params())
+
+    def get_all_items_params(self):
+        return {
+            'time_range': self._params.time_range,
+            'limit': MAX_PAGE_SIZE,
+            'offset': self._params.offset
+        }
 
 
 class LibraryAPI(SpotifyAPIBase):
+    def __init__(self, params: _shared_mod.UserLibraryParams = None, user: _authorizer.UserContext = None):
+        super().__init__(user)
+        self._params = params or _shared_mod.UserLibraryParams()
+        self.RequiredScopes = [
+            _shared_mod.SpotifyScope.READ_LIBRARY.value
+        ]
+
+    def _get_page_params(self, limit=None):
+        return {
+            'limit': limit or self._params.limit,
+            'offset': self._params.offset
+        }
 
     # region Read methods
-    def check_albums(self, album_ids: List[str]):
+    def check_albums(self, album_ids: Iterable[str]) -> Dict[str, bool]:
         """Check if one or more albums is already saved in the current Spotify user’s library"""
-        pass
+        return self._check_saved_items(f'{_shared_mod.SpotifyEndPoints.SAVED_ALBUMS.value}/contains',
+                                       album_ids, MAX_ALBUM_IDS_PER_CHECK)
 
     def get_saved_albums(self):
-        pass
+        return self._fetch_page(_shared_mod.SpotifyEndPoints.SAVED_ALBUMS.value, self._get_page_params())
 
-    def check_tracks(self, track_ids: List[str]):
-        pass
+    def iter_saved_albums(self) -> Iterator[dict]:
+        return self.iter_items(_shared_mod.SpotifyEndPoints.SAVED_ALBUMS.value, self._get_page_params(MAX_PAGE_SIZE))
+
+    def check_tracks(self, track_ids: Iterable[str]) -> Dict[str, bool]:
+        """Check if one or more tracks is already saved in the current Spotify user’s library"""
+        return self._check_saved_items(f'{_shared_mod.SpotifyEndPoints.SAVED_TRACKS.value}/contains',
+                                       track_ids, MAX_TRACK_IDS_PER_CHECK)
 
     def get_saved_tracks(self):
-        pass
+        return self._fetch_page(_shared_mod.SpotifyEndPoints.SAVED_TRACKS.value, self._get_page_params())
 
-    def check_saved_shows(self, show_ids: List[str]):
-        pass
+    def iter_saved_tracks(self) -> Iterator[dict]:
+        return self.iter_items(_shared_mod.SpotifyEndPoints.SAVED_TRACKS.value, self._get_page_params(MAX_PAGE_SIZE))
+
+    def check_saved_shows(self, show_ids: Iterable[str]) -> Dict[str, bool]:
+        """Check if one or more shows is already saved in the current Spotify user’s library"""
+        return self._check_saved_items(f'{_shared_mod.SpotifyEndPoints.SAVED_SHOWS.value}/contains',
+                                       show_ids, MAX_SHOW_IDS_PER_CHECK)
 
     def get_saved_shows(self):
-        pass
+        return self._fetch_page(_shared_mod.SpotifyEndPoints.SAVED_SHOWS.value, self._get_page_params())
+
+    def iter_saved_shows(self) -> Iterator[dict]:
+        return self.iter_items(_shared_mod.SpotifyEndPoints.SAVED_SHOWS.value, self._get_page_params(MAX_PAGE_SIZE))
 
     # endregion
 
@@ -213,12 +423,43 @@ class LibraryAPI(SpotifyAPIBase):
 
 
 class TracksAPI(SpotifyAPIBase):
-    def get_track(self):
-        pass
-
-    def get_audio_featues(self):
-        pass
-
-    def get_audio_anlysis(self):
-        pass
+    def __init__(self, user: _authorizer.UserContext = None):
+        super().__init__(user)
+        self.RequiredScopes = []
+
+    def _get_several(self, url: str, response_key: str, ids: List[str], batch_size: int) -> Dict[str, dict]:
+        batches = split_into_batches(ids, batch_size)
+        batch_results = self.map_concurrently(lambda batch: self._fetch_json(url, {'ids': ','.join(batch)}), batches)
+
+        found = {}
+        for batch, response in zip(batches, batch_results):
+            found.update(zip(batch, response[response_key]))
+        return found
+
+    def get_track(self, track_id: str):
+        return self._fetch_page(f'{_shared_mod.SpotifyEndPoints.TRACKS.value}/{track_id}')
+
+    def get_several_tracks(self, track_ids: Iterable[str]) -> Dict[str, dict]:
+        """Fetch any number of tracks in concurrent batches. Unknown ids map to None"""
+        return self._get_several(_shared_mod.SpotifyEndPoints.TRACKS.value, 'tracks',
+                                 dedupe_ids(track_ids), MAX_IDS_PER_TRACKS_REQUEST)
+
+    def get_audio_featues(self, track_id: str):
+        return self.get_several_audio_features([track_id]).get(track_id)
+
+    def get_several_audio_features(self, track_ids: Iterable[str]) -> Dict[str, dict]:
+        """Audio features for any number of tracks, in input order. Only ids missing from the local store are
+        requested from Spotify, and the results are added to the store. Unknown ids map to None"""
+        unique_ids = dedupe_ids(track_ids)
+        features = AudioFeaturesStore.get_many(unique_ids)
+        missing_ids = [track_id for track_id in unique_ids if track_id not in features]
+        if missing_ids:
+            fetched = self._get_several(_shared_mod.SpotifyEndPoints.AUDIO_FEATURES.value, 'audio_features',
+                                        missing_ids, MAX_IDS_PER_AUDIO_FEATURES_REQUEST)
+            AudioFeaturesStore.put_many(fetched.values())
+            features.update(fetched)
+        return {track_id: features.get(track_id) for track_id in unique_ids}
+
+    def get_audio_anlysis(self, track_id: str):
+        return self._fetch_page(f'{_shared_mod.SpotifyEndPoints.AUDIO_ANALYSIS.value}/{track_id}')
 # endregion
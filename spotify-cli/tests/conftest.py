@@ -0,0 +1,80 @@
+"""Shared fixtures. The spt modules are imported the way the package does it, from the spt folder on sys.path"""
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+SPT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SPT_ROOT / 'spt'))
+sys.path.insert(0, str(SPT_ROOT / 'tests'))
+
+from fake_spotify_server import (FakeServerSettings, FakeSpotifyServer, make_credentials,  # noqa: E402
+                                 write_credentials)
+
+REQUIRED_SETTINGS = {'SPT_CLIENT_ID': 'client-id', 'SPT_CLIENT_SECRET': 'client-secret',
+                     'SPT_REDIRECT_URI': 'http://127.0.0.1:8080/authcallback', 'SPT_HOST_IP': '127.0.0.1',
+                     'SPT_HOST_PORT': '8080'}
+
+
+@pytest.fixture
+def fake_server():
+    with FakeSpotifyServer(FakeServerSettings(total_items=30)) as server:
+        yield server
+
+
+@pytest.fixture
+def spt_settings(tmp_path, monkeypatch):
+    """Settings the spt modules need when used in the test process, with the app data in a temporary folder"""
+    for name, value in REQUIRED_SETTINGS.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path))
+    monkeypatch.delenv('SPT_PRODUCTION', raising=False)
+    monkeypatch.chdir(SPT_ROOT / 'spt')  # Like importing the spt package does, so config/sptconfig.ini is found
+    return tmp_path
+
+
+@pytest.fixture
+def signed_in(spt_settings, fake_server, monkeypatch):
+    """The default profile signed in with an in-memory token, API calls going to the fake server and responses
+    cached in a temporary folder. Returns the fake server"""
+    from _authorizer import TokenManager
+    from _credential_store import DEFAULT_PROFILE, MemoryCredentialStore
+    from _response_cache import ResponseCache
+
+    monkeypatch.delenv('SPT_PROFILE', raising=False)
+    monkeypatch.setenv('SPT_API_BASE_URL', fake_server.base_url)
+    monkeypatch.setenv('SPT_ACCOUNTS_BASE_URL', fake_server.base_url)
+    cache_dir = spt_settings / 'cache'
+    cache_dir.mkdir()
+    monkeypatch.setattr(ResponseCache, '_ResponseCache__cache_dir', str(cache_dir))
+    monkeypatch.setitem(TokenManager._TokenManager__stores, DEFAULT_PROFILE, MemoryCredentialStore(make_credentials()))
+    TokenManager.reset()
+    yield fake_server
+    TokenManager.reset()
+
+
+@pytest.fixture
+def spt_env(tmp_path, fake_server):
+    """Environment for running spt against the fake server, signed in, with its app data in a temporary folder"""
+    home = tmp_path / 'home'
+    home.mkdir()
+    environment = dict(os.environ)
+    environment.update(REQUIRED_SETTINGS)
+    environment.update({
+        'HOME': str(home), 'LOCALAPPDATA': str(home),
+        'SPT_SECURITY_STORE': str(write_credentials(home / 'credentials.json')),
+        'SPT_API_BASE_URL': fake_server.base_url, 'SPT_ACCOUNTS_BASE_URL': fake_server.base_url,
+        'SPT_NO_DAEMON': '1', 'PYTHONPATH': str(SPT_ROOT),
+    })
+    environment.pop('SPT_PRODUCTION', None)
+    environment.pop('SPT_ENV_PATH', None)
+    return environment
+
+
+def run_spt(arguments, cwd, env, stdin=None) -> subprocess.CompletedProcess:
+    """Run `python -m spt` the way the launcher does"""
+    return subprocess.run([sys.executable, '-m', 'spt', *arguments], cwd=str(cwd), env=env, input=stdin,
+                          capture_output=True, text=True, timeout=60)
@@ -0,0 +1,283 @@
+"""Local stand-in for the Spotify Web API and token endpoint, for benchmarks and offline testing.
+
+Only depends on the standard library, and is not part of the spt package. Point the CLI at it with SPT_API_BASE_URL
+and SPT_ACCOUNTS_BASE_URL:
+
+    python tests/fake_spotify_server.py --port 8765 --latency-ms 20 --total-items 5000
+    SPT_API_BASE_URL=http://127.0.0.1:8765 SPT_ACCOUNTS_BASE_URL=http://127.0.0.1:8765 spt personalise GetTopTracks
+"""
+
+__all__ = ['FakeSpotifyServer', 'FakeServerSettings', 'make_credentials', 'write_credentials']
+
+import argparse
+import hashlib
+import json
+import pathlib
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGED_ENDPOINTS = {
+    '/v1/me/top/tracks': 'top_track',
+    '/v1/me/top/artists': 'top_artist',
+    '/v1/me/tracks': 'track',
+    '/v1/me/albums': 'album',
+    '/v1/me/shows': 'show',
+}
+LATEST_ADDED_AT = datetime(2020, 1, 1)
+FAKE_SCOPES = 'user-read-private user-read-email user-top-read user-library-read'
+
+
+def make_credentials(access_token: str = 'fake-access-token', refresh_token: str = 'fake-refresh-token') -> dict:
+    """A token that spt accepts as signed in for the next hour, with the scopes the fake server serves"""
+    return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'Bearer',
+            'expires_in': 3600, 'scope': FAKE_SCOPES, 'last_refreshed': datetime.now().strftime('%Y%m%d_%H:%M:%S')}
+
+
+def write_credentials(path, access_token: str = 'fake-access-token', refresh_token: str = 'fake-refresh-token'):
+    """Write a credentials file for SPT_SECURITY_STORE, so spt can run without logging in"""
+    pathlib.Path(path).write_text(json.dumps(make_credentials(access_token, refresh_token)))
+    return path
+
+
+@dataclass
+class FakeServerSettings:
+    latency_ms: float = 0.0  # Added to every response
+    total_items: int = 200  # Size of every paged collection
+    payload_padding: int = 0  # Extra bytes added to each item, to simulate large objects
+    rate_limit_every: int = 0  # Answer every Nth request with a 429. 0 disables
+    retry_after: float = 1.0  # Retry-After value sent with injected 429s, in seconds
+    server_error_every: int = 0  # Answer every Nth request with a 503. 0 disables
+
+
+@dataclass
+class FakeServerStats:
+    connections: int = 0
+    requests: int = 0
+    rate_limited: int = 0
+    server_errors: int = 0
+    not_modified: int = 0
+
+
+# region Payload builders
+
+def _build_item(kind: str, index: int, padding: int) -> dict:
+    artist = {'id': f'artist{index % 97}', 'name': f'Artist {index % 97}', 'type': 'artist'}
+    album = {'id': f'album{index % 211}', 'name': f'Album {index % 211}', 'artists': [artist], 'type': 'album'}
+    track = {'id': f'track{index}', 'name': f'Track {index}', 'album': album, 'artists': [artist],
+             'duration_ms': 180000 + index, 'popularity': index % 100, 'type': 'track'}
+    if padding:
+        track['padding'] = 'x' * padding
+
+    if kind == 'top_track':
+        return track
+    if kind == 'top_artist':
+        return dict(artist, id=f'artist{index}', name=f'Artist {index}', padding='x' * padding)
+
+    added_at = (LATEST_ADDED_AT - timedelta(minutes=index)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    if kind == 'track':
+        return {'added_at': added_at, 'track': track}
+    if kind == 'album':
+        return {'added_at': added_at, 'album': dict(album, id=f'album{index}', padding='x' * padding)}
+    return {'added_at': added_at, 'show': {'id': f'show{index}', 'name': f'Show {index}', 'padding': 'x' * padding}}
+
+
+def _build_page(base_url: str, path: str, kind: str, query: dict, settings: FakeServerSettings) -> dict:
+    limit = min(int(query.get('limit', ['20'])[0]), 50)
+    offset = int(query.get('offset', ['0'])[0])
+    end = min(offset + limit, settings.total_items)
+    next_url = f'{base_url}{path}?limit={limit}&offset={end}' if end < settings.total_items else None
+    return {
+        'href': f'{base_url}{path}?limit={limit}&offset={offset}',
+        'items': [_build_item(kind, index, settings.payload_padding) for index in range(offset, end)],
+        'limit': limit,
+        'offset': offset,
+        'next': next_url,
+        'previous': None,
+        'total': settings.total_items
+    }
+
+
+def _index_of(item_id: str) -> int:
+    digits = ''.join(char for char in item_id if char.isdigit())
+    return int(digits) if digits else 0
+
+
+# endregion
+
+
+class _FakeSpotifyRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+    disable_nagle_algorithm = True  # Headers and body are written separately; avoid delayed-ACK stalls
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fake(self) -> 'FakeSpotifyServer':
+        return self.server.fake
+
+    def handle(self):
+        self.fake.count('connections')  # Called once per connection, which may carry several requests
+        super().handle()
+
+    def _send_json(self, payload, status=HTTPStatus.OK):
+        body = json.dumps(payload).encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if status == HTTPStatus.OK and self.headers.get('If-None-Match') == etag:
+            self.fake.count('not_modified')
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'private, max-age=0')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_rate_limited(self):
+        self.fake.count('rate_limited')
+        body = b'{"error": {"status": 429, "message": "API rate limit exceeded"}}'
+        self.send_response(HTTPStatus.TOO_MANY_REQUESTS)
+        self.send_header('Retry-After', str(self.fake.settings.retry_after))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_server_error(self):
+        self.fake.count('server_errors')
+        body = b'{"error": {"status": 503, "message": "Service unavailable"}}'
+        self.send_response(HTTPStatus.SERVICE_UNAVAILABLE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _before_response(self) -> bool:
+        """Apply latency, 429 and 503 injection. Returns False when the request was answered with an error"""
+        request_number = self.fake.count('requests')
+        settings = self.fake.settings
+        if settings.latency_ms:
+            time.sleep(settings.latency_ms / 1000)
+        if settings.rate_limit_every and request_number % settings.rate_limit_every == 0:
+            self._send_rate_limited()
+            return False
+        if settings.server_error_every and request_number % settings.server_error_every == 0:
+            self._send_server_error()
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._before_response():
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip('/')
+        ids = query.get('ids', [''])[0].split(',') if 'ids' in query else []
+        if path == '/v1/me':
+            return self._send_json({'id': 'fakeuser', 'display_name': 'Fake User', 'email': 'fake@example.com',
+                                    'country': 'ZA', 'product': 'premium', 'type': 'user'})
+        if path in PAGED_ENDPOINTS:
+            return self._send_json(_build_page(self.fake.base_url, path, PAGED_ENDPOINTS[path], query,
+                                               self.fake.settings))
+        if path.endswith('/contains') and path.rsplit('/', 1)[0] in PAGED_ENDPOINTS:
+            return self._send_json([_index_of(item_id) < self.fake.settings.total_items for item_id in ids])
+        if path == '/v1/tracks':
+            return self._send_json({'tracks': [_build_item('top_track', _index_of(item_id), 0) for item_id in ids]})
+        if path == '/v1/audio-features':
+            return self._send_json({'audio_features': [{'id': item_id, 'danceability': 0.5, 'energy': 0.5,
+                                                        'tempo': 120.0} for item_id in ids]})
+        if path.startswith('/v1/tracks/'):
+            return self._send_json(_build_item('top_track', _index_of(path.rsplit('/', 1)[1]), 0))
+        self._send_json({'error': {'status': 404, 'message': 'Service not found'}}, status=HTTPStatus.NOT_FOUND)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self._before_response():
+            return
+
+        if urlparse(self.path).path.rstrip('/') != '/api/token':
+            return self._send_json({'error': 'not_found'}, status=HTTPStatus.NOT_FOUND)
+        self._send_json({'access_token': 'fake-access-token',
+                         'token_type': 'Bearer',
+                         'scope': FAKE_SCOPES,
+                         'expires_in': 3600,
+                         'refresh_token': 'fake-refresh-token'})
+
+
+class FakeSpotifyServer:
+    def __init__(self, settings: FakeServerSettings = None, host: str = '127.0.0.1', port: int = 0):
+        self.settings = settings or FakeServerSettings()
+        self.stats = FakeServerStats()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _FakeSpotifyRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, counter: str) -> int:
+        with self._lock:
+            value = getattr(self.stats, counter) + 1
+            setattr(self.stats, counter, value)
+            return value
+
+    def start(self) -> str:
+        """Serve on a background thread and return the base URL"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-spotify-server', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Spotify Web API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, dest='latency_ms')
+    parser.add_argument('--total-items', type=int, default=200, dest='total_items')
+    parser.add_argument('--payload-padding', type=int, default=0, dest='payload_padding')
+    parser.add_argument('--rate-limit-every', type=int, default=0, dest='rate_limit_every')
+    parser.add_argument('--retry-after', type=float, default=1.0, dest='retry_after')
+    parser.add_argument('--server-error-every', type=int, default=0, dest='server_error_every')
+    args = parser.parse_args()
+
+    settings = FakeServerSettings(latency_ms=args.latency_ms, total_items=args.total_items,
+                                  payload_padding=args.payload_padding, rate_limit_every=args.rate_limit_every,
+                                  retry_after=args.retry_after, server_error_every=args.server_error_every)
+    server = FakeSpotifyServer(settings, host=args.host, port=args.port)
+    print(f'Fake Spotify API listening on {server.base_url}. {settings}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import _shared_mod
+from _async_web_api import AsyncPersonalisationAPI, AsyncRequestEngine, AsyncTracksAPI, AsyncUserProfileAPI
+
+
+@pytest.fixture
+def engine():
+    engine = AsyncRequestEngine(max_concurrency=2)
+    yield engine
+    engine.close()
+
+
+def test_engine_keeps_at_most_max_concurrency_calls_in_flight(engine):
+    lock, in_flight, peak = threading.Lock(), [0], [0]
+
+    def blocking_call(value):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return value * 2
+
+    async def run_all():
+        return await asyncio.gather(*(engine.run(blocking_call, value) for value in range(8)))
+
+    assert asyncio.run(run_all()) == [value * 2 for value in range(8)]
+    assert peak[0] == 2
+
+
+def test_tracks_are_fetched_concurrently_in_input_order(signed_in, engine):
+    signed_in.settings.latency_ms = 200
+    track_ids = ['track7', 'track3', 'track5', 'track1']
+
+    started = time.monotonic()
+    tracks = asyncio.run(AsyncTracksAPI(engine=engine).get_tracks(track_ids))
+
+    assert [track['id'] for track in tracks] == track_ids
+    assert 0.4 <= time.monotonic() - started < 0.8  # Two at a time: two rounds, not one or four
+    assert signed_in.stats.requests == 4
+
+
+def test_iter_items_yields_every_page(signed_in, engine):
+    signed_in.settings.total_items = 120
+    params = _shared_mod.PersonlisationParams()
+    params.entity_type, params.time_range = 'tracks', 'short_term'
+
+    async def collect():
+        api = AsyncPersonalisationAPI(params, engine=engine)
+        return [item['id'] async for item in api.iter_top_tracks_and_artists()]
+
+    assert asyncio.run(collect()) == [f'track{index}' for index in range(120)]
+
+
+def test_errors_reach_the_awaiting_caller(signed_in, engine):
+    with pytest.raises(_shared_mod.SpotifyAPICallError):
+        asyncio.run(AsyncUserProfileAPI(engine=engine).get_public_users_profile('nobody'))
+
+    async def failing_call():
+        return await engine.run(lambda: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(failing_call())
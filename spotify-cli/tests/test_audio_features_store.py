@@ -0,0 +1,53 @@
+import pytest
+
+from _audio_features_store import AudioFeaturesStore
+from _spotify_web_api import TracksAPI
+
+
+@pytest.fixture
+def features_store(signed_in):
+    AudioFeaturesStore.close()  # Reopened under the temporary app data folder
+    yield AudioFeaturesStore
+    AudioFeaturesStore.close()
+
+
+@pytest.fixture
+def requested_ids(monkeypatch):
+    requested = []
+    fetch_json = TracksAPI._fetch_json
+
+    def recording_fetch_json(self, url, url_params=None):
+        requested.extend(url_params['ids'].split(','))
+        return fetch_json(self, url, url_params)
+
+    monkeypatch.setattr(TracksAPI, '_fetch_json', recording_fetch_json)
+    return requested
+
+
+def test_only_ids_missing_from_the_store_are_requested(features_store, requested_ids):
+    TracksAPI().get_several_audio_features([f'track{index}' for index in range(150)])
+    assert len(requested_ids) == 150
+    requested_ids.clear()
+
+    features = TracksAPI().get_several_audio_features([f'track{index}' for index in range(100, 200)])
+
+    assert requested_ids == [f'track{index}' for index in range(150, 200)]
+    assert list(features) == [f'track{index}' for index in range(100, 200)]
+    assert all(features[track_id]['id'] == track_id for track_id in features)
+
+
+def test_repeated_ids_are_requested_once(features_store, requested_ids):
+    features = TracksAPI().get_several_audio_features(['track2', 'track1', 'track2', '', 'track1'])
+
+    assert list(features) == ['track2', 'track1']
+    assert requested_ids == ['track2', 'track1']
+
+
+def test_stored_features_outlive_the_process_connection(features_store, requested_ids):
+    TracksAPI().get_audio_featues('track7')
+    AudioFeaturesStore.close()
+
+    assert AudioFeaturesStore.get_many(['track7', 'track8']) == {'track7': {'id': 'track7', 'danceability': 0.5,
+                                                                            'energy': 0.5, 'tempo': 120.0}}
+    assert TracksAPI().get_audio_featues('track7')['id'] == 'track7'
+    assert requested_ids == ['track7']
@@ -0,0 +1,19 @@
+import pytest
+
+import _authorizer
+import _shared_mod
+from _authorizer import AuthorizerService
+
+
+@pytest.fixture
+def login_request(spt_settings, monkeypatch):
+    """A login in progress, with the token exchange failing the test if it is reached"""
+    monkeypatch.setattr(AuthorizerService, '_AuthorizerService__state_key', 'expected-state')
+    monkeypatch.setattr(_authorizer.HttpSessionManager, 'get_session',
+                        lambda *args, **kwargs: pytest.fail('The authorization code was exchanged'))
+
+
+@pytest.mark.parametrize('state', [None, '', 'other-state'])
+def test_callback_without_the_login_state_is_rejected(login_request, state):
+    with pytest.raises(_shared_mod.SpotifyAuthenticationError):
+        AuthorizerService.on_auth_code_received('code', state)
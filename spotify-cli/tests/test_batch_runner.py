@@ -0,0 +1,44 @@
+import json
+
+from _batch_runner import parse_batch_commands
+from conftest import run_spt
+
+
+def test_parse_batch_commands_skips_comments_and_leading_spt():
+    commands = parse_batch_commands('# nightly\n\nspt personalise GetTopTracks --limit 2\nlibrary sync  # mirror\n')
+    assert [command.argv for command in commands] == [['personalise', 'GetTopTracks', '--limit', '2'],
+                                                      ['library', 'sync']]
+    assert [command.index for command in commands] == [0, 1]
+
+
+def test_parse_batch_commands_reads_json_lists():
+    commands = parse_batch_commands('["personalise GetTopArtists", ["library", "GetSavedAlbums", "--all"]]')
+    assert [command.argv for command in commands] == [['personalise', 'GetTopArtists'],
+                                                      ['library', 'GetSavedAlbums', '--all']]
+
+
+def test_batch_resolves_relative_paths_against_the_callers_directory(tmp_path, spt_env):
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+    (work_dir / 'b.txt').write_text('personalise GetTopTracks --limit 2 --fields items.name\n'
+                                    'personalise GetTopArtists --limit 1 --out artists.json\n')
+
+    completed = run_spt(['batch', 'b.txt', '--output-dir', 'out', '--format', 'ndjson'], work_dir, spt_env)
+
+    assert completed.returncode == 0, completed.stderr
+    records = sorted((json.loads(line) for line in completed.stdout.splitlines()), key=lambda record: record['index'])
+    assert [record['exit_code'] for record in records] == [0, 0]
+    assert records[0]['output_file'] == str(work_dir / 'out' / '0000_personalise_GetTopTracks.json')
+    assert json.loads((work_dir / 'out' / '0000_personalise_GetTopTracks.json').read_text()) == \
+        {'items': [{'name': 'Track 0'}, {'name': 'Track 1'}]}
+    assert (work_dir / 'artists.json').exists()  # --out inside the batch is relative to the caller too
+
+
+def test_batch_reads_commands_from_stdin(tmp_path, spt_env):
+    completed = run_spt(['batch', '-'], tmp_path, spt_env,
+                        stdin='personalise GetTopTracks --limit 1 --fields items.name\npersonalise Bogus\n')
+
+    assert completed.returncode == 1  # One command failed
+    records = sorted(json.loads(completed.stdout), key=lambda record: record['index'])
+    assert records[0]['result'] == {'items': [{'name': 'Track 0'}]}
+    assert records[1]['exit_code'] == 2
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import _shared_mod
+from _command_dispatcher import CommandDispatcher
+from conftest import SPT_ROOT
+
+
+@pytest.mark.parametrize('command', ['help', '-h', '--help'])
+def test_invoke_help_returns_the_usage(spt_settings, command):
+    result = CommandDispatcher().invoke([command])
+
+    assert result.succeeded
+    assert result.error is None
+    assert 'usage:' in result.output
+
+
+def test_run_help_prints_the_usage(spt_settings, capsys):
+    assert CommandDispatcher().run(['help']) == 0
+    assert 'usage:' in capsys.readouterr().out
+
+
+def test_invoke_unknown_command_is_a_usage_error(spt_settings):
+    result = CommandDispatcher().invoke(['nonsense'])
+
+    assert result.exit_code == 2
+    assert not result.succeeded
+
+
+def test_invoke_returns_the_results(signed_in, tmp_path):
+    result = CommandDispatcher().invoke(['personalise', 'GetTopTracks', '--limit', 2, '--fields', 'items.name'],
+                                        working_dir=str(tmp_path))
+
+    assert result.succeeded, result.error
+    assert result.argv == ['personalise', 'GetTopTracks', '--limit', '2', '--fields', 'items.name']
+    assert result.results == {'items': [{'name': 'Track 0'}, {'name': 'Track 1'}]}
+    assert result.output == ''  # Nothing printed
+
+
+def test_invoke_resolves_paths_against_the_working_dir(signed_in, tmp_path):
+    result = CommandDispatcher().invoke(['personalise', 'GetTopArtists', '--limit', '1', '--out', 'artists.json'],
+                                        working_dir=str(tmp_path))
+
+    assert result.succeeded, result.error
+    assert (tmp_path / 'artists.json').exists()
+
+
+def test_invoke_argparse_errors_are_usage_errors(spt_settings):
+    result = CommandDispatcher().invoke(['personalise', 'Bogus'])
+
+    assert result.exit_code == 2
+    assert isinstance(result.error, _shared_mod.InvalidUsageError)
+    assert 'invalid choice' in result.output
+
+
+def test_invoke_calls_can_run_concurrently(signed_in):
+    dispatcher = CommandDispatcher()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda limit: dispatcher.invoke(['personalise', 'GetTopTracks', '--limit', limit,
+                                                                 '--fields', 'items.name']), range(1, 5)))
+
+    assert [len(result.results['items']) for result in results] == [1, 2, 3, 4]
+
+
+def test_invoke_async(signed_in):
+    result = asyncio.run(CommandDispatcher().invoke_async(['personalise', 'GetTopTracks', '--limit', '1',
+                                                           '--fields', 'items.name']))
+
+    assert result.results == {'items': [{'name': 'Track 0'}]}
+
+
+def test_handlers_are_only_imported_to_run_a_command(spt_env):
+    script = ('import json, sys\n'
+              'from _command_dispatcher import CommandDispatcher\n'
+              'dispatcher = CommandDispatcher()\n'
+              'dispatcher.invoke(["help"])\n'
+              'dispatcher.invoke(["personalise", "--help"])\n'
+              'dispatcher.invoke(["nonsense"])\n'
+              'dispatcher.invoke(["personalise", "Bogus"])\n'
+              'loaded = [name in sys.modules for name in ("_command_handlers", "requests")]\n'
+              'dispatcher.invoke(["personalise", "GetTopTracks", "--limit", "1"])\n'
+              'print(json.dumps(loaded + ["_command_handlers" in sys.modules]))\n')
+    completed = subprocess.run([sys.executable, '-c', script], cwd=str(SPT_ROOT / 'spt'), env=spt_env,
+                               capture_output=True, text=True, timeout=60)
+
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout) == [False, False, True]
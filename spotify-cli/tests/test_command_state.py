@@ -0,0 +1,63 @@
+"""Per-command state must stay with its command when several run side by side in one process"""
+import argparse
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import _command_handlers
+import _shared_mod
+from _request_metrics import RequestMetrics, RequestTiming
+from _response_cache import ResponseCache
+
+
+def _run_in_threads(*funcs):
+    with ThreadPoolExecutor(max_workers=len(funcs)) as pool:
+        pending = [pool.submit(contextvars.copy_context().run, func) for func in funcs]
+        return [future.result() for future in pending]
+
+
+def test_response_cache_flags_are_per_command():
+    both_configured = threading.Barrier(2)
+
+    def command(enabled, refresh):
+        ResponseCache.configure(enabled=enabled, refresh=refresh)
+        both_configured.wait(timeout=5)
+        return ResponseCache.get_command_settings()
+
+    assert _run_in_threads(lambda: command(False, False), lambda: command(True, True)) == [(False, False),
+                                                                                           (True, True)]
+    assert ResponseCache.get_command_settings() == (True, False)  # The caller's context is untouched
+
+
+def test_request_metrics_are_collected_per_command():
+    both_recorded = threading.Barrier(2)
+
+    def command(endpoint):
+        with RequestMetrics.collect():
+            RequestMetrics.record(RequestTiming(endpoint=endpoint, total_s=0.01))
+            both_recorded.wait(timeout=5)
+            return set(RequestMetrics.to_dict())
+
+    with RequestMetrics.collect():
+        assert _run_in_threads(lambda: command('/v1/me/tracks'), lambda: command('/v1/me/albums')) == \
+            [{'/v1/me/tracks'}, {'/v1/me/albums'}]
+        assert set(RequestMetrics.to_dict()) == {'/v1/me/tracks', '/v1/me/albums'}  # E.g. the batch itself
+
+
+class _MissingScopesHandler(_command_handlers.CommandHandler):
+    def handle(self):
+        raise _shared_mod.MissingScopesError(['user-library-read'])
+
+
+def test_non_interactive_commands_do_not_prompt(monkeypatch):
+    def fail_on_prompt(*_):
+        raise AssertionError('A non-interactive command asked a question')
+
+    monkeypatch.setattr('builtins.input', fail_on_prompt)
+    handler = _MissingScopesHandler(argparse.Namespace(no_stdout=True, output_file=None,
+                                                       output_format=_shared_mod.SptOutputFormats.Json.value))
+    handler.interactive = False
+    handler.execute()
+
+    assert handler.exit_code == 1
+    assert isinstance(handler.error, _shared_mod.MissingScopesError)
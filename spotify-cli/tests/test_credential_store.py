@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import _shared_mod
+from _credential_store import (FileCredentialStore, MemoryCredentialStore, SQLiteCredentialStore,
+                               create_credential_store)
+from fake_spotify_server import make_credentials
+
+
+@pytest.fixture(params=['file', 'sqlite', 'memory'])
+def store(request, tmp_path):
+    location = str(tmp_path / ('credentials.json' if request.param == 'file' else 'credentials.db'))
+    return create_credential_store(request.param, location)
+
+
+def test_store_round_trip(store):
+    credentials = make_credentials()
+    assert store.load() is None
+
+    store.save(credentials)
+    assert store.load() == credentials
+
+    store.clear()
+    assert store.load() is None
+
+
+def test_store_lock_can_be_taken_again_after_release(store):
+    with store.lock():
+        store.save(make_credentials())
+    with store.lock():
+        assert store.load() is not None
+
+
+@pytest.mark.parametrize('store_type, expected_class', [('file', FileCredentialStore),
+                                                        ('SQLite', SQLiteCredentialStore),
+                                                        ('memory', MemoryCredentialStore)])
+def test_store_type_comes_from_the_environment(store_type, expected_class, tmp_path, monkeypatch):
+    monkeypatch.setenv('SPT_CREDENTIAL_STORE', store_type)
+    monkeypatch.setenv('SPT_SECURITY_STORE', str(tmp_path / 'credentials'))
+
+    assert isinstance(create_credential_store(), expected_class)
+
+
+def test_file_store_is_the_default(tmp_path, monkeypatch):
+    monkeypatch.delenv('SPT_CREDENTIAL_STORE', raising=False)
+    monkeypatch.setenv('SPT_SECURITY_STORE', str(tmp_path / 'credentials.json'))
+
+    store = create_credential_store()
+
+    assert isinstance(store, FileCredentialStore)
+    assert store.location == str(tmp_path / 'credentials.json')
+
+
+def test_unknown_store_type_is_rejected():
+    with pytest.raises(_shared_mod.InvalidOperationError):
+        create_credential_store('keyring')
+
+
+def test_file_profiles_use_sibling_files(tmp_path):
+    location = str(tmp_path / '.credentials.json')
+
+    assert create_credential_store('file', location).location == location
+    assert create_credential_store('file', location, profile='bob/work').location == \
+        str(tmp_path / '.credentials.bob_work.json')
+
+
+def test_sqlite_profiles_share_one_database(tmp_path):
+    location = str(tmp_path / 'credentials.db')
+    default_store = create_credential_store('sqlite', location)
+    other_store = create_credential_store('sqlite', location, profile='bob')
+
+    default_store.save(make_credentials('default-token'))
+    other_store.save(make_credentials('bob-token'))
+    default_store.clear()
+
+    assert default_store.load() is None
+    assert other_store.load()['access_token'] == 'bob-token'
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='POSIX permissions')
+def test_file_store_saves_in_process_readable_by_the_owner_only(tmp_path, monkeypatch):
+    def no_subprocess(*args, **kwargs):
+        pytest.fail('A process was started to save the token')
+
+    monkeypatch.setattr(subprocess, 'Popen', no_subprocess)
+    monkeypatch.setattr(os, 'system', no_subprocess)
+    store = create_credential_store('file', str(tmp_path / 'credentials.json'))
+
+    store.save(make_credentials())
+    store.save(make_credentials('replaced-token'))
+
+    assert os.stat(store.location).st_mode & 0o777 == 0o600
+    assert store.load()['access_token'] == 'replaced-token'
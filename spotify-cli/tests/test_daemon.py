@@ -0,0 +1,103 @@
+import json
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from conftest import run_spt
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='The daemon needs Unix domain sockets')
+
+
+def _send(socket_path, request):
+    """Speak the daemon protocol like the launcher does. Returns the stdout, the stderr and the exit code"""
+    stdout, stderr = [], []
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(30)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with client.makefile('rb') as replies:
+            for line in replies:
+                message = json.loads(line)
+                stdout.append(message.get('stdout', ''))
+                stderr.append(message.get('stderr', ''))
+                if 'exit_code' in message:
+                    return ''.join(stdout), ''.join(stderr), message['exit_code']
+    pytest.fail(f'The daemon closed the connection without an exit code. {stderr}')
+
+
+def _wait_until_listening(socket_path, process, log_path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert process.poll() is None, log_path.read_text()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+            return
+        except OSError:
+            time.sleep(0.1)
+    pytest.fail('The daemon did not start listening')
+
+
+@pytest.fixture
+def socket_path():
+    with tempfile.TemporaryDirectory(prefix='spt-daemon-') as socket_dir:  # Socket paths are limited to ~100 bytes
+        yield f'{socket_dir}/daemon.sock'
+
+
+@pytest.fixture
+def spt_daemon(tmp_path, spt_env, socket_path):
+    log_path = tmp_path / 'daemon.log'
+    with open(log_path, 'w') as log_file:
+        process = subprocess.Popen([sys.executable, '-m', 'spt', 'daemon', '--socket', socket_path],
+                                   cwd=str(tmp_path), env=spt_env, stdout=log_file, stderr=subprocess.STDOUT)
+        try:
+            _wait_until_listening(socket_path, process, log_path)
+            yield process
+        finally:
+            if process.poll() is None:
+                process.terminate()
+            process.wait(timeout=30)
+
+
+def test_daemon_runs_commands_in_the_callers_directory(spt_daemon, socket_path, tmp_path):
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+
+    _, stderr, exit_code = _send(socket_path, {'argv': ['personalise', 'GetTopArtists', '--limit', '2', '--fields',
+                                                        'items.name', '--out', 'artists.json'],
+                                               'cwd': str(work_dir)})
+
+    assert exit_code == 0, stderr
+    assert json.loads((work_dir / 'artists.json').read_text()) == {'items': [{'name': 'Artist 0'},
+                                                                             {'name': 'Artist 1'}]}
+
+
+def test_daemon_keeps_the_connection_pool_warm(spt_daemon, socket_path, tmp_path, fake_server):
+    for limit in range(1, 4):
+        _, stderr, exit_code = _send(socket_path, {'argv': ['personalise', 'GetTopTracks', '--limit', str(limit)],
+                                                   'cwd': str(tmp_path)})
+        assert exit_code == 0, stderr
+
+    assert fake_server.stats.requests == 3
+    assert fake_server.stats.connections == 1
+
+
+def test_daemon_reports_usage_errors(spt_daemon, socket_path, tmp_path):
+    _, stderr, exit_code = _send(socket_path, {'argv': ['personalise', 'Bogus'], 'cwd': str(tmp_path)})
+
+    assert exit_code == 2
+    assert 'invalid choice' in stderr
+    assert spt_daemon.poll() is None  # Still serving
+
+
+def test_daemon_stop(spt_daemon, socket_path, tmp_path, spt_env):
+    completed = run_spt(['daemon', '--socket', socket_path, '--stop'], tmp_path, spt_env)
+
+    assert completed.returncode == 0, completed.stderr
+    assert spt_daemon.wait(timeout=30) == 0
+    assert not pathlib.Path(socket_path).exists()
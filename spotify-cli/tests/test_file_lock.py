@@ -0,0 +1,72 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import _shared_mod
+from _file_lock import FileLock, atomic_write
+from conftest import SPT_ROOT
+
+HOLD_LOCK_SCRIPT = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+from _file_lock import FileLock
+with FileLock(sys.argv[2]):
+    print('locked', flush=True)
+    sys.stdin.readline()
+'''
+
+
+def test_lock_is_exclusive_until_released(tmp_path):
+    lock_path = str(tmp_path / 'store.lock')
+    with FileLock(lock_path):
+        with pytest.raises(_shared_mod.FileLockTimeoutError):
+            FileLock(lock_path, timeout=0.2).acquire()
+
+    with FileLock(lock_path, timeout=0.2):
+        pass
+
+
+def test_waiting_lock_is_acquired_when_released(tmp_path):
+    lock_path = str(tmp_path / 'store.lock')
+    holder = FileLock(lock_path).acquire()
+    threading.Timer(0.2, holder.release).start()
+
+    with FileLock(lock_path, timeout=5):
+        assert holder._lock_file is None
+
+
+def test_lock_is_exclusive_across_processes(tmp_path):
+    lock_path = str(tmp_path / 'store.lock')
+    spt_path = str(SPT_ROOT / 'spt')
+    holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK_SCRIPT, spt_path, lock_path], stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        with pytest.raises(_shared_mod.FileLockTimeoutError):
+            FileLock(lock_path, timeout=0.2).acquire()
+    finally:
+        holder.communicate('\n', timeout=10)
+
+    with FileLock(lock_path, timeout=5):
+        pass
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = tmp_path / 'credentials.json'
+    path.write_text('old')
+
+    assert atomic_write(str(path), 'new') == str(path)
+    assert path.read_text() == 'new'
+    assert [entry.name for entry in tmp_path.iterdir()] == ['credentials.json']
+
+
+def test_failed_atomic_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / 'credentials.json'
+    path.write_text('old')
+
+    with pytest.raises(TypeError):
+        atomic_write(str(path), b'not text')
+    assert path.read_text() == 'old'
+    assert [entry.name for entry in tmp_path.iterdir()] == ['credentials.json']
@@ -0,0 +1,67 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import _shared_mod
+from _http_session import HttpSessionManager, HttpSettings
+from _request_scheduler import RequestScheduler
+from _spotify_web_api import GetRequestExecutor
+
+
+@pytest.fixture
+def fresh_session(monkeypatch):
+    monkeypatch.setattr(HttpSessionManager, '_HttpSessionManager__settings', None)
+    HttpSessionManager.close()
+    yield HttpSessionManager
+    HttpSessionManager.close()
+
+
+def _get_profile():
+    return GetRequestExecutor(_shared_mod.SpotifyEndPoints.CURRENT_USER.value, [], use_cache=False,
+                              coalesce=False).execute()
+
+
+def test_one_session_is_shared_by_every_thread(spt_settings, fresh_session):
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        sessions = set(pool.map(lambda _: id(HttpSessionManager.get_session()), range(8)))
+
+    assert sessions == {id(HttpSessionManager.get_session())}
+
+
+def test_requests_reuse_a_keep_alive_connection(signed_in, fresh_session):
+    for _ in range(5):
+        assert _get_profile().status_code == 200
+
+    assert signed_in.stats.requests == 5
+    assert signed_in.stats.connections == 1
+
+
+def test_concurrent_requests_are_pooled(signed_in, fresh_session):
+    HttpSessionManager.configure(HttpSettings(pool_maxsize=4))
+    signed_in.settings.latency_ms = 50
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for _ in range(3):
+            list(pool.map(lambda _: contextvars.copy_context().run(_get_profile), range(4)))
+
+    assert signed_in.stats.requests == 12
+    assert signed_in.stats.connections <= 4
+
+
+def test_read_timeout_comes_from_the_settings(signed_in, fresh_session, monkeypatch):
+    monkeypatch.setattr(RequestScheduler, '_get_backoff_delay', staticmethod(lambda attempt: 0.0))
+    HttpSessionManager.configure(HttpSettings(read_timeout=0.1))
+    signed_in.settings.latency_ms = 1000
+
+    started = time.monotonic()
+    with pytest.raises(_shared_mod.SpotifyAPICallError):
+        _get_profile()
+    assert time.monotonic() - started < 1  # Every attempt gave up after 0.1 s
+
+
+def test_settings_are_read_from_the_configuration(spt_settings):
+    settings = HttpSettings.from_configuration()
+
+    assert settings.timeout == (5.0, 30.0)
+    assert (settings.pool_connections, settings.pool_maxsize, settings.max_concurrency) == (4, 16, 16)
@@ -0,0 +1,14 @@
+import json
+
+from conftest import run_spt
+
+
+def test_shell_resolves_relative_paths_against_the_callers_directory(tmp_path, spt_env):
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+
+    completed = run_spt(['shell'], work_dir, spt_env,
+                        stdin='personalise GetTopArtists --limit 1 --fields items.name --out artists.json\nexit\n')
+
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads((work_dir / 'artists.json').read_text()) == {'items': [{'name': 'Artist 0'}]}
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import _json_backend
+from _json_backend import FieldProjection
+
+DOCUMENT = {'items': [{'name': 'a', 'id': 1, 'album': {'id': 'x', 'name': 'X'}},
+                      {'name': 'b', 'id': 2, 'album': {'id': 'y', 'name': 'Y'}}],
+            'total': 2, 'next': None}
+
+
+@pytest.mark.parametrize('fields, expected', [
+    ('items.name,total', {'items': [{'name': 'a'}, {'name': 'b'}], 'total': 2}),
+    ('items.album.id', {'items': [{'album': {'id': 'x'}}, {'album': {'id': 'y'}}]}),
+    ('items.album', {'items': [{'album': {'id': 'x', 'name': 'X'}}, {'album': {'id': 'y', 'name': 'Y'}}]}),
+    (' total , missing.path,', {'total': 2}),
+])
+def test_projection_keeps_the_requested_paths(fields, expected):
+    assert FieldProjection.parse(fields).apply(DOCUMENT) == expected
+
+
+@pytest.mark.parametrize('fields', ['items.name,items', 'items,items.name', 'items.album.id,items'])
+def test_shorter_path_keeps_the_whole_value(fields):
+    assert FieldProjection.parse(fields).apply(DOCUMENT) == {'items': DOCUMENT['items']}
+
+
+def test_empty_projection_keeps_everything():
+    projection = FieldProjection.parse('')
+
+    assert projection.is_empty
+    assert projection.apply(DOCUMENT) == DOCUMENT
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_backends_round_trip(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(_json_backend, 'orjson', None)
+
+    encoded = _json_backend.dumps(DOCUMENT)
+    assert json.loads(encoded) == DOCUMENT
+    assert _json_backend.loads(encoded) == DOCUMENT
+    assert _json_backend.loads(encoded.encode('utf-8')) == DOCUMENT
+    assert '\n' not in encoded  # One line per NDJSON record
@@ -0,0 +1,31 @@
+import math
+import time
+
+from _spotify_web_api import MAX_ALBUM_IDS_PER_CHECK, MAX_TRACK_IDS_PER_CHECK, LibraryAPI
+
+
+def test_check_tracks_splits_batches_and_keeps_the_input_order(signed_in):
+    track_ids = [f'track{index}' for index in range(120, 0, -1)] + ['track5', '']  # total_items is 30
+
+    is_saved = LibraryAPI().check_tracks(track_ids)
+
+    assert list(is_saved) == [f'track{index}' for index in range(120, 0, -1)]
+    saved_ids = [track_id for track_id, saved in is_saved.items() if saved]
+    assert saved_ids == [f'track{index}' for index in range(29, 0, -1)]
+    assert signed_in.stats.requests == math.ceil(120 / MAX_TRACK_IDS_PER_CHECK)
+
+
+def test_check_albums_uses_the_album_batch_size(signed_in):
+    is_saved = LibraryAPI().check_albums([f'album{index}' for index in range(45)])
+
+    assert list(is_saved.values()) == [index < 30 for index in range(45)]
+    assert signed_in.stats.requests == math.ceil(45 / MAX_ALBUM_IDS_PER_CHECK)
+
+
+def test_check_batches_run_concurrently(signed_in):
+    signed_in.settings.latency_ms = 300
+    started = time.monotonic()
+
+    LibraryAPI().check_tracks([f'track{index}' for index in range(4 * MAX_TRACK_IDS_PER_CHECK)])
+
+    assert time.monotonic() - started < 0.9  # Four batches one after another take 1.2 s
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from _library_mirror import TRACKS, LibraryMirror
+from conftest import run_spt, write_credentials
+
+
+def _sync(tmp_path, spt_env, *arguments):
+    completed = run_spt(['library', 'sync', '--only', 'tracks', '--format', 'ndjson', *arguments], tmp_path, spt_env)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout)['tracks']
+
+
+def _store_files(spt_env):
+    store_dir = os.path.join(spt_env['HOME'], 'Spt', 'store')
+    return sorted(name for name in os.listdir(store_dir) if name.startswith('library_')) \
+        if os.path.isdir(store_dir) else []
+
+
+def test_second_sync_only_fetches_changes(tmp_path, spt_env):
+    assert _sync(tmp_path, spt_env)['updated'] == 30
+    assert _sync(tmp_path, spt_env) == {'entity': 'tracks', 'updated': 0, 'removed': 0, 'requests': 1, 'total': 30}
+
+
+def test_mirror_survives_signing_in_again(tmp_path, spt_env):
+    _sync(tmp_path, spt_env)
+    write_credentials(spt_env['SPT_SECURITY_STORE'], access_token='new-access', refresh_token='rotated-refresh')
+
+    assert _sync(tmp_path, spt_env)['updated'] == 0  # Still a delta sync
+    assert _store_files(spt_env) == ['library_default.db']
+
+
+def test_mirror_named_after_the_refresh_token_is_adopted(tmp_path, spt_env):
+    _sync(tmp_path, spt_env)
+    store_dir = os.path.join(spt_env['HOME'], 'Spt', 'store')
+    token_hash = hashlib.sha256(b'fake-refresh-token').hexdigest()[:16]
+    os.replace(os.path.join(store_dir, 'library_default.db'), os.path.join(store_dir, f'library_{token_hash}.db'))
+
+    assert _sync(tmp_path, spt_env)['updated'] == 0
+    assert _store_files(spt_env) == ['library_default.db']
+
+
+def test_mirror_is_kept_per_profile(tmp_path, spt_env):
+    write_credentials(spt_env['SPT_SECURITY_STORE'].replace('.json', '.bob.json'))
+    _sync(tmp_path, spt_env)
+    _sync(tmp_path, spt_env, '--profile', 'bob')
+
+    assert _store_files(spt_env) == ['library_bob.db', 'library_default.db']
+
+
+def test_sync_checks_sign_in_before_creating_the_mirror(tmp_path, spt_env):
+    os.remove(spt_env['SPT_SECURITY_STORE'])
+    completed = run_spt(['library', 'sync'], tmp_path, spt_env)
+
+    assert completed.returncode == 1
+    assert _store_files(spt_env) == []
+
+
+class _InterruptedLibrary:
+    """Serves saved tracks newest first, failing after `fail_after_pages` pages when set"""
+
+    def __init__(self, track_count, fail_after_pages=None):
+        self.items = [_saved_track(index) for index in range(track_count)]
+        self.fail_after_pages = fail_after_pages
+
+    def iter_pages(self, url, url_params, prefetch=True):
+        for page_number, offset in enumerate(range(0, len(self.items), url_params['limit'])):
+            if page_number == self.fail_after_pages:
+                raise ConnectionError('Connection lost')
+            yield {'items': self.items[offset:offset + url_params['limit']]}
+
+
+def _saved_track(index):
+    return {'added_at': f'2020-01-01T00:{index // 60:02d}:{index % 60:02d}Z',
+            'track': {'id': f'track{index}', 'name': f'Track {index}', 'artists': [{'id': 'artist0'}]}}
+
+
+def test_interrupted_first_sync_is_completed_by_the_next_one(tmp_path, spt_settings):
+    mirror = LibraryMirror(str(tmp_path / 'library.db'))
+    library = _InterruptedLibrary(track_count=120, fail_after_pages=1)
+    with pytest.raises(ConnectionError):
+        mirror.sync(library, TRACKS)
+
+    library.fail_after_pages = None
+    assert mirror.sync(library, TRACKS).total == 120
+
+
+def test_interrupted_delta_sync_is_completed_by_the_next_one(tmp_path, spt_settings):
+    mirror = LibraryMirror(str(tmp_path / 'library.db'))
+    library = _InterruptedLibrary(track_count=20)
+    mirror.sync(library, TRACKS)
+    library.items = [_saved_track(index) for index in range(1000, 1100)] + library.items  # Saved since
+    library.fail_after_pages = 1
+    with pytest.raises(ConnectionError):
+        mirror.sync(library, TRACKS)
+
+    library.fail_after_pages = None
+    result = mirror.sync(library, TRACKS)
+    assert (result.updated, result.total) == (100, 120)
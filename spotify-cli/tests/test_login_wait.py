@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from _authorizer import AuthorizerService
+from _command_handlers import LoginCommandHandler
+
+
+@pytest.fixture
+def pending_login(spt_settings, monkeypatch):
+    """A login waiting for the browser, without opening one or binding the callback server"""
+    monkeypatch.setattr(AuthorizerService, '_AuthorizerService__pending_login', None)
+    monkeypatch.setattr(AuthorizerService, '_request_authorization', lambda scopes, user: None)
+    return AuthorizerService.login_async()
+
+
+def _notify_later(delay, has_error=False):
+    timer = threading.Timer(delay, AuthorizerService.notify_auth_completed, kwargs={'has_error': has_error})
+    timer.start()
+    return timer
+
+
+def test_login_async_is_pending_until_the_callback_completes(pending_login):
+    assert not pending_login.done()
+
+    AuthorizerService.notify_auth_completed(has_error=False)
+
+    assert pending_login.result(timeout=0) is True
+
+
+def test_wait_returns_as_soon_as_the_login_completes(pending_login):
+    _notify_later(0.2)
+    started = time.monotonic()
+
+    assert LoginCommandHandler._wait_for_sign_in_completion(pending_login, timeout=30) is True
+    assert time.monotonic() - started < 2
+
+
+def test_failed_callback_resolves_the_wait_as_failed(pending_login):
+    _notify_later(0.1, has_error=True)
+
+    assert LoginCommandHandler._wait_for_sign_in_completion(pending_login, timeout=30) is False
+
+
+def test_wait_gives_up_after_the_timeout(pending_login):
+    started = time.monotonic()
+
+    assert LoginCommandHandler._wait_for_sign_in_completion(pending_login, timeout=0.3) is False
+    assert 0.3 <= time.monotonic() - started < 2
+    assert pending_login.result(timeout=0) is False  # Cancelled, so a late callback has nothing to resolve
+
+
+def test_cancel_login_resolves_the_pending_login(pending_login):
+    AuthorizerService.cancel_login()
+
+    assert pending_login.result(timeout=0) is False
+
+
+def test_login_flow_errors_are_raised_by_the_pending_login(spt_settings, monkeypatch):
+    def start_flow(scopes, user):
+        raise OSError('Address already in use')
+
+    monkeypatch.setattr(AuthorizerService, '_AuthorizerService__pending_login', None)
+    monkeypatch.setattr(AuthorizerService, '_request_authorization', start_flow)
+
+    with pytest.raises(OSError):
+        AuthorizerService.login_async().result(timeout=0)
+
+
+def test_already_signed_in_resolves_without_waiting(signed_in, monkeypatch):
+    monkeypatch.setattr(AuthorizerService, '_AuthorizerService__pending_login', None)
+    monkeypatch.setattr(AuthorizerService, '_request_authorization',
+                        lambda scopes, user: pytest.fail('The consent page was opened'))
+
+    pending_login = AuthorizerService.login_async()
+
+    assert pending_login.done()
+    assert LoginCommandHandler._wait_for_sign_in_completion(pending_login, timeout=30) is True
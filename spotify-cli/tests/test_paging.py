@@ -0,0 +1,52 @@
+import json
+import time
+
+from _shared_mod import SpotifyEndPoints
+from _spotify_web_api import MAX_PAGE_SIZE, LibraryAPI
+from conftest import run_spt
+
+SAVED_TRACKS = SpotifyEndPoints.SAVED_TRACKS.value
+
+
+def _wait_for_requests(server, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while server.stats.requests < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return server.stats.requests
+
+
+def test_iter_items_follows_every_next_link(signed_in):
+    signed_in.settings.total_items = 120
+
+    items = list(LibraryAPI().iter_items(SAVED_TRACKS, {'limit': MAX_PAGE_SIZE, 'offset': 0}))
+
+    assert [item['track']['id'] for item in items] == [f'track{index}' for index in range(120)]
+    assert signed_in.stats.requests == 3
+
+
+def test_next_page_is_fetched_while_the_current_one_is_read(signed_in):
+    signed_in.settings.total_items = 120
+    pages = LibraryAPI().iter_pages(SAVED_TRACKS, {'limit': MAX_PAGE_SIZE, 'offset': 0})
+
+    next(pages)
+    assert _wait_for_requests(signed_in, 2) == 2
+    pages.close()
+
+
+def test_without_prefetch_stopping_early_requests_nothing_more(signed_in):
+    signed_in.settings.total_items = 120
+    pages = LibraryAPI().iter_pages(SAVED_TRACKS, {'limit': MAX_PAGE_SIZE, 'offset': 0}, prefetch=False)
+
+    next(pages)
+    time.sleep(0.2)
+    pages.close()
+    assert signed_in.stats.requests == 1
+
+
+def test_all_writes_every_item_as_one_array(tmp_path, spt_env, fake_server):
+    fake_server.settings.total_items = 120
+
+    completed = run_spt(['personalise', 'GetTopTracks', '--all', '--fields', 'items.name'], tmp_path, spt_env)
+
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout) == [{'name': f'Track {index}'} for index in range(120)]
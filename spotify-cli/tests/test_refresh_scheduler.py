@@ -0,0 +1,63 @@
+import gc
+import threading
+import weakref
+
+from _authorizer import CredentialManager, SpotifyToken, _RefreshScheduler
+from _credential_store import MemoryCredentialStore
+
+
+class _Manager:
+    def __init__(self):
+        self.refreshed = threading.Event()
+
+    def _refresh_in_background(self, credentials):
+        self.refreshed.set()
+
+
+def _token(refresh_token='refresh-token'):
+    return SpotifyToken.from_json_response({'access_token': 'access-token', 'refresh_token': refresh_token,
+                                            'token_type': 'Bearer', 'scope': '', 'expires_in': 3600})
+
+
+def test_due_refreshes_run():
+    scheduler, manager = _RefreshScheduler(), _Manager()
+    scheduler.schedule(0, manager, _token())
+
+    assert manager.refreshed.wait(timeout=5)
+    assert scheduler.get_pending_count() == 0
+
+
+def test_rescheduling_replaces_the_pending_refresh():
+    scheduler, manager = _RefreshScheduler(), _Manager()
+    for _ in range(100):
+        scheduler.schedule(3600, manager, _token())
+
+    assert scheduler.get_pending_count() == 1
+    assert len(scheduler._queue) < 100  # Replaced entries are dropped, not kept until they are due
+
+
+def test_cancelled_refreshes_release_the_manager():
+    scheduler = _RefreshScheduler()
+    managers = [_Manager() for _ in range(50)]
+    references = [weakref.ref(manager) for manager in managers]
+    for manager in managers:
+        scheduler.schedule(3600, manager, _token())
+    for manager in managers:
+        scheduler.cancel(manager)
+    del managers, manager
+    gc.collect()
+
+    assert scheduler.get_pending_count() == 0
+    assert all(reference() is None for reference in references)
+
+
+def test_closing_a_credential_manager_releases_it(spt_settings):
+    manager = CredentialManager('evicted', MemoryCredentialStore())
+    manager.set_credentials(_token())  # Schedules a refresh well ahead of now
+    reference = weakref.ref(manager)
+
+    manager.close()
+    del manager
+    gc.collect()
+
+    assert reference() is None
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import _shared_mod
+from _request_metrics import LatencyHistogram, RequestMetrics, get_endpoint_template
+from _spotify_web_api import GetRequestExecutor
+from conftest import run_spt
+
+
+@pytest.mark.parametrize('url, template', [
+    ('https://api.spotify.com/v1/me/top/tracks?limit=5', '/v1/me/top/tracks'),
+    ('https://api.spotify.com/v1/tracks/4iV5W9uYEdYUVa79Axb7Rh', '/v1/tracks/{id}'),
+    ('https://api.spotify.com/v1/users/some.user/', '/v1/users/some.user'),
+    ('https://api.spotify.com/v1/audio-analysis/11dFghVXANMlKmJXsNCbNl', '/v1/audio-analysis/{id}'),
+])
+def test_endpoint_templates_collapse_ids(url, template):
+    assert get_endpoint_template(url) == template
+
+
+def test_histogram_reports_bucket_percentiles():
+    histogram = LatencyHistogram()
+    for value_ms in [3] * 90 + [150] * 9 + [7000]:
+        histogram.add(value_ms)
+
+    assert (histogram.count, histogram.min_ms, histogram.max_ms) == (100, 3, 7000)
+    assert (histogram.percentile(50), histogram.percentile(90), histogram.percentile(99)) == (5, 5, 200)
+    assert histogram.percentile(100) == 7000
+    assert histogram.to_dict()['buckets_ms']['+inf'] == 0 and histogram.to_dict()['buckets_ms']['10000'] == 1
+
+
+def test_requests_are_timed_per_endpoint(signed_in):
+    timings = []
+    listener = RequestMetrics.add_listener(timings.append)
+    try:
+        with RequestMetrics.collect():
+            for _ in range(2):
+                GetRequestExecutor(_shared_mod.SpotifyEndPoints.CURRENT_USER.value, []).execute()
+            stats = RequestMetrics.to_dict()['/v1/me']
+    finally:
+        RequestMetrics.remove_listener(listener)
+
+    assert [timing.status for timing in timings] == [200, 304]  # The second one revalidates the cached response
+    assert timings[0].bytes > 0 and all(timing.total_s > 0 for timing in timings)
+    assert stats['total']['count'] == 2
+    assert stats['statuses'] == {'200': 1, '304': 1}
+    assert stats['connect']['count'] <= 1  # The second request reuses the connection
+
+
+def test_timings_go_to_stderr_and_the_timings_file(tmp_path, spt_env):
+    completed = run_spt(['personalise', 'GetTopTracks', '--limit', '2', '--fields', 'items.name', '--timings',
+                         '--timings-file', 'timings.json'], tmp_path, spt_env)
+
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout) == {'items': [{'name': 'Track 0'}, {'name': 'Track 1'}]}
+    assert 'Request timings' in completed.stderr
+    assert json.loads((tmp_path / 'timings.json').read_text())['/v1/me/top/tracks']['total']['count'] == 1
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+import requests
+
+from _request_scheduler import RequestScheduler, TokenBucket
+from fake_spotify_server import FakeServerSettings, FakeSpotifyServer
+
+
+@pytest.fixture
+def scheduler(spt_settings, monkeypatch):
+    monkeypatch.setattr(RequestScheduler, '_get_backoff_delay', staticmethod(lambda attempt: 0.0))
+    RequestScheduler.reset()
+    yield RequestScheduler
+    RequestScheduler.reset()
+
+
+def _get_profile(server: FakeSpotifyServer) -> requests.Response:
+    return RequestScheduler.submit(lambda: requests.get(f'{server.base_url}/v1/me', timeout=5))
+
+
+def test_rate_limited_request_is_retried_after_retry_after(scheduler):
+    with FakeSpotifyServer(FakeServerSettings(rate_limit_every=2, retry_after=0.3)) as server:
+        assert _get_profile(server).status_code == 200
+        started = time.monotonic()
+        response = _get_profile(server)  # The server's second request gets a 429
+
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.3
+    assert server.stats.rate_limited == 1
+    stats = scheduler.get_stats()
+    assert (stats.requests, stats.rate_limited, stats.retried) == (3, 1, 1)
+
+
+def test_server_error_is_retried(scheduler):
+    with FakeSpotifyServer(FakeServerSettings(server_error_every=2)) as server:
+        assert _get_profile(server).status_code == 200
+        response = _get_profile(server)
+
+    assert response.status_code == 200
+    assert server.stats.server_errors == 1
+    stats = scheduler.get_stats()
+    assert (stats.requests, stats.rate_limited, stats.retried) == (3, 0, 1)
+
+
+def test_last_response_is_returned_when_retries_run_out(scheduler, monkeypatch):
+    monkeypatch.setattr(RequestScheduler, '_get_setting',
+                        staticmethod(lambda option, fallback: 2 if option == 'MAX_RETRIES' else fallback))
+    with FakeSpotifyServer(FakeServerSettings(server_error_every=1)) as server:
+        response = _get_profile(server)
+
+    assert response.status_code == 503
+    assert server.stats.server_errors == 3
+    assert scheduler.get_stats().retried == 2
+
+
+def _ok_response():
+    response = requests.Response()
+    response.status_code = 200
+    return response
+
+
+def test_requests_are_not_throttled_by_default(scheduler):
+    started = time.monotonic()
+    for _ in range(100):
+        RequestScheduler.submit(_ok_response)
+
+    assert time.monotonic() - started < 1
+    assert scheduler.get_stats().throttled == 0
+
+
+def test_configured_rate_throttles_requests(scheduler, monkeypatch):
+    settings = {'REQUESTS_PER_SECOND': 20, 'BURST': 1}
+    monkeypatch.setattr(RequestScheduler, '_get_setting',
+                        staticmethod(lambda option, fallback: settings.get(option, fallback)))
+    started = time.monotonic()
+    for _ in range(5):
+        RequestScheduler.submit(_ok_response)
+
+    assert time.monotonic() - started >= 0.15
+    assert scheduler.get_stats().throttled == 4
+
+
+def test_unlimited_bucket_still_pauses_after_retry_after():
+    bucket = TokenBucket(rate=0, capacity=0)
+    assert bucket.acquire() == 0
+    bucket.pause_for(0.2)
+
+    assert bucket.acquire() >= 0.15
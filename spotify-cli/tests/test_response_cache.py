@@ -0,0 +1,53 @@
+import os
+import pathlib
+
+import pytest
+
+from _response_cache import CachedResponse, ResponseCache
+from conftest import run_spt, write_credentials
+
+
+@pytest.fixture
+def cache_dir(spt_settings, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    monkeypatch.setattr(ResponseCache, '_ResponseCache__cache_dir', str(cache_dir))
+    return cache_dir
+
+
+def _entry(body='{}'):
+    return CachedResponse(url='http://spotify/v1/me', etag='"etag"', body=body)
+
+
+def test_entry_evicted_by_another_process_is_a_miss(cache_dir, monkeypatch):
+    ResponseCache.store('key', _entry())
+
+    def evicted_meanwhile(path, *args, **kwargs):
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, 'utime', evicted_meanwhile)
+    assert ResponseCache.lookup('key') is None
+
+
+def test_eviction_skips_entries_already_removed(cache_dir, monkeypatch):
+    monkeypatch.setattr(ResponseCache, 'get_max_size_bytes', staticmethod(lambda: 0))
+    unlink = pathlib.Path.unlink
+
+    def removed_by_another_process(path, missing_ok=False):
+        unlink(path)
+        unlink(path, missing_ok=missing_ok)
+
+    monkeypatch.setattr(pathlib.Path, 'unlink', removed_by_another_process)
+    ResponseCache.store('key', _entry())
+
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_cache_survives_refresh_token_rotation(tmp_path, spt_env, fake_server):
+    command = ['personalise', 'GetTopTracks', '--limit', '2']
+    assert run_spt(command, tmp_path, spt_env).returncode == 0
+    write_credentials(spt_env['SPT_SECURITY_STORE'], access_token='new-access', refresh_token='rotated-refresh')
+
+    assert run_spt(command, tmp_path, spt_env).returncode == 0
+    assert fake_server.stats.not_modified == 1  # Revalidated the entry stored before the rotation
@@ -0,0 +1,59 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import _shared_mod
+from _response_cache import ResponseCache
+from _single_flight import SingleFlight
+from _spotify_web_api import GetRequestExecutor
+
+
+def _get_profile(enabled=True, refresh=False, delay=0.0):
+    time.sleep(delay)
+    ResponseCache.configure(enabled=enabled, refresh=refresh)
+    return GetRequestExecutor(_shared_mod.SpotifyEndPoints.CURRENT_USER.value, []).execute().json()
+
+
+def _run_side_by_side(*calls):
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        pending = [pool.submit(contextvars.copy_context().run, *call) for call in calls]
+        return [future.result() for future in pending]
+
+
+def test_identical_concurrent_requests_share_one_call(signed_in):
+    signed_in.settings.latency_ms = 300
+
+    profiles = _run_side_by_side((_get_profile,), (_get_profile, True, False, 0.1))
+
+    assert profiles[0] == profiles[1]
+    assert signed_in.stats.requests == 1
+
+
+@pytest.mark.parametrize('enabled, refresh', [(True, True), (False, False)])
+def test_refresh_and_no_cache_do_not_join_a_cached_request(signed_in, enabled, refresh):
+    signed_in.settings.latency_ms = 300
+
+    _run_side_by_side((_get_profile,), (_get_profile, enabled, refresh, 0.1))
+
+    assert signed_in.stats.requests == 2
+
+
+def test_waiters_receive_the_error_of_the_leading_call():
+    flight, started = SingleFlight(), threading.Event()
+
+    def failing_call():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError('Spotify is down')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'key', failing_call)
+        started.wait(timeout=5)
+        waiter = pool.submit(flight.do, 'key', lambda: 'not called')
+        for future in (leader, waiter):
+            with pytest.raises(ValueError):
+                future.result()
+    assert flight.coalesced_calls == 1
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+import pytest
+
+from _authorizer import AuthorizerService, TokenManager, UserContext
+from _credential_store import MemoryCredentialStore
+from fake_spotify_server import make_credentials
+
+
+@pytest.fixture
+def token_manager(spt_settings, monkeypatch):
+    """No profile loaded, at most 2 at a time, every profile signed in with its own in-memory token"""
+    managers = OrderedDict()
+    monkeypatch.setattr(TokenManager, '_TokenManager__managers', managers)
+    monkeypatch.setattr(TokenManager, '_TokenManager__stores', {})
+    monkeypatch.setattr(TokenManager, 'get_max_loaded_profiles', staticmethod(lambda: 2))
+    monkeypatch.delenv('SPT_PROFILE', raising=False)
+    for profile in ('alice', 'bob', 'carol'):
+        TokenManager.set_store(MemoryCredentialStore(make_credentials(f'{profile}-token')), UserContext(profile))
+    yield TokenManager
+    for manager in list(managers.values()):
+        manager.close()
+
+
+def test_every_profile_has_its_own_token(token_manager):
+    assert AuthorizerService.get_access_token(UserContext('alice')) == 'alice-token'
+    assert AuthorizerService.get_access_token(UserContext('bob')) == 'bob-token'
+    assert TokenManager.get(UserContext('alice')) is not TokenManager.get(UserContext('bob'))
+
+
+def test_managers_are_reused(token_manager):
+    assert TokenManager.get(UserContext('alice')) is TokenManager.get(UserContext('alice'))
+
+
+def test_least_recently_used_profile_is_unloaded(token_manager):
+    alice = TokenManager.get(UserContext('alice'))
+    TokenManager.get(UserContext('bob'))
+    TokenManager.get(UserContext('alice'))  # Bob is now the least recently used
+    TokenManager.get(UserContext('carol'))
+
+    assert TokenManager.get_loaded_profiles() == ['alice', 'carol']
+    assert not alice._closed
+
+
+def test_unloaded_profiles_stop_refreshing_and_reload_from_their_store(token_manager):
+    bob = TokenManager.get(UserContext('bob'))
+    TokenManager.get(UserContext('alice'))
+    TokenManager.get(UserContext('carol'))
+
+    assert bob._closed
+    assert AuthorizerService.get_access_token(UserContext('bob')) == 'bob-token'
+    assert TokenManager.get(UserContext('bob')) is not bob
+
+
+def test_reset_unloads_one_profile(token_manager):
+    alice = TokenManager.get(UserContext('alice'))
+    TokenManager.get(UserContext('bob'))
+
+    TokenManager.reset(UserContext('alice'))
+
+    assert alice._closed
+    assert TokenManager.get_loaded_profiles() == ['bob']
+
+
+def test_default_profile_comes_from_the_environment(token_manager, monkeypatch):
+    monkeypatch.setenv('SPT_PROFILE', 'carol')
+
+    assert AuthorizerService.get_access_token() == 'carol-token'
+    assert TokenManager.get_loaded_profiles() == ['carol']